@@ -0,0 +1,265 @@
+# analytics.py
+from datetime import datetime, timedelta
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QDate
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QDateEdit, QComboBox, QPushButton,
+    QTableView, QHeaderView, QSpinBox, QGroupBox
+)
+
+HOUR_FORMAT = "%Y-%m-%dT%H"  # alarm_summary.hour 的格式（报警出现时间的前13个字符）
+
+# 统计粒度 -> 桶名取 hour 的前几个字符
+BUCKETS = {"hour": 13, "day": 10, "month": 7, "all": 0}
+BUCKET_LABELS = {"hour": "按小时", "day": "按天", "month": "按月", "all": "合计"}
+TOP_ORDERS = {"count": "次数", "total_duration": "总时长"}
+DEFAULT_TOP = 10
+
+
+def _floor_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(moment):
+    floor = _floor_hour(moment)
+    return floor if floor == moment else floor + timedelta(hours=1)
+
+
+def _bucket_period(key, bucket, start, end):
+    """桶对应的时间段，裁剪到 [start, end)"""
+    if bucket == "all":
+        return start, end
+    # fromisoformat 比 strptime 快得多，按小时统计半年有几万个桶
+    begin = datetime.fromisoformat(key + "-01" if bucket == "month" else key)
+    if bucket == "hour":
+        finish = begin + timedelta(hours=1)
+    elif bucket == "day":
+        finish = begin + timedelta(days=1)
+    else:
+        finish = datetime(begin.year + begin.month // 12, begin.month % 12 + 1, 1)
+    return max(begin, start), min(finish, end)
+
+
+def format_duration(seconds):
+    """秒数显示为 时:分:秒"""
+    if seconds is None:
+        return "-"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class AlarmAnalytics:
+    """
+    报警统计，数据来自触发器增量维护的 alarm_summary（每个报警类型每小时一行），
+    半年的数据也只需要聚合几万行汇总，不读取报警明细。
+
+    指标定义（报警按出现时间归入桶）：
+      count          报警次数（包括尚未恢复的）
+      total_duration 已恢复报警的持续时间总和（秒）
+      mean_duration  平均持续时间 = total_duration / 已恢复次数，即 MTTR（平均恢复时间）
+      mtbf           平均无故障时间 = (统计时段 - total_duration) / count，统计时段不超过当前时间
+    """
+
+    def __init__(self, alarm_logger):
+        self.alarm_logger = alarm_logger
+        self.db = alarm_logger.db
+
+    def _hour_range(self, start, end):
+        return _floor_hour(start).strftime(HOUR_FORMAT), _ceil_hour(end).strftime(HOUR_FORMAT)
+
+    def summary(self, start, end, bucket="day", alarm_name=None):
+        """
+        按报警类型和时间桶统计
+        :param start: 开始时间 (datetime)，按小时向下取整
+        :param end: 结束时间 (datetime)，按小时向上取整
+        :param bucket: "hour" / "day" / "month" / "all"
+        :param alarm_name: 只统计某个报警类型
+        :return: [dict]，按桶和报警类型排序
+        """
+        # 先等待未写入的事件落盘（有超时，写线程繁忙时接受稍旧的数据）
+        self.alarm_logger.flush()
+        length = BUCKETS[bucket]
+        first_hour, end_hour = self._hour_range(start, end)
+        params = [length, first_hour, end_hour]
+        name_clause = ""
+        if alarm_name:
+            name_clause = "AND alarm_name = ?"
+            params.append(alarm_name)
+        rows = self.db.query(f"""
+            SELECT substr(hour, 1, ?) AS bucket, alarm_name,
+                   SUM(count), SUM(closed), SUM(total_duration), MAX(max_duration)
+            FROM alarm_summary
+            WHERE hour >= ? AND hour < ? {name_clause}
+            GROUP BY bucket, alarm_name
+            ORDER BY bucket, alarm_name
+        """, params)
+
+        start, end = _floor_hour(start), min(_ceil_hour(end), datetime.now())
+        result = []
+        for key, name, count, closed, total, longest in rows:
+            begin, finish = _bucket_period(key, bucket, start, end)
+            span = max(0.0, (finish - begin).total_seconds())
+            mean = total / closed if closed else None
+            result.append({
+                "bucket": key or f"{start:%Y-%m-%d} ~ {end:%Y-%m-%d}",
+                "alarm_name": name,
+                "count": count,
+                "closed": closed,
+                "total_duration": total,
+                "mean_duration": mean,
+                "max_duration": longest,
+                "mttr": mean,
+                "mtbf": max(0.0, span - total) / count if count else None,
+            })
+        return result
+
+    def top(self, start, end, n=DEFAULT_TOP, by="count"):
+        """
+        报警排行
+        :param by: "count" 按次数，"total_duration" 按总时长
+        :return: [dict]，最多 n 项
+        """
+        if by not in TOP_ORDERS:
+            raise ValueError(f"不支持的排序方式: {by}")
+        self.alarm_logger.flush()
+        first_hour, end_hour = self._hour_range(start, end)
+        rows = self.db.query(f"""
+            SELECT alarm_name, SUM(count) AS count, SUM(closed), SUM(total_duration) AS total_duration
+            FROM alarm_summary
+            WHERE hour >= ? AND hour < ?
+            GROUP BY alarm_name
+            ORDER BY {by} DESC, alarm_name
+            LIMIT ?
+        """, (first_hour, end_hour, n))
+        return [{
+            "alarm_name": name,
+            "count": count,
+            "closed": closed,
+            "total_duration": total,
+            "mean_duration": total / closed if closed else None,
+        } for name, count, closed, total in rows]
+
+
+class _RowsModel(QAbstractTableModel):
+    """显示已格式化好的行"""
+
+    def __init__(self, headers, parent=None):
+        super().__init__(parent)
+        self.headers = headers
+        self.rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.rows[index.row()][index.column()]
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+
+class AlarmAnalyticsDialog(QDialog):
+    def __init__(self, analytics, alarm_names, parent=None):
+        super().__init__(parent)
+        self.analytics = analytics
+
+        self.setWindowTitle("报警统计分析")
+        self.setMinimumSize(900, 650)
+        layout = QVBoxLayout(self)
+
+        # 查询条件
+        filter_layout = QHBoxLayout()
+        self.start_date_edit = QDateEdit()
+        self.start_date_edit.setCalendarPopup(True)
+        self.start_date_edit.setDate(QDate.currentDate().addMonths(-1))  # 默认一个月
+        self.end_date_edit = QDateEdit()
+        self.end_date_edit.setCalendarPopup(True)
+        self.end_date_edit.setDate(QDate.currentDate())
+        self.bucket_combo = QComboBox()
+        for key, label in BUCKET_LABELS.items():
+            self.bucket_combo.addItem(label, key)
+        self.bucket_combo.setCurrentIndex(1)  # 按天
+        self.alarm_combo = QComboBox()
+        self.alarm_combo.addItem("所有类型", None)
+        for name in alarm_names:
+            self.alarm_combo.addItem(name, name)
+        self.top_spin = QSpinBox()
+        self.top_spin.setRange(1, 100)
+        self.top_spin.setValue(DEFAULT_TOP)
+        self.order_combo = QComboBox()
+        for key, label in TOP_ORDERS.items():
+            self.order_combo.addItem(label, key)
+        query_button = QPushButton("统计")
+        query_button.clicked.connect(self.refresh)
+
+        filter_layout.addWidget(QLabel("开始日期:"))
+        filter_layout.addWidget(self.start_date_edit)
+        filter_layout.addWidget(QLabel("结束日期:"))
+        filter_layout.addWidget(self.end_date_edit)
+        filter_layout.addWidget(self.bucket_combo)
+        filter_layout.addWidget(self.alarm_combo)
+        filter_layout.addWidget(QLabel("排行前"))
+        filter_layout.addWidget(self.top_spin)
+        filter_layout.addWidget(self.order_combo)
+        filter_layout.addWidget(query_button)
+        layout.addLayout(filter_layout)
+
+        # 排行
+        top_group = QGroupBox("报警排行")
+        top_layout = QVBoxLayout(top_group)
+        self.top_model = _RowsModel(["排名", "报警项目", "次数", "总时长", "平均时长"], self)
+        top_layout.addWidget(self._make_view(self.top_model))
+        layout.addWidget(top_group, 1)
+
+        # 分桶统计
+        summary_group = QGroupBox("分时段统计")
+        summary_layout = QVBoxLayout(summary_group)
+        self.summary_model = _RowsModel(
+            ["时段", "报警项目", "次数", "已恢复", "总时长", "平均时长(MTTR)", "最长", "MTBF"], self)
+        summary_layout.addWidget(self._make_view(self.summary_model))
+        layout.addWidget(summary_group, 2)
+
+        self.refresh()
+
+    def _make_view(self, model):
+        view = QTableView()
+        view.setModel(model)
+        view.verticalHeader().setVisible(False)
+        view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        return view
+
+    def refresh(self):
+        start = datetime.combine(self.start_date_edit.date().toPython(), datetime.min.time())
+        end = datetime.combine(self.end_date_edit.date().toPython(), datetime.min.time()) + timedelta(days=1)
+
+        top = self.analytics.top(start, end, self.top_spin.value(), self.order_combo.currentData())
+        self.top_model.set_rows([
+            [str(rank), item["alarm_name"], str(item["count"]),
+             format_duration(item["total_duration"]), format_duration(item["mean_duration"])]
+            for rank, item in enumerate(top, 1)
+        ])
+
+        summary = self.analytics.summary(start, end, self.bucket_combo.currentData(),
+                                         self.alarm_combo.currentData())
+        self.summary_model.set_rows([
+            [item["bucket"], item["alarm_name"], str(item["count"]), str(item["closed"]),
+             format_duration(item["total_duration"]), format_duration(item["mean_duration"]),
+             format_duration(item["max_duration"]), format_duration(item["mtbf"])]
+            for item in summary
+        ])
@@ -0,0 +1,122 @@
+# anomaly.py
+import logging
+import time
+from operator import itemgetter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_ALARM = "关节信号异常"  # 写入报警记录的报警类型，与 Woring.ALARM_FIELDS 中的名称一致
+# 关节1~6的位置、速度、电流、扭矩，共24个通道
+JOINT_ADDRESSES = list(range(1200, 1296, 4))
+HALF_LIFE_FRAMES = 6000  # EWMA半衰期（帧），100Hz时约1分钟
+WARMUP_FRAMES = 3000  # 启动后先学习这么多帧再判断
+Z_THRESHOLD = 6.0  # |z| 超过该值的通道判为异常
+Z_CLEAR = 4.0  # 所有通道 |z| 低于该值才解除异常（滞回）
+HOLD_FRAMES = 5  # 连续这么多帧异常才报警，连续这么多帧正常才解除
+# 通道连续这么多帧未回到解除阈值以下时恢复学习（100Hz时约1分钟），示教点、程序或刀具变更造成的持久偏移会被吸收为新基线
+RELEARN_FRAMES = 6000
+# 标准差下限（按单位），避免静止时方差趋近0导致微小变化也报警
+STD_FLOORS = {"度": 0.5, "度/秒": 2.0, "A": 0.2, "Nm": 1.0}
+COST_WINDOW = 1000  # 统计每帧耗时的窗口（帧）
+
+
+class AnomalyDetector:
+    """
+    关节信号异常检测：每帧对全部通道做一次向量化的EWMA均值/方差更新和z分数计算，
+    不按通道循环。任一通道 |z| 连续 HOLD_FRAMES 帧超过 Z_THRESHOLD 时报警，
+    所有通道连续 HOLD_FRAMES 帧低于 Z_CLEAR 时解除。
+    异常中的通道不更新均值/方差，避免异常值被学习进基线；
+    但连续异常超过 RELEARN_FRAMES 帧的通道视为基线已经改变，恢复学习，报警随之解除。
+
+    :param definitions: [{"name", "address", "unit"}]，只使用 JOINT_ADDRESSES 中的通道
+    """
+
+    def __init__(self, definitions, half_life=HALF_LIFE_FRAMES, warmup=WARMUP_FRAMES,
+                 threshold=Z_THRESHOLD, clear=Z_CLEAR, hold=HOLD_FRAMES, relearn=RELEARN_FRAMES):
+        channels = [item for item in definitions if item["address"] in JOINT_ADDRESSES]
+        self.names = [item["name"] for item in channels]
+        self.pick = itemgetter(*[f"VD{item['address']}" for item in channels])
+        self.floor_sq = np.array([STD_FLOORS.get(item["unit"], 0.0) ** 2 for item in channels])
+        self.alpha = 1.0 - 0.5 ** (1.0 / half_life)
+        self.warmup = warmup
+        self.threshold = threshold
+        self.clear = clear
+        self.hold = hold
+        self.relearn = relearn
+
+        count = len(channels)
+        self.mean = np.zeros(count)
+        self.var = np.zeros(count)
+        self.z = np.zeros(count)
+        self.outlier_frames = np.zeros(count, dtype=np.int64)  # 各通道 |z| 连续不低于解除阈值的帧数
+        self.frames = 0
+        self.active = False
+        self.streak = 0  # 与当前状态相反的连续帧数
+        self.last_channels = []  # 最近一次报警时异常的通道名称
+        self.events = 0
+
+        # 每帧耗时统计
+        self.costs = np.zeros(COST_WINDOW)
+        self.max_cost = 0.0
+
+    def update(self, data):
+        """
+        处理一帧，返回当前是否处于异常状态
+        :param data: PLCWorker 发出的数据字典
+        """
+        start = time.perf_counter()
+        x = np.array(self.pick(data), dtype=np.float64)
+        if self.frames == 0:
+            self.mean[:] = x
+        diff = x - self.mean
+        self.z = diff / np.sqrt(self.var + self.floor_sq)
+        outliers = np.abs(self.z) > self.threshold
+        # EWMA 均值/方差（West 增量公式），异常通道暂停学习，持续异常的通道重新学习基线
+        # 只要 |z| 没有回到解除阈值以下就继续累计，避免周期信号短暂回落后重新计数
+        self.outlier_frames = np.where(np.abs(self.z) >= self.clear, self.outlier_frames + 1, 0)
+        if self.frames >= self.warmup:
+            learn = ~outliers | (self.outlier_frames > self.relearn)
+        else:
+            learn = np.ones_like(outliers)
+        increment = self.alpha * diff
+        self.mean += np.where(learn, increment, 0.0)
+        self.var = np.where(learn, (1.0 - self.alpha) * (self.var + diff * increment), self.var)
+
+        if self.frames >= self.warmup:
+            self._update_state(outliers)
+
+        cost = time.perf_counter() - start
+        self.costs[self.frames % COST_WINDOW] = cost
+        self.frames += 1
+        if cost > self.max_cost:
+            self.max_cost = cost
+        return self.active
+
+    def _update_state(self, outliers):
+        if not self.active:
+            self.streak = self.streak + 1 if outliers.any() else 0
+            if self.streak >= self.hold:
+                self.active = True
+                self.streak = 0
+                self.events += 1
+                self.last_channels = [self.names[i] for i in np.flatnonzero(outliers)]
+                logger.warning("关节信号异常: %s", "、".join(
+                    f"{self.names[i]}(z={self.z[i]:.1f})" for i in np.flatnonzero(outliers)))
+        else:
+            self.streak = self.streak + 1 if (np.abs(self.z) < self.clear).all() else 0
+            if self.streak >= self.hold:
+                self.active = False
+                self.streak = 0
+
+    def report(self):
+        """检测耗时和状态，显示在界面卡顿报告中"""
+        filled = min(self.frames, COST_WINDOW)
+        costs = self.costs[:filled] if filled < COST_WINDOW else self.costs
+        if not filled:
+            return "关节信号异常检测: 尚无数据"
+        return (f"关节信号异常检测（{len(self.names)} 通道）: 每帧平均 {costs.mean() * 1e6:.0f} us，"
+                f"P99 {np.percentile(costs, 99) * 1e6:.0f} us，最大 {self.max_cost * 1e6:.0f} us，"
+                f"已处理 {self.frames} 帧，报警 {self.events} 次"
+                + (f"，最近异常通道: {'、'.join(self.last_channels)}" if self.last_channels else ""))
@@ -0,0 +1,152 @@
+# blackbox.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from TOOL.Replay import write_recording
+
+logger = logging.getLogger(__name__)
+
+BLACKBOX_DIR = "blackbox"
+PRE_SECONDS = 30.0  # 触发前保留的时长（秒）
+POST_SECONDS = 10.0  # 触发后继续记录的时长（秒）
+MAX_FRAME_RATE = 100  # 按最快刷新率（0.01秒）估算环形缓冲区容量（帧/秒）
+KEEP_DAYS = 180  # 转储文件保留天数，与报警记录的保留期一致
+
+
+class BlackBox:
+    """
+    黑匣子：内存中的定长环形缓冲区始终保存最近 PRE_SECONDS 秒的原始帧（与录制文件相同的帧布局）。
+    报警触发时冻结触发前的窗口，再记录 POST_SECONDS 秒，
+    然后在后台线程写成 gzip 压缩的录制文件（blackbox/<触发时间>_<报警>.plcrec.gz），可用 --replay 回放。
+
+    record() 在 PLCWorker 线程中调用，平时只是把一帧复制进预先分配好的 numpy 数组；
+    trigger() 在界面线程中调用，立即返回文件路径，供报警记录关联。
+    内存上限 = 环形缓冲区 + 触发后缓冲区，各按 MAX_FRAME_RATE 预先分配。
+    """
+
+    def __init__(self, layout, pre_seconds=PRE_SECONDS, post_seconds=POST_SECONDS,
+                 directory=BLACKBOX_DIR):
+        self.layout = layout
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.directory = directory
+        self.capacity = max(1, int(pre_seconds * MAX_FRAME_RATE))
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.raws = np.zeros((self.capacity, layout.frame_size), dtype=np.uint8)
+        self.count = 0  # 已写入的总帧数，写入位置 = count % capacity
+        self.post_capacity = max(1, int(post_seconds * MAX_FRAME_RATE))
+        self.post_times = np.zeros(self.post_capacity, dtype=np.float64)
+        self.post_raws = np.zeros((self.post_capacity, layout.frame_size), dtype=np.uint8)
+
+        self.lock = threading.Lock()
+        self.capture = None  # 进行中的捕获: dict(path, trigger_time, alarms, pre, post_count)
+        self.writers = []
+        self.dumps_written = 0
+
+    @property
+    def memory_bytes(self):
+        return (self.times.nbytes + self.raws.nbytes
+                + self.post_times.nbytes + self.post_raws.nbytes)
+
+    def trigger(self, alarm_name, timestamp=None):
+        """
+        报警上升沿触发捕获（界面线程调用）
+        :return: 转储文件路径；已有捕获进行中时，并入该捕获并返回同一路径
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if self.capture is not None:
+                self.capture["alarms"].append(alarm_name)
+                return self.capture["path"]
+            moment = datetime.fromtimestamp(timestamp)
+            name = f"{moment:%Y%m%d_%H%M%S}_{alarm_name}.plcrec.gz"
+            self.capture = {
+                "path": os.path.join(self.directory, name),
+                "trigger_time": timestamp,
+                "alarms": [alarm_name],
+                "pre": None,  # 下一帧到来时在工作线程中冻结
+                "post_count": 0,
+            }
+            logger.info("黑匣子触发: %s -> %s", alarm_name, self.capture["path"])
+            return self.capture["path"]
+
+    def record(self, timestamp, raw):
+        """写入一帧（PLCWorker线程调用）"""
+        with self.lock:
+            capture = self.capture
+            if capture is None:
+                index = self.count % self.capacity
+                self.times[index] = timestamp
+                self.raws[index] = np.frombuffer(raw, dtype=np.uint8)
+                self.count += 1
+                return
+            if capture["pre"] is None:
+                capture["pre"] = self._freeze(capture["trigger_time"])
+            position = capture["post_count"]
+            if position < self.post_capacity:
+                self.post_times[position] = timestamp
+                self.post_raws[position] = np.frombuffer(raw, dtype=np.uint8)
+                capture["post_count"] = position + 1
+            if timestamp >= capture["trigger_time"] + self.post_seconds \
+                    or capture["post_count"] >= self.post_capacity:
+                self._finish_locked()
+
+    def _freeze(self, trigger_time):
+        """复制环形缓冲区中触发前 pre_seconds 秒的帧（按时间顺序）"""
+        filled = min(self.count, self.capacity)
+        order = np.arange(self.count - filled, self.count) % self.capacity
+        times = self.times[order]
+        keep = times >= trigger_time - self.pre_seconds
+        # 冻结后环形缓冲区重新开始，避免捕获结束后与触发后的帧重复
+        self.count = 0
+        return times[keep], self.raws[order[keep]]
+
+    def _finish_locked(self):
+        capture, self.capture = self.capture, None
+        pre_times, pre_raws = capture["pre"] if capture["pre"] is not None else self._freeze(
+            capture["trigger_time"])
+        count = capture["post_count"]
+        times = np.concatenate((pre_times, self.post_times[:count]))
+        raws = np.concatenate((pre_raws, self.post_raws[:count]))
+        writer = threading.Thread(target=self._dump, args=(capture, times, raws),
+                                  name="BlackBoxDump", daemon=True)
+        self.writers = [thread for thread in self.writers if thread.is_alive()] + [writer]
+        writer.start()
+
+    def _dump(self, capture, times, raws):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_recording(capture["path"], self.layout, times, raws)
+        except OSError as e:
+            logger.error("黑匣子写入失败 %s: %s", capture["path"], e)
+            return
+        self.dumps_written += 1
+        logger.info("黑匣子已保存: %s（%d 帧，报警: %s）",
+                    capture["path"], len(times), "、".join(capture["alarms"]))
+        self.cleanup()
+
+    def cleanup(self, now=None):
+        """删除超过 KEEP_DAYS 天的转储文件"""
+        cutoff = (now or time.time()) - KEEP_DAYS * 86400
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError as e:
+                logger.debug("删除过期黑匣子文件失败 %s: %s", path, e)
+
+    def close(self):
+        """保存进行中的捕获（触发后的帧可能不足 post_seconds），等待写入完成"""
+        with self.lock:
+            if self.capture is not None:
+                self._finish_locked()
+            writers = list(self.writers)
+        for writer in writers:
+            writer.join()
+
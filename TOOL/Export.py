@@ -0,0 +1,382 @@
+# export.py
+import argparse
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
+
+from TOOL.Features import FEATURE_COLUMNS
+from TOOL.Historian import HISTORIAN_DIR, PARTITION_SECONDS, partition_name, read_records
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # 可选依赖，没有安装时只能导出CSV
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+BATCH_ROWS = 5000  # 每次从数据库取出/写入的行数，导出时内存占用与总行数无关
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+# SQLite 声明类型 -> Arrow 类型名
+ARROW_TYPES = {"INTEGER": "int64", "REAL": "float64", "TEXT": "string"}
+
+# 命令行可导出的数据：名称 -> (数据库, 表, [(表头, 列名)], 时间列, 时间格式)
+# 时间格式与 Retention.RetentionPolicy 相同："epoch" 或 strftime 格式
+DATASETS = {
+    "alarms": ("robot_alarms.db", "alarm_history",
+               [("报警项目", "alarm_name"), ("报警值", "alarm_value"),
+                ("出现时间", "start_time"), ("恢复时间", "end_time"), ("黑匣子", "blackbox")],
+               "start_time", "%Y-%m-%dT%H:%M:%S"),
+    "production": ("production_statistics.db", "production_history",
+                   [("日期", "date"), ("加工数量", "count"), ("记录ID", "id")],
+                   "date", "%Y-%m-%d"),
+    "production_events": ("production_statistics.db", "production_events",
+                          [("时间戳", "wall_ts"), ("节拍(秒)", "interval")],
+                          "wall_ts", "epoch"),
+    "tools": ("tool_history.db", "tool_history",
+              [("刀具ID", "tool_id"), ("开始时间", "start_time"), ("结束时间", "end_time"),
+               ("更换原因", "change_reason"), ("新设定寿命", "new_life_setting"), ("操作员", "operator")],
+              "end_time", "%Y-%m-%d %H:%M:%S"),
+    "tools2": ("tool_history2.db", "tool_history",
+               [("刀具ID", "tool_id"), ("开始时间", "start_time"), ("结束时间", "end_time"),
+                ("更换原因", "change_reason"), ("新设定寿命", "new_life_setting"), ("操作员", "operator")],
+               "end_time", "%Y-%m-%d %H:%M:%S"),
+    "cycle_features": ("cycle_features.db", "cycle_features",
+                       [("开始时间", "start_time"), ("结束时间", "end_time"), ("周期(秒)", "duration"),
+                        ("帧数", "samples"), ("截断", "truncated")]
+                       + [(column, column) for column in FEATURE_COLUMNS],
+                       "start_time", "epoch"),
+}
+HISTORIAN_HEADERS = ["时间", "标签", "值"]
+HISTORIAN_TYPES = ["string", "string", "float32"]
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def export_formats():
+    """当前可用的导出格式（扩展名）"""
+    return [ext for ext, fmt in FORMATS.items() if fmt == "csv" or pyarrow is not None]
+
+
+def connect_readonly(db_path):
+    """导出使用独立的只读连接，不占用界面和写线程的连接，结束后关闭"""
+    connection = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True,
+                                 check_same_thread=False)
+    connection.execute("PRAGMA busy_timeout=5000")
+    return connection
+
+
+def fetch_batches(cursor, size=BATCH_ROWS):
+    """把查询结果按批取出（fetchmany），每批是行的列表"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def column_types(connection, table, columns):
+    """按表的声明类型确定 Arrow 列类型，未知类型按字符串处理"""
+    declared = {row[1]: (row[2] or "").upper() for row in connection.execute(f"PRAGMA table_info({table})")}
+    return [ARROW_TYPES.get(declared.get(column, ""), "string") for column in columns]
+
+
+class _CsvWriter:
+    def __init__(self, path, headers, types):
+        # utf-8-sig 使 Excel 能正确识别中文
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(headers)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path, headers, types, fmt):
+        self.schema = pyarrow.schema([(header, getattr(pyarrow, type_name)())
+                                      for header, type_name in zip(headers, types)])
+        if fmt == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.sink = pyarrow.OSFile(path, "wb")
+            self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+    def write(self, rows):
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(zip(*rows), self.schema)]
+        self.writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        if hasattr(self, "sink"):
+            self.sink.close()
+
+
+def export(path, headers, batches, types=None, fmt=None, progress=None, stop_event=None):
+    """
+    把按批产生的行流式写入文件，先写临时文件，完成后再替换，中途失败或取消不会留下不完整的文件
+    :param batches: 产生行列表的迭代器（如 fetch_batches）
+    :param types: Arrow 列类型名（Parquet/Arrow 需要），默认全部为字符串
+    :param fmt: "csv" / "parquet" / "arrow"，默认按扩展名
+    :param progress: progress(已写行数)，每批调用一次
+    :param stop_event: 设置后取消导出（抛出 ExportCancelled）
+    :return: 写入的行数
+    """
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+    if fmt != "csv" and pyarrow is None:
+        raise RuntimeError("导出 Parquet/Arrow 需要安装 pyarrow")
+    temp_path = path + ".tmp"
+    if fmt == "csv":
+        writer = _CsvWriter(temp_path, headers, types)
+    else:
+        writer = _ArrowWriter(temp_path, headers, types or ["string"] * len(headers), fmt)
+    rows = 0
+    try:
+        for batch in batches:
+            if stop_event is not None and stop_event.is_set():
+                raise ExportCancelled()
+            writer.write(batch)
+            rows += len(batch)
+            if progress:
+                progress(rows)
+        writer.close()
+        os.replace(temp_path, path)
+    except BaseException:
+        writer.close()
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return rows
+
+
+def export_query(db_path, sql, params, headers, path, table=None, columns=None, fmt=None,
+                 progress=None, stop_event=None):
+    """
+    导出一个SQL查询的结果
+    :param table: 查询的表，和 columns 一起用于确定 Parquet/Arrow 列类型
+    """
+    connection = connect_readonly(db_path)
+    try:
+        types = column_types(connection, table, columns) if table and columns else None
+        return export(path, headers, fetch_batches(connection.execute(sql, params)), types, fmt,
+                      progress, stop_event)
+    finally:
+        connection.close()
+
+
+def time_filter(column, time_format, start=None, end=None):
+    """把 [start, end) 时间范围转换为 (WHERE条件, 参数)"""
+    conditions, params = [], []
+    for moment, operator in ((start, ">="), (end, "<")):
+        if moment is None:
+            continue
+        conditions.append(f"{column} {operator} ?")
+        params.append(moment.timestamp() if time_format == "epoch" else moment.strftime(time_format))
+    return " AND ".join(conditions), params
+
+
+def export_dataset(name, path, start=None, end=None, fmt=None, progress=None, stop_event=None):
+    """按 DATASETS 中的定义导出 [start, end) 的数据，按时间排序"""
+    db_path, table, columns, time_column, time_format = DATASETS[name]
+    where, params = time_filter(time_column, time_format, start, end)
+    sql = (f"SELECT {', '.join(column for _, column in columns)} FROM {table} "
+           f"{'WHERE ' + where if where else ''} ORDER BY {time_column}, rowid")
+    return export_query(db_path, sql, params, [header for header, _ in columns], path, table,
+                        [column for _, column in columns], fmt, progress, stop_event)
+
+
+def historian_tags(root=HISTORIAN_DIR):
+    """历史库中出现过的标签"""
+    tags = set()
+    for directory, _, files in os.walk(root):
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext in (".seg", ".gor"):
+                tags.add(stem)
+    return sorted(tags)
+
+
+def _local_time_strings(times):
+    """
+    时间戳数组 -> 本地时间字符串（精确到毫秒），向量化格式化。
+    一批记录属于同一个UTC小时分区，时区偏移（夏令时只在整点切换）取第一条记录的即可
+    """
+    utc_offset = time.localtime(float(times[0])).tm_gmtoff
+    local = np.rint((times + utc_offset) * 1000).astype("datetime64[ms]")
+    return np.char.replace(np.datetime_as_string(local, unit="ms"), "T", " ").tolist()
+
+
+def historian_batches(tags, start, end, root=HISTORIAN_DIR, size=BATCH_ROWS):
+    """
+    逐个分区、逐个标签读取历史库原始记录，按批产生 (时间, 标签, 值) 行。
+    只读取文件，不需要运行中的 Historian；内存占用不超过一个分区一个标签的数据。
+    """
+    t0, t1 = start.timestamp(), end.timestamp()
+    first, last = partition_name(int(t0 // PARTITION_SECONDS)), partition_name(int(t1 // PARTITION_SECONDS))
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return
+    for name in names:
+        directory = os.path.join(root, name)
+        if not (first <= name <= last and os.path.isdir(directory)):
+            continue
+        for tag in tags:
+            records = read_records(directory, tag)
+            if records is None:
+                continue
+            times = records["t"]
+            lo = int(times.searchsorted(t0, side="left"))
+            hi = int(times.searchsorted(t1, side="left"))
+            for offset in range(lo, hi, size):
+                chunk = records[offset:min(hi, offset + size)]
+                yield list(zip(_local_time_strings(chunk["t"]), [tag] * len(chunk), chunk["v"].tolist()))
+            del records
+
+
+def export_historian(path, tags, start, end, root=HISTORIAN_DIR, fmt=None, progress=None, stop_event=None):
+    """导出历史库 [start, end) 的原始记录"""
+    return export(path, HISTORIAN_HEADERS, historian_batches(tags, start, end, root), HISTORIAN_TYPES,
+                  fmt, progress, stop_event)
+
+
+class ExportThread(QThread):
+    """在后台线程导出分页表格（PagedTableModel）当前筛选和排序下的全部数据"""
+
+    total = Signal(int)  # 总行数
+    progress = Signal(int)  # 已导出行数
+    finished_export = Signal(int, str)  # 导出行数, 错误信息（成功为空，取消为"已取消"）
+
+    def __init__(self, model, path):
+        super().__init__()
+        self.db_path = model.db.path
+        self.sql, self.params = model.select_sql()
+        self.count_sql, self.count_params = model.count_sql()
+        self.headers = list(model.headers)
+        self.table = model.table
+        self.columns = list(model.columns)
+        self.path = path
+        self.stop_event = threading.Event()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def run(self):
+        try:
+            connection = connect_readonly(self.db_path)
+            try:
+                self.total.emit(connection.execute(self.count_sql, self.count_params).fetchone()[0])
+            finally:
+                connection.close()
+            rows = export_query(self.db_path, self.sql, self.params, self.headers, self.path,
+                                self.table, self.columns, progress=self.progress.emit,
+                                stop_event=self.stop_event)
+        except ExportCancelled:
+            self.finished_export.emit(0, "已取消")
+        except Exception as e:
+            logger.error("导出失败 %s: %s", self.path, e)
+            self.finished_export.emit(0, str(e))
+        else:
+            self.finished_export.emit(rows, "")
+
+
+_running_exports = set()  # 持有正在运行的导出线程，避免对话框关闭后线程对象被回收
+
+
+def export_model(parent, model, name):
+    """
+    历史记录对话框的“导出”按钮：选择文件后在后台线程导出，显示进度，可以取消
+    :param name: 默认文件名前缀
+    """
+    filters = {
+        ".csv": "CSV 文件 (*.csv)",
+        ".parquet": "Parquet 文件 (*.parquet)",
+        ".arrow": "Arrow 文件 (*.arrow)",
+    }
+    available = [filters[ext] for ext in export_formats() if ext in filters]
+    default_path = f"{name}_{datetime.now():%Y%m%d_%H%M%S}.csv"
+    path, _ = QFileDialog.getSaveFileName(parent, "导出", default_path, ";;".join(available))
+    if not path:
+        return None
+
+    thread = ExportThread(model, path)
+    dialog = QProgressDialog("正在导出...", "取消", 0, 0, parent)
+    dialog.setWindowTitle("导出")
+    dialog.setWindowModality(Qt.WindowModal)
+    dialog.setMinimumDuration(300)
+    thread.total.connect(dialog.setMaximum)
+    thread.progress.connect(dialog.setValue)
+    dialog.canceled.connect(thread.cancel)
+
+    def finished(rows, error):
+        _running_exports.discard(thread)
+        dialog.reset()
+        if not error:
+            QMessageBox.information(parent, "导出", f"已导出 {rows} 条记录到\n{path}")
+        elif error != "已取消":
+            QMessageBox.warning(parent, "导出失败", error)
+
+    thread.finished_export.connect(finished)
+    _running_exports.add(thread)
+    thread.start()
+    return thread
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="导出报警、产量、刀具历史和历史库数据")
+    parser.add_argument("dataset", choices=list(DATASETS) + ["historian"], help="导出的数据")
+    parser.add_argument("-o", "--output", required=True, help="输出文件（.csv/.parquet/.arrow）")
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD（包含当天）")
+    parser.add_argument("--days", type=int, help="导出今天之前的 N 个整天（定时任务使用）")
+    parser.add_argument("--tags", nargs="*", help="历史库标签，默认全部")
+    parser.add_argument("--root", default=HISTORIAN_DIR, help="历史库目录")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    if args.days:
+        start, end = today - timedelta(days=args.days), today
+    else:
+        start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else None
+        end = datetime.strptime(args.end, "%Y-%m-%d") + timedelta(days=1) if args.end else None
+
+    def progress(rows):
+        print(f"\r已导出 {rows} 条", end="", file=sys.stderr)
+
+    try:
+        if args.dataset == "historian":
+            tags = args.tags or historian_tags(args.root)
+            rows = export_historian(args.output, tags, start or datetime.fromtimestamp(0), end or datetime.now(),
+                                    args.root, progress=progress)
+        else:
+            rows = export_dataset(args.dataset, args.output, start, end, progress=progress)
+    except (OSError, sqlite3.Error, RuntimeError) as e:
+        print(f"\n导出失败: {e}", file=sys.stderr)
+        return 1
+    print(f"\r已导出 {rows} 条到 {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
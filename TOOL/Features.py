@@ -0,0 +1,172 @@
+# features.py
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+import numpy as np
+
+from TOOL.Storage import open_database
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "cycle_features.db"
+CYCLE_SIGNAL = "V750.0"  # 生产节拍信号，上升沿分割周期（与产量计数相同）
+CURRENT_ADDRESSES = [1248, 1252, 1256, 1260, 1264, 1268]  # 关节1~6电流 (A)
+TORQUE_ADDRESSES = [1272, 1276, 1280, 1284, 1288, 1292]  # 关节1~6扭矩 (Nm)
+MAX_CYCLE_FRAMES = 60000  # 周期缓冲区容量（100Hz约10分钟），更长的周期只保留前面的帧
+MIN_CYCLE_FRAMES = 2
+MAX_FRAME_GAP = 5.0  # 周期内两帧间隔超过该值（秒，断线或停止监控）时丢弃该周期
+
+# 每个通道的特征：均方根、峰值（绝对值最大）、绝对值对时间的积分
+STATS = ("rms", "peak", "integral")
+CHANNELS = ([f"j{joint}_current" for joint in range(1, 7)]
+            + [f"j{joint}_torque" for joint in range(1, 7)])
+FEATURE_COLUMNS = [f"{channel}_{stat}" for stat in STATS for channel in CHANNELS]
+
+
+def _migrate_v1(connection):
+    columns = ",\n".join(f"{column} REAL" for column in FEATURE_COLUMNS)
+    connection.execute(f"""
+        CREATE TABLE IF NOT EXISTS cycle_features (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_time REAL NOT NULL,
+            end_time REAL NOT NULL,
+            duration REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            truncated INTEGER NOT NULL DEFAULT 0,
+            {columns}
+        )
+    """)
+    connection.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cycle_features_start
+        ON cycle_features (start_time)
+    """)
+
+
+# 按版本顺序排列的表结构迁移（PRAGMA user_version）
+FEATURE_MIGRATIONS = [_migrate_v1]
+
+
+def cycle_features(times, values):
+    """
+    一个周期的特征（向量化，按通道一次计算）
+    采样间隔不均匀，RMS 和积分都按时间加权（梯形积分）
+    :param times: float64 时间戳 (n,)
+    :param values: float32 通道值 (n, 通道数)
+    :return: (rms, peak, integral)，各为 (通道数,) 数组
+    """
+    values = values.astype(np.float64)
+    dt = np.diff(times)
+    duration = times[-1] - times[0]
+    magnitude = np.abs(values)
+    squares = values * values
+    # 梯形积分：相邻两帧的平均值乘以间隔
+    integral = ((magnitude[1:] + magnitude[:-1]) * 0.5 * dt[:, None]).sum(axis=0)
+    mean_square = ((squares[1:] + squares[:-1]) * 0.5 * dt[:, None]).sum(axis=0) / duration \
+        if duration > 0 else squares.mean(axis=0)
+    return np.sqrt(mean_square), magnitude.max(axis=0), integral
+
+
+class CycleFeatureExtractor:
+    """
+    按生产周期提取关节电流/扭矩特征，用于磨损趋势分析，不保存原始数据。
+
+    append() 在 PLCWorker 线程中每帧调用，只把12个通道写入预先分配的周期缓冲区；
+    CYCLE_SIGNAL 上升沿时复制出这个周期的数据，由写线程做一次向量化计算并写入一行特征。
+    启动后第一个上升沿之前的数据不完整，不产生特征行。
+
+    :param vd_addresses: PLCWorker 每帧VD数据的地址顺序（与 append 的 row 对应）
+    """
+
+    def __init__(self, vd_addresses, db_name=DB_NAME, capacity=MAX_CYCLE_FRAMES):
+        self.db = open_database(db_name, "history", FEATURE_MIGRATIONS)
+        columns = [list(vd_addresses).index(addr) for addr in CURRENT_ADDRESSES + TORQUE_ADDRESSES]
+        self.pick = itemgetter(*columns)
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(columns)), dtype=np.float32)
+        self.count = 0
+        self.frames = 0  # 当前周期的总帧数（可能超过缓冲区容量）
+        self.started = False  # 是否已经遇到过上升沿
+        self.last_signal = False
+        self.last_time = None
+        self.cycles = 0
+        self.last_compute_time = 0.0
+        self.insert_sql = (f"INSERT INTO cycle_features (start_time, end_time, duration, samples, truncated, "
+                           f"{', '.join(FEATURE_COLUMNS)}) "
+                           f"VALUES ({', '.join('?' * (5 + len(FEATURE_COLUMNS)))})")
+        # 每个周期只写一行，由单独的线程提交，不占用PLC轮询线程
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FeatureWriter")
+
+    def append(self, timestamp, row, signal):
+        """
+        写入一帧
+        :param row: 按 vd_addresses 顺序的VD值
+        :param signal: CYCLE_SIGNAL 当前值
+        """
+        if self.last_time is not None and timestamp - self.last_time > MAX_FRAME_GAP:
+            # 数据中断，当前周期不完整，等下一个上升沿重新开始
+            self.started = False
+            self.count = self.frames = 0
+        self.last_time = timestamp
+
+        rising = signal and not self.last_signal
+        self.last_signal = signal
+        if rising and self.started:
+            # 上升沿这一帧既是上一个周期的最后一帧，也是下一个周期的第一帧，周期时长为两个上升沿的间隔
+            self._store(timestamp, row)
+            if self.count >= MIN_CYCLE_FRAMES:
+                self._finish_cycle()
+        if rising:
+            self.started = True
+            self.count = self.frames = 0
+        self._store(timestamp, row)
+
+    def _store(self, timestamp, row):
+        if self.count < self.capacity:
+            self.times[self.count] = timestamp
+            self.values[self.count] = self.pick(row)
+            self.count += 1
+        self.frames += 1
+
+    def _finish_cycle(self):
+        # 缓冲区下一帧就会被覆盖，先复制
+        self.writer.submit(self._write, self.times[:self.count].copy(), self.values[:self.count].copy(),
+                           self.frames)
+
+    def _write(self, times, values, frames):
+        start = time.perf_counter()
+        rms, peak, integral = cycle_features(times, values)
+        record = (float(times[0]), float(times[-1]), float(times[-1] - times[0]), frames,
+                  int(frames > len(times)), *np.concatenate((rms, peak, integral)).tolist())
+        self.last_compute_time = time.perf_counter() - start
+        self.cycles += 1
+        try:
+            with self.db.transaction() as connection:
+                connection.execute(self.insert_sql, record)
+        except sqlite3.Error as e:
+            logger.error("周期特征写入错误: %s", e)
+
+    def history(self, start, end, columns=("duration",)):
+        """
+        [start, end) 内各周期的特征，用于磨损趋势
+        :param start: 开始时间戳
+        :param end: 结束时间戳
+        :param columns: FEATURE_COLUMNS 中的列名或 duration / samples
+        :return: [(start_time, 列值...)]，按时间顺序
+        """
+        for column in columns:
+            if column not in FEATURE_COLUMNS and column not in ("duration", "samples"):
+                raise ValueError(f"未知的特征列: {column}")
+        return self.db.query(f"""
+            SELECT start_time, {', '.join(columns)} FROM cycle_features
+            WHERE start_time >= ? AND start_time < ?
+            ORDER BY start_time
+        """, (start, end))
+
+    def close(self):
+        """等待未写入的特征行写完"""
+        self.writer.shutdown(wait=True)
+        self.db.close()
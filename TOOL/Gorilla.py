@@ -0,0 +1,190 @@
+# gorilla.py
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+# 历史库段文件压缩格式（参考Gorilla：时间戳用二阶差分，浮点值与前一个值做XOR）
+# 为了能用numpy向量化解码，变长编码按字节对齐：
+#   时间戳：毫秒刻度的二阶差分，zigzag后用varint（每字节7位）编码
+#   数值：float32位模式与前一个值XOR，去掉前导/尾随的零字节，
+#         每个值一个4位控制码（前导零字节数*4+尾随零字节数，15表示与前值相同），两个控制码占一个字节
+MAGIC = b"GOR1"
+HEADER = struct.Struct("<4sIqII")  # 标识, 记录数, 第一个时间刻度, varint字节数, 数值字节数
+TIME_TICK = 0.001  # 时间戳精度（秒）
+SAME_VALUE = 15
+
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("v", "<f4")])
+
+
+def _zigzag(values):
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def _varint_encode(values):
+    """uint64数组 -> varint字节（向量化，每个值最多10字节）"""
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += (values >> np.uint64(7 * k)) != 0
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    out = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    for k in range(10):
+        mask = lengths > k
+        if not mask.any():
+            break
+        chunk = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = (chunk | more).astype(np.uint8)
+    return out
+
+
+def _varint_decode(data, count):
+    """varint字节 -> uint64数组（向量化）"""
+    if count == 0:
+        return np.empty(0, dtype=np.uint64)
+    last = (data & 0x80) == 0
+    starts = np.flatnonzero(np.r_[True, last[:-1]])
+    group = np.cumsum(np.r_[False, last[:-1]])
+    position = np.arange(len(data)) - starts[group]
+    parts = (data & 0x7F).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    return np.bitwise_or.reduceat(parts, starts)[:count]
+
+
+def encode(times, values):
+    """
+    压缩按时间有序的 (时间, 值) 序列
+    :param times: float64 时间戳（秒），按 TIME_TICK 取整
+    :param values: float32 数值（无损）
+    :return: bytes
+    """
+    count = len(times)
+    ticks = np.rint(np.asarray(times, dtype=np.float64) / TIME_TICK).astype(np.int64)
+    first = int(ticks[0]) if count else 0
+    deltas = np.diff(ticks)
+    dod = np.diff(deltas, prepend=0)
+    time_bytes = _varint_encode(_zigzag(dod))
+
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    xor = bits ^ np.r_[np.uint32(0), bits[:-1]].astype(np.uint32)
+    nonzero = xor != 0
+    lead = ((xor < 1 << 24).astype(np.int64) + (xor < 1 << 16) + (xor < 1 << 8))
+    trail = (((xor & 0xFF) == 0).astype(np.int64) + ((xor & 0xFFFF) == 0) + ((xor & 0xFFFFFF) == 0))
+    lead[~nonzero] = 0
+    trail[~nonzero] = 0
+    lengths = np.where(nonzero, 4 - lead - trail, 0)
+    codes = np.where(nonzero, lead * 4 + trail, SAME_VALUE).astype(np.uint8)
+    if count % 2:
+        codes = np.r_[codes, np.uint8(SAME_VALUE)]
+    control = (codes[0::2] << 4) | codes[1::2]
+
+    meaningful = xor >> (8 * trail).astype(np.uint32)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    data = np.empty(int(ends[-1]) if count else 0, dtype=np.uint8)
+    for k in range(4):
+        mask = lengths > k
+        shift = (8 * (lengths[mask] - 1 - k)).astype(np.uint32)
+        data[starts[mask] + k] = ((meaningful[mask] >> shift) & 0xFF).astype(np.uint8)
+
+    header = HEADER.pack(MAGIC, count, first, len(time_bytes), len(data))
+    return b"".join((header, time_bytes.tobytes(), control.tobytes(), data.tobytes()))
+
+
+def decode(buffer):
+    """
+    解压 encode() 的结果（向量化，无逐条Python循环）
+    :return: RECORD_DTYPE 数组
+    """
+    magic, count, first, time_length, data_length = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("不是历史库压缩段文件")
+    raw = np.frombuffer(buffer, dtype=np.uint8, offset=HEADER.size)
+    time_bytes = raw[:time_length]
+    control = raw[time_length:time_length + (count + 1) // 2]
+    data = raw[time_length + len(control):time_length + len(control) + data_length]
+
+    records = np.empty(count, dtype=RECORD_DTYPE)
+    if count == 0:
+        return records
+    dod = _unzigzag(_varint_decode(time_bytes, count - 1))
+    ticks = np.empty(count, dtype=np.int64)
+    ticks[0] = first
+    np.cumsum(np.cumsum(dod), out=ticks[1:])
+    ticks[1:] += first
+    records["t"] = ticks * TIME_TICK
+
+    codes = np.empty(len(control) * 2, dtype=np.uint8)
+    codes[0::2] = control >> 4
+    codes[1::2] = control & 0x0F
+    codes = codes[:count]
+    same = codes == SAME_VALUE
+    lead = (codes >> 2).astype(np.int64)
+    trail = (codes & 0x03).astype(np.int64)
+    lengths = np.where(same, 0, 4 - lead - trail)
+    trail[same] = 0
+    starts = np.cumsum(lengths) - lengths
+    meaningful = np.zeros(count, dtype=np.uint32)
+    for k in range(4):
+        mask = lengths > k
+        meaningful[mask] = (meaningful[mask] << 8) | data[starts[mask] + k]
+    xor = meaningful << (8 * trail).astype(np.uint32)
+    records["v"] = np.bitwise_xor.accumulate(xor).view(np.float32)
+    return records
+
+
+def report(root="historian"):
+    """
+    对已记录的原始段文件（.seg）做压缩测试，校验无损并统计压缩率和吞吐量
+    """
+    raw_bytes = packed_bytes = records = 0
+    encode_time = decode_time = 0.0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(".seg"):
+                continue
+            path = os.path.join(directory, name)
+            segment = np.fromfile(path, dtype=RECORD_DTYPE,
+                                  count=os.path.getsize(path) // RECORD_DTYPE.itemsize)
+            if len(segment) == 0:
+                continue
+            start = time.perf_counter()
+            packed = encode(segment["t"], segment["v"])
+            encode_time += time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = decode(packed)
+            decode_time += time.perf_counter() - start
+            if not (np.array_equal(decoded["v"].view(np.uint32), segment["v"].view(np.uint32))
+                    and np.abs(decoded["t"] - segment["t"]).max() <= TIME_TICK / 2 + 1e-6):
+                raise ValueError(f"压缩校验失败: {path}")
+            raw_bytes += segment.nbytes
+            packed_bytes += len(packed)
+            records += len(segment)
+    if not records:
+        return None
+    return {
+        "records": records,
+        "raw_bytes": raw_bytes,
+        "packed_bytes": packed_bytes,
+        "ratio": raw_bytes / packed_bytes,
+        "bytes_per_record": packed_bytes / records,
+        "encode_mb_s": raw_bytes / encode_time / 1e6,
+        "decode_mb_s": raw_bytes / decode_time / 1e6,
+    }
+
+
+if __name__ == "__main__":
+    result = report(sys.argv[1] if len(sys.argv) > 1 else "historian")
+    if result is None:
+        print("没有找到原始段文件")
+    else:
+        print(f"记录数: {result['records']}")
+        print(f"原始: {result['raw_bytes'] / 1e6:.2f} MB，压缩后: {result['packed_bytes'] / 1e6:.2f} MB，"
+              f"压缩率: {result['ratio']:.2f}，每条 {result['bytes_per_record']:.2f} 字节")
+        print(f"编码: {result['encode_mb_s']:.0f} MB/s，解码: {result['decode_mb_s']:.0f} MB/s")
@@ -0,0 +1,507 @@
+# historian.py
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from TOOL import Gorilla
+
+logger = logging.getLogger(__name__)
+
+HISTORIAN_DIR = "historian"
+PARTITION_SECONDS = 3600  # 每个分区（目录）保存一小时的数据
+FLUSH_INTERVAL = 1.0  # 写线程把内存中的记录追加到段文件的间隔（秒）
+RETENTION_DAYS = 30  # 分区保留天数
+LOOKBACK_PARTITIONS = 24  # 查询起点之前最多向前查找多少个分区来确定初始值
+
+# 段文件记录：采样时间 + 值，紧凑排列 12 字节
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("v", "<f4")])
+
+# 汇总分辨率（秒），均能整除分区长度，每个汇总桶只属于一个分区
+ROLLUP_RESOLUTIONS = (1, 60, 3600)
+# 汇总记录：桶起始时间、最小、最大、总和（求均值）、记录数、第一个值、最后一个值
+ROLLUP_DTYPE = np.dtype([("t", "<f8"), ("min", "<f4"), ("max", "<f4"), ("sum", "<f8"),
+                         ("count", "<u4"), ("first", "<f4"), ("last", "<f4")])
+DEFAULT_MAX_POINTS = 2000  # 自动选择分辨率时的默认点数上限
+COMPRESSED_SUFFIX = "gor"  # 已结束分区的原始段文件压缩后的后缀（见 Gorilla.py）
+
+# 浮点量按单位设置死区，变化不超过死区时不记录；开关量和状态字节死区为0（任何变化都记录）
+UNIT_DEADBANDS = {
+    "度": 0.01,
+    "度/秒": 0.05,
+    "度/s": 0.05,
+    "A": 0.01,
+    "Nm": 0.05,
+    "mm": 0.01,
+    "mm/s": 0.05,
+}
+
+
+def partition_name(partition):
+    """分区目录名，用UTC小时命名，避免夏令时切换时重名"""
+    return time.strftime("%Y%m%d_%H", time.gmtime(partition * PARTITION_SECONDS))
+
+
+def rollup_suffix(resolution):
+    return f"r{resolution}"
+
+
+def aggregate(times, values, resolution):
+    """
+    把按时间有序的记录按 resolution 秒分桶汇总（向量化，每桶一行）
+    :return: ROLLUP_DTYPE 数组
+    """
+    buckets = np.floor(times / resolution) * resolution
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)]
+    result = np.empty(len(starts), dtype=ROLLUP_DTYPE)
+    result["t"] = buckets[starts]
+    result["min"] = np.minimum.reduceat(values, starts)
+    result["max"] = np.maximum.reduceat(values, starts)
+    result["sum"] = np.add.reduceat(values.astype(np.float64), starts)
+    result["count"] = ends - starts
+    result["first"] = values[starts]
+    result["last"] = values[ends - 1]
+    return result
+
+
+def combine(rollups):
+    """
+    合并起始时间相同的汇总行（如程序重启前后写入的同一个桶），输入需按时间有序
+    """
+    if len(rollups) < 2:
+        return rollups
+    starts = np.flatnonzero(np.r_[True, rollups["t"][1:] != rollups["t"][:-1]])
+    if len(starts) == len(rollups):
+        return rollups
+    ends = np.r_[starts[1:], len(rollups)]
+    result = np.empty(len(starts), dtype=ROLLUP_DTYPE)
+    result["t"] = rollups["t"][starts]
+    result["min"] = np.minimum.reduceat(rollups["min"], starts)
+    result["max"] = np.maximum.reduceat(rollups["max"], starts)
+    result["sum"] = np.add.reduceat(rollups["sum"], starts)
+    result["count"] = np.add.reduceat(rollups["count"], starts)
+    result["first"] = rollups["first"][starts]
+    result["last"] = rollups["last"][ends - 1]
+    return result
+
+
+def map_file(path, dtype):
+    """内存映射一个段文件，忽略崩溃时写了一半的最后一条记录"""
+    try:
+        count = os.path.getsize(path) // dtype.itemsize
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+    except OSError:
+        return None
+
+
+def read_records(directory, tag):
+    """
+    一个分区一个标签的原始记录：压缩部分（.gor）在前，未压缩部分（.seg）在后。
+    只读，不需要 Historian 对象（导出等其他进程也可以使用）
+    """
+    raw = map_file(os.path.join(directory, f"{tag}.seg"), RECORD_DTYPE)
+    try:
+        with open(os.path.join(directory, f"{tag}.{COMPRESSED_SUFFIX}"), "rb") as file:
+            packed = Gorilla.decode(file.read())
+    except OSError:
+        return raw
+    if len(packed) == 0:
+        return raw
+    if raw is None:
+        return packed
+    # 压缩完成到删除 .seg 之间读到的重复记录去掉
+    raw = raw[np.searchsorted(raw["t"], packed["t"][-1] + Gorilla.TIME_TICK, side="right"):]
+    return np.concatenate([packed, raw]) if len(raw) else packed
+
+
+class Historian:
+    """
+    变化记录的时序历史库。
+
+    每帧由 PLCWorker 调用 record()，与上次记录的值比较（浮点量使用死区），
+    只有变化的标签进入内存队列，比较是向量化的，每帧开销与标签数无关地很小。
+    写线程每 FLUSH_INTERVAL 秒把记录按 分区/标签 追加到段文件
+    historian/<UTC小时>/<标签>.seg，段文件只追加，按时间有序；
+    查询时用 np.memmap 映射段文件，二分查找时间范围，只复制需要的部分。
+
+    写入原始记录的同时维护 1秒/1分钟/1小时 汇总（<标签>.r1、.r60、.r3600）：
+    尚未结束的桶保存在内存中，桶结束后才追加到汇总文件。
+    汇总基于记录的变化值（不是按时间加权），可以用 rebuild_rollups() 从原始段文件并行重建。
+
+    分区结束后，原始段文件压缩为 <标签>.gor（时间戳二阶差分 + 浮点XOR，时间精确到毫秒），
+    读取时整段向量化解压；汇总文件本身很小，不压缩。
+    """
+
+    def __init__(self, tags, deadbands=None, root=HISTORIAN_DIR, flush_interval=FLUSH_INTERVAL,
+                 retention_days=RETENTION_DAYS):
+        self.tags = list(tags)
+        self.tag_index = {tag: i for i, tag in enumerate(self.tags)}
+        deadbands = deadbands or {}
+        self.deadbands = np.array([deadbands.get(tag, 0.0) for tag in self.tags], dtype=np.float64)
+        self.root = root
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        os.makedirs(root, exist_ok=True)
+
+        # 每个标签最后一次记录的值，NaN表示尚未记录（第一帧全部记录）
+        self.last_values = np.full(len(self.tags), np.nan)
+        self.lock = threading.Lock()
+        self.pending = []  # [(时间, 变化的标签序号, 值)]
+        self.frames = 0
+        self.records = 0
+        self.record_time = 0.0  # record() 累计耗时（秒）
+
+        # 以下只由写入线程使用（flush_lock 保护）
+        self.flush_lock = threading.Lock()
+        self.files = {}  # (分区, 标签序号, 后缀) -> 打开的段文件/汇总文件
+        self.open_buckets = {}  # (标签序号, 分辨率) -> 尚未结束的汇总桶（长度1的数组）
+        self.bytes_written = 0
+        self.bytes_sealed = 0  # 已压缩的原始段文件字节数
+        self.bytes_compressed = 0  # 压缩后的字节数
+        self.last_cleanup = 0.0
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._flush_loop, name="HistorianWriter", daemon=True)
+        self.thread.start()
+
+    def record(self, timestamp, values):
+        """
+        记录一帧数据（PLCWorker线程调用）
+        :param timestamp: 本次轮询的时间戳
+        :param values: 与 self.tags 顺序一致的值
+        """
+        start = time.perf_counter()
+        values = np.asarray(values, dtype=np.float64)
+        last = self.last_values
+        # NaN 比较结果为 False，所以用 ~(<=) 同时选出超出死区和尚未记录的标签
+        changed = np.flatnonzero(~(np.abs(values - last) <= self.deadbands))
+        if changed.size:
+            changed_values = values[changed]
+            last[changed] = changed_values
+            with self.lock:
+                self.pending.append((timestamp, changed, changed_values))
+                self.records += changed.size
+        self.frames += 1
+        self.record_time += time.perf_counter() - start
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - self.last_cleanup > PARTITION_SECONDS:
+                    self.cleanup()
+            except OSError as e:
+                logger.error("历史数据写入错误: %s", e)
+
+    def flush(self):
+        """把内存中的记录追加到段文件"""
+        with self.flush_lock:
+            with self.lock:
+                pending = self.pending
+                self.pending = []
+            if not pending:
+                return
+
+            counts = [len(changed) for _, changed, _ in pending]
+            times = np.repeat([t for t, _, _ in pending], counts)
+            tag_ids = np.concatenate([changed for _, changed, _ in pending])
+            values = np.concatenate([v for _, _, v in pending])
+            partitions = (times // PARTITION_SECONDS).astype(np.int64)
+
+            # 按 (分区, 标签) 稳定排序，同一段文件的记录保持时间顺序并连续
+            order = np.lexsort((tag_ids, partitions))
+            times, tag_ids, values, partitions = times[order], tag_ids[order], values[order], partitions[order]
+            records = np.empty(len(times), dtype=RECORD_DTYPE)
+            records["t"] = times
+            records["v"] = values
+
+            boundaries = np.flatnonzero((np.diff(tag_ids) != 0) | (np.diff(partitions) != 0)) + 1
+            starts = np.r_[0, boundaries]
+            ends = np.r_[boundaries, len(times)]
+            for start, end in zip(starts, ends):
+                partition, tag_id = int(partitions[start]), int(tag_ids[start])
+                segment = self._segment_file(partition, tag_id)
+                segment.write(records[start:end].tobytes())
+                for resolution in ROLLUP_RESOLUTIONS:
+                    self._update_rollup(tag_id, resolution, aggregate(times[start:end], values[start:end], resolution))
+            for segment in self.files.values():
+                segment.flush()
+            self.bytes_written += records.nbytes
+
+            # 关闭已经结束的分区的文件，之后写入的跨分区汇总桶会重新打开汇总文件
+            current = int(times[-1] // PARTITION_SECONDS)
+            closed = set()
+            for key in [key for key in self.files if key[0] < current]:
+                self.files.pop(key).close()
+                closed.add(key[0])
+            for partition in sorted(closed):
+                self.seal_partition(partition_name(partition))
+
+    def _update_rollup(self, tag_id, resolution, buckets):
+        """把本批记录的汇总并入内存中的未结束桶，已结束的桶追加到汇总文件"""
+        key = (tag_id, resolution)
+        open_bucket = self.open_buckets.get(key)
+        if open_bucket is not None:
+            if open_bucket["t"][0] == buckets["t"][0]:
+                head = buckets[:1]
+                head["min"] = np.minimum(head["min"], open_bucket["min"])
+                head["max"] = np.maximum(head["max"], open_bucket["max"])
+                head["sum"] += open_bucket["sum"]
+                head["count"] += open_bucket["count"]
+                head["first"] = open_bucket["first"]
+            else:
+                self._write_rollup(tag_id, resolution, open_bucket)
+        if len(buckets) > 1:
+            self._write_rollup(tag_id, resolution, buckets[:-1])
+        self.open_buckets[key] = buckets[-1:].copy()
+
+    def _write_rollup(self, tag_id, resolution, buckets):
+        partition = int(buckets["t"][0] // PARTITION_SECONDS)
+        self._segment_file(partition, tag_id, rollup_suffix(resolution)).write(buckets.tobytes())
+
+    def _segment_file(self, partition, tag_id, suffix="seg"):
+        key = (partition, tag_id, suffix)
+        segment = self.files.get(key)
+        if segment is None:
+            directory = os.path.join(self.root, partition_name(partition))
+            os.makedirs(directory, exist_ok=True)
+            segment = open(os.path.join(directory, f"{self.tags[tag_id]}.{suffix}"), "ab")
+            self.files[key] = segment
+        return segment
+
+    def segment_path(self, partition, tag, suffix="seg"):
+        return os.path.join(self.root, partition_name(partition), f"{tag}.{suffix}")
+
+    def _read_segment(self, partition, tag, suffix="seg", dtype=RECORD_DTYPE):
+        """读取一个段文件，原始记录包括已压缩的部分"""
+        if suffix == "seg":
+            return read_records(os.path.join(self.root, partition_name(partition)), tag)
+        return map_file(self.segment_path(partition, tag, suffix), dtype)
+
+    def seal_partition(self, name):
+        """
+        把已结束分区的原始段文件压缩为 .gor（先写临时文件再替换，最后删除 .seg）
+        :return: 压缩的段文件数
+        """
+        directory = os.path.join(self.root, name)
+        sealed = 0
+        for tag in self.tags:
+            path = os.path.join(directory, f"{tag}.seg")
+            if not os.path.exists(path):
+                continue
+            records = read_records(directory, tag)
+            if records is not None:
+                target = os.path.join(directory, f"{tag}.{COMPRESSED_SUFFIX}")
+                packed = Gorilla.encode(records["t"], records["v"])
+                with open(target + ".tmp", "wb") as file:
+                    file.write(packed)
+                os.replace(target + ".tmp", target)
+                self.bytes_sealed += records.nbytes
+                self.bytes_compressed += len(packed)
+            del records
+            try:
+                os.remove(path)
+            except OSError as e:
+                # Windows下查询正在映射该文件时无法删除，下次清理时再删（读取时会去掉重复部分）
+                logger.debug("删除已压缩段文件失败 %s: %s", path, e)
+            sealed += 1
+        return sealed
+
+    def query(self, tag, t0, t1, include_prior=True):
+        """
+        查询一个标签在 [t0, t1] 内记录的变化
+        :param include_prior: 是否包含 t0 之前最后一次记录的值（即 t0 时刻的值）
+        :return: (时间数组 float64, 值数组 float32)
+        """
+        if tag not in self.tag_index:
+            raise KeyError(tag)
+        # 先写入内存中的记录，保证结果包含最新数据
+        self.flush()
+
+        times, values = [], []
+        first = int(t0 // PARTITION_SECONDS)
+        last = int(t1 // PARTITION_SECONDS)
+        for partition in range(first, last + 1):
+            segment = self._read_segment(partition, tag)
+            if segment is None:
+                continue
+            seg_times = segment["t"]
+            lo = np.searchsorted(seg_times, t0, side="left")
+            hi = np.searchsorted(seg_times, t1, side="right")
+            if hi > lo:
+                times.append(np.array(seg_times[lo:hi]))
+                values.append(np.array(segment["v"][lo:hi]))
+            del segment
+
+        if include_prior:
+            prior = self._value_before(tag, t0)
+            if prior is not None:
+                times.insert(0, np.array([prior[0]]))
+                values.insert(0, np.array([prior[1]], dtype=np.float32))
+
+        if not times:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        return np.concatenate(times), np.concatenate(values)
+
+    def _value_before(self, tag, t0):
+        """t0 之前最后一次记录的 (时间, 值)，最多向前查找 LOOKBACK_PARTITIONS 个分区"""
+        partition = int(t0 // PARTITION_SECONDS)
+        for offset in range(LOOKBACK_PARTITIONS + 1):
+            segment = self._read_segment(partition - offset, tag)
+            if segment is None:
+                continue
+            index = np.searchsorted(segment["t"], t0, side="left")
+            if index > 0:
+                record = segment[index - 1]
+                return float(record["t"]), float(record["v"])
+        return None
+
+    def count(self, tag, t0, t1):
+        """[t0, t1] 内原始记录数，只做二分查找"""
+        total = 0
+        for partition in range(int(t0 // PARTITION_SECONDS), int(t1 // PARTITION_SECONDS) + 1):
+            segment = self._read_segment(partition, tag)
+            if segment is not None:
+                seg_times = segment["t"]
+                total += int(np.searchsorted(seg_times, t1, side="right") - np.searchsorted(seg_times, t0))
+        return total
+
+    def query_rollup(self, tag, t0, t1, resolution):
+        """
+        查询一个标签在 [t0, t1] 内的汇总桶（包含内存中尚未结束的桶）
+        :return: ROLLUP_DTYPE 数组，均值为 sum / count
+        """
+        if tag not in self.tag_index:
+            raise KeyError(tag)
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"不支持的汇总分辨率: {resolution}")
+        self.flush()
+
+        start = np.floor(t0 / resolution) * resolution
+        parts = []
+        for partition in range(int(start // PARTITION_SECONDS), int(t1 // PARTITION_SECONDS) + 1):
+            rollups = self._read_segment(partition, tag, rollup_suffix(resolution), ROLLUP_DTYPE)
+            if rollups is None:
+                continue
+            lo = np.searchsorted(rollups["t"], start, side="left")
+            hi = np.searchsorted(rollups["t"], t1, side="right")
+            if hi > lo:
+                parts.append(np.array(rollups[lo:hi]))
+            del rollups
+        with self.flush_lock:
+            open_bucket = self.open_buckets.get((self.tag_index[tag], resolution))
+            if open_bucket is not None and start <= open_bucket["t"][0] <= t1:
+                parts.append(open_bucket.copy())
+
+        if not parts:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        return combine(np.concatenate(parts))
+
+    def query_auto(self, tag, t0, t1, max_points=DEFAULT_MAX_POINTS):
+        """
+        按点数上限自动选择分辨率：原始记录数不超过上限时返回原始数据，
+        否则返回桶数不超过上限的最细汇总（都超过时用最粗的1小时汇总）
+        :return: (分辨率, 数据)，分辨率为0时数据是 query() 的 (时间, 值)，否则是汇总数组
+        """
+        if self.count(tag, t0, t1) <= max_points:
+            return 0, self.query(tag, t0, t1)
+        for resolution in ROLLUP_RESOLUTIONS:
+            if (t1 - t0) / resolution <= max_points:
+                return resolution, self.query_rollup(tag, t0, t1, resolution)
+        resolution = ROLLUP_RESOLUTIONS[-1]
+        return resolution, self.query_rollup(tag, t0, t1, resolution)
+
+    def rebuild_rollups(self, partitions=None, workers=None):
+        """
+        从原始段文件重建汇总文件，每个 (分区, 标签) 一个任务并行执行。
+        正在写入的分区跳过。
+        :param partitions: 分区目录名列表，默认全部
+        :return: 重建的段文件数
+        """
+        with self.flush_lock:
+            active = {partition_name(key[0]) for key in self.files}
+        jobs = [(name, tag) for name in (partitions or self.partitions()) if name not in active
+                for tag in self.tags
+                if os.path.exists(os.path.join(self.root, name, f"{tag}.seg"))
+                or os.path.exists(os.path.join(self.root, name, f"{tag}.{COMPRESSED_SUFFIX}"))]
+        # 分桶汇总主要是numpy运算和文件读写，执行时会释放GIL，线程即可并行
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            list(pool.map(lambda job: self._rebuild_segment(*job), jobs))
+        return len(jobs)
+
+    def _rebuild_segment(self, name, tag):
+        directory = os.path.join(self.root, name)
+        records = read_records(directory, tag)
+        if records is None:
+            return
+        times = records["t"]
+        values = records["v"]
+        for resolution in ROLLUP_RESOLUTIONS:
+            target = os.path.join(directory, f"{tag}.{rollup_suffix(resolution)}")
+            # 先写临时文件再替换，重建过程中查询仍读到完整的旧文件
+            temp_path = target + ".tmp"
+            aggregate(times, values, resolution).tofile(temp_path)
+            try:
+                os.replace(temp_path, target)
+            except OSError as e:
+                logger.error("替换汇总文件失败 %s: %s", target, e)
+
+    def value_at(self, tag, timestamp):
+        """某一时刻的值（该时刻之前最后一次记录的值），没有记录时返回None"""
+        self.flush()
+        prior = self._value_before(tag, np.nextafter(timestamp, np.inf))
+        return prior[1] if prior else None
+
+    def partitions(self):
+        """已有的分区目录名（按时间排序）"""
+        try:
+            return sorted(name for name in os.listdir(self.root)
+                          if os.path.isdir(os.path.join(self.root, name)))
+        except OSError:
+            return []
+
+    def cleanup(self):
+        """删除超过保留天数的分区，压缩上次运行遗留的未压缩分区"""
+        self.last_cleanup = time.time()
+        expired = partition_name(int((time.time() - self.retention_days * 86400) // PARTITION_SECONDS))
+        current = partition_name(int(time.time() // PARTITION_SECONDS))
+        with self.flush_lock:
+            active = {partition_name(key[0]) for key in self.files}
+        for name in self.partitions():
+            if name < expired:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                logger.info("删除过期历史分区 %s", name)
+            elif name < current and name not in active:
+                with self.flush_lock:
+                    self.seal_partition(name)
+
+    def stats(self):
+        frames = self.frames
+        return {
+            "frames": frames,
+            "records": self.records,
+            "bytes_written": self.bytes_written,
+            "compression_ratio": self.bytes_sealed / self.bytes_compressed if self.bytes_compressed else 0.0,
+            "record_us": self.record_time / frames * 1e6 if frames else 0.0,
+        }
+
+    def close(self):
+        """停止写线程，写入剩余记录并关闭段文件"""
+        self.stop_event.set()
+        self.thread.join()
+        self.flush()
+        with self.flush_lock:
+            # 未结束的桶也写入；下次启动时同一个桶的新数据会另写一行，查询时合并
+            for (tag_id, resolution), bucket in self.open_buckets.items():
+                self._write_rollup(tag_id, resolution, bucket)
+            self.open_buckets = {}
+            for segment in self.files.values():
+                segment.close()
+            self.files = {}
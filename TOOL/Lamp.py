@@ -0,0 +1,97 @@
+# lamp.py
+from PySide6.QtWidgets import QWidget, QSizePolicy
+from PySide6.QtCore import Qt, QRectF, QSize
+from PySide6.QtGui import QPainter, QColor, QPen, QBrush, QFont, QFontMetrics
+
+# 指示灯状态
+LAMP_OFF = 0  # 白色：未连接/信号为False
+LAMP_ON = 1  # 绿色：信号为True
+LAMP_PENDING = 2  # 黄色：连接中/尚未读取到信号
+
+
+class StatusLamp(QWidget):
+    """QPainter绘制的圆形指示灯，状态不变时不重绘"""
+
+    # 画笔和画刷在所有指示灯之间共享，只创建一次
+    _border_pen = None
+    _brushes = None
+
+    def __init__(self, diameter=20, parent=None):
+        super().__init__(parent)
+        self.diameter = diameter
+        self.state = LAMP_OFF
+        self.setFixedSize(diameter, diameter)
+
+        if StatusLamp._brushes is None:
+            StatusLamp._border_pen = QPen(QColor("gray"), 1)
+            StatusLamp._brushes = {
+                LAMP_OFF: QBrush(QColor("white")),
+                LAMP_ON: QBrush(QColor("green")),
+                LAMP_PENDING: QBrush(QColor("yellow")),
+            }
+
+    def set_state(self, state):
+        """设置指示灯状态，只有状态变化时才请求重绘"""
+        if state == self.state:
+            return
+        self.state = state
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(self._border_pen)
+        painter.setBrush(self._brushes[self.state])
+        painter.drawEllipse(QRectF(0.5, 0.5, self.diameter - 1, self.diameter - 1))
+
+
+class BitStrip(QWidget):
+    """QPainter绘制的8位状态条，从左到右显示高位到低位的 ON/OFF"""
+
+    _pens = None
+
+    def __init__(self, font=None, parent=None):
+        super().__init__(parent)
+        self.byte_value = 0
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+        base_font = font or QFont("Courier New", 13)
+        self.off_font = QFont(base_font)
+        self.on_font = QFont(base_font)
+        self.on_font.setBold(True)
+
+        if BitStrip._pens is None:
+            BitStrip._pens = {
+                False: QPen(QColor("#7f8c8d")),
+                True: QPen(QColor("green")),
+            }
+
+        # 每个位占用的宽度按粗体 "OFF " 计算，保证各组摘要对齐
+        metrics = QFontMetrics(self.on_font)
+        self._cell_width = metrics.horizontalAdvance("OFF ")
+        self._height = metrics.height()
+
+    def sizeHint(self):
+        return QSize(self._cell_width * 8, self._height)
+
+    def minimumSizeHint(self):
+        return self.sizeHint()
+
+    def set_value(self, byte_value):
+        """设置字节值，只有值变化时才请求重绘"""
+        if byte_value == self.byte_value:
+            return
+        self.byte_value = byte_value
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        height = self.height()
+        for index in range(8):
+            # 位7在最左边，位0在最右边
+            bit = 7 - index
+            on = bool((self.byte_value >> bit) & 1)
+            painter.setPen(self._pens[on])
+            painter.setFont(self.on_font if on else self.off_font)
+            rect = QRectF(index * self._cell_width, 0, self._cell_width, height)
+            painter.drawText(rect, Qt.AlignLeft | Qt.AlignVCenter, "ON" if on else "OFF")
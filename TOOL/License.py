@@ -10,8 +10,11 @@ import platform
 import socket
 import getpass
 import datetime
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QThread, Signal
 from PySide6.QtWidgets import QMessageBox, QPushButton, QHBoxLayout, QApplication, QFileDialog, QDialog, QVBoxLayout, \
     QLabel, QGroupBox
 
@@ -21,61 +24,111 @@ from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QMessageBox, QPushButton, QHBoxLayout, QApplication, QFileDialog, QDialog, QVBoxLayout, \
     QLabel, QGroupBox
 
+logger = logging.getLogger(__name__)
+
+PROBE_TIMEOUT = 5  # 每个硬件探测的超时时间（秒）
+# 探测超时且机器码不符时，在后台线程中重新探测的等待时间（秒），冷启动时WMI可能很慢
+SLOW_PROBE_TIMEOUT = 60
+
+
+def _run_probe(probe):
+    """在线程池中运行硬件探测，WMI需要在每个线程中初始化COM"""
+    com_initialized = False
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+        com_initialized = True
+    except Exception:
+        pass
+    try:
+        return probe()
+    finally:
+        if com_initialized:
+            pythoncom.CoUninitialize()
+
+
+class LicenseCheckThread(QThread):
+    """在后台线程中验证许可证，不阻塞主窗口显示"""
+    result_ready = Signal(bool, str)
+
+    def __init__(self, license_manager, parent=None):
+        super().__init__(parent)
+        self.license_manager = license_manager
+        self.elapsed = 0.0
+
+    def run(self):
+        start = time.perf_counter()
+        valid, message = self.license_manager.check_license()
+        self.elapsed = time.perf_counter() - start
+        logger.info("许可证验证%s，耗时 %.1f ms（机器码%s）",
+                    "通过" if valid else "失败", self.elapsed * 1000,
+                    "来自缓存" if self.license_manager.machine_id_cached else "重新探测")
+        self.result_ready.emit(valid, message)
+
+
 class LicenseManager:
-    def __init__(self, app_name="智控小匠智能交互管控系统"):
+    def __init__(self, app_name="智控小匠智能交互管控系统", base_dir=None):
         self.app_name = app_name
-        self.license_file = "license.lic"
+        # 许可证和机器码缓存放在程序目录，按构造时的目录解析为绝对路径，之后切换工作目录（回放）不受影响
+        base_dir = os.path.abspath(base_dir or os.getcwd())
+        self.license_file = os.path.join(base_dir, "license.lic")
         self.valid_machine_id = None
         self.license_data = {}
-        self.machine_id_cache_file = "machine_id.cache"
+        self.machine_id_cache_file = os.path.join(base_dir, "machine_id.cache")
+        self.machine_id_cached = False  # 本次机器码是否来自缓存
+        self.probe_timed_out = False  # 本次硬件探测是否有超时
 
-    def get_machine_id(self):
-        """生成基于系统硬件的稳定机器ID"""
+    def get_machine_id(self, timeout=PROBE_TIMEOUT):
+        """生成基于系统硬件的稳定机器ID，timeout 为硬件探测的等待时间（秒）"""
         # 先尝试从缓存读取
         if os.path.exists(self.machine_id_cache_file):
             try:
                 with open(self.machine_id_cache_file, 'r') as f:
                     cached_id = f.read().strip()
                     if cached_id:
+                        self.machine_id_cached = True
                         return cached_id
             except:
                 pass  # 缓存读取失败，继续生成
 
         # 获取稳定的硬件标识符
-        hardware_id = self._get_stable_hardware_id()
+        hardware_id = self._get_stable_hardware_id(timeout)
 
         # 创建唯一哈希
         unique_string = json.dumps(hardware_id, sort_keys=True)
         machine_id = hashlib.sha256(unique_string.encode()).hexdigest()
 
-        # 保存到缓存
-        try:
-            with open(self.machine_id_cache_file, 'w') as f:
-                f.write(machine_id)
-        except:
-            pass
+        # 保存到缓存（有探测超时时不缓存，下次启动重新探测）
+        if not self.probe_timed_out:
+            try:
+                with open(self.machine_id_cache_file, 'w') as f:
+                    f.write(machine_id)
+            except:
+                pass
 
         return machine_id
 
-    def _get_stable_hardware_id(self):
+    def _get_stable_hardware_id(self, timeout=PROBE_TIMEOUT):
         """获取稳定的硬件标识符"""
         sys_info = {
             "platform": platform.platform(),
             "machine": platform.machine(),
         }
 
-        # 1. 尝试获取磁盘序列号 (最稳定)
-        disk_id = self._get_disk_serial()
+        # 磁盘、主板、CPU三个探测并行执行，每个都有超时
+        disk_id, board_id, cpu_id = self._run_probes(
+            self._get_disk_serial, self._get_board_serial, self._get_cpu_id, timeout=timeout
+        )
+
+        # 1. 磁盘序列号 (最稳定)
         if disk_id:
             sys_info["disk_id"] = disk_id
 
-        # 2. 尝试获取主板序列号
-        board_id = self._get_board_serial()
+        # 2. 主板序列号
         if board_id:
             sys_info["board_id"] = board_id
 
-        # 3. 尝试获取CPU ID
-        cpu_id = self._get_cpu_id()
+        # 3. CPU ID
         if cpu_id:
             sys_info["cpu_id"] = cpu_id
 
@@ -85,6 +138,26 @@ class LicenseManager:
 
         return sys_info
 
+    def _run_probes(self, *probes, timeout=PROBE_TIMEOUT):
+        """并行运行硬件探测，超时的探测结果记为None"""
+        self.probe_timed_out = False
+        executor = ThreadPoolExecutor(max_workers=len(probes))
+        futures = [executor.submit(_run_probe, probe) for probe in probes]
+        deadline = time.monotonic() + timeout
+        results = []
+        for probe, future in zip(probes, futures):
+            try:
+                results.append(future.result(timeout=max(0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                logger.warning("硬件探测 %s 超时 (%s 秒)", probe.__name__, timeout)
+                self.probe_timed_out = True
+                results.append(None)
+            except Exception:
+                results.append(None)
+        # 不等待超时的探测，它们的子进程也有超时，会自行结束
+        executor.shutdown(wait=False)
+        return results
+
     def _get_disk_serial(self):
         """获取系统盘序列号 (最稳定的标识符)"""
         try:
@@ -114,7 +187,8 @@ class LicenseManager:
                     result = subprocess.check_output(
                         "wmic diskdrive get serialnumber",
                         shell=True,
-                        stderr=subprocess.DEVNULL
+                        stderr=subprocess.DEVNULL,
+                        timeout=PROBE_TIMEOUT
                     ).decode()
                     lines = result.split('\n')
                     for line in lines:
@@ -128,7 +202,8 @@ class LicenseManager:
                 try:
                     result = subprocess.check_output(
                         "lsblk -no UUID / 2>/dev/null || sudo blkid -s UUID -o value $(df / | tail -1 | awk '{print $1}')",
-                        shell=True
+                        shell=True,
+                        timeout=PROBE_TIMEOUT
                     ).decode().strip()
                     if result:
                         return result
@@ -152,7 +227,8 @@ class LicenseManager:
                 try:
                     result = subprocess.check_output(
                         "diskutil info / | grep 'Volume UUID' | awk '{print $3}'",
-                        shell=True
+                        shell=True,
+                        timeout=PROBE_TIMEOUT
                     ).decode().strip()
                     if result:
                         return result
@@ -180,7 +256,8 @@ class LicenseManager:
                         result = subprocess.check_output(
                             "wmic baseboard get serialnumber",
                             shell=True,
-                            stderr=subprocess.DEVNULL
+                            stderr=subprocess.DEVNULL,
+                            timeout=PROBE_TIMEOUT
                         ).decode()
                         lines = result.split('\n')
                         for line in lines:
@@ -204,7 +281,8 @@ class LicenseManager:
                 try:
                     result = subprocess.check_output(
                         "sudo dmidecode -s baseboard-serial-number 2>/dev/null",
-                        shell=True
+                        shell=True,
+                        timeout=PROBE_TIMEOUT
                     ).decode().strip()
                     if result and " " not in result:
                         return result
@@ -216,7 +294,8 @@ class LicenseManager:
                 try:
                     result = subprocess.check_output(
                         "ioreg -l | grep IOPlatformSerialNumber | awk '{print $4}' | sed 's/\"//g'",
-                        shell=True
+                        shell=True,
+                        timeout=PROBE_TIMEOUT
                     ).decode().strip()
                     if result:
                         return result
@@ -237,7 +316,8 @@ class LicenseManager:
                     result = subprocess.check_output(
                         "wmic cpu get processorid",
                         shell=True,
-                        stderr=subprocess.DEVNULL
+                        stderr=subprocess.DEVNULL,
+                        timeout=PROBE_TIMEOUT
                     ).decode()
                     lines = result.split('\n')
                     for line in lines:
@@ -263,7 +343,8 @@ class LicenseManager:
                 try:
                     result = subprocess.check_output(
                         "sysctl -n machdep.cpu.brand_string",
-                        shell=True
+                        shell=True,
+                        timeout=PROBE_TIMEOUT
                     ).decode().strip()
                     if result:
                         return hashlib.md5(result.encode()).hexdigest()
@@ -290,10 +371,20 @@ class LicenseManager:
 
     def validate_license(self):
         """验证许可证有效性并返回结果"""
+        valid, message = self.check_license()
+        if valid:
+            return True
+        # 显示错误对话框并处理用户操作
+        return self.show_license_error(message)
+
+    def check_license(self):
+        """
+        验证许可证，不弹出任何界面，可以在后台线程中调用
+        :return: (是否有效, 错误信息)
+        """
         # 检查许可证文件是否存在
         if not os.path.exists(self.license_file):
-            # 显示错误对话框并处理用户操作
-            return self.show_license_error("未找到许可证文件")
+            return False, "未找到许可证文件"
 
         try:
             # 加载许可证数据
@@ -307,12 +398,18 @@ class LicenseManager:
             ).hexdigest()
 
             if license_hash != computed_hash:
-                return self.show_license_error("许可证文件已被篡改")
+                return False, "许可证文件已被篡改"
 
             # 验证机器ID
             current_machine_id = self.get_machine_id()
+            if self.license_data.get('machine_id') != current_machine_id and self.probe_timed_out:
+                # 有探测超时时机器码缺少该项，不能和许可证比较；本方法在后台线程中运行，界面已锁定，可以等待更久
+                logger.info("硬件探测超时，重新探测（最多 %s 秒）", SLOW_PROBE_TIMEOUT)
+                current_machine_id = self.get_machine_id(SLOW_PROBE_TIMEOUT)
+                if self.probe_timed_out:
+                    return False, "硬件检测超时，请重试"
             if self.license_data.get('machine_id') != current_machine_id:
-                return self.show_license_error("未授权在此计算机上运行")
+                return False, "未授权在此计算机上运行"
 
             # 验证有效期
             if "expiry_date" in self.license_data:
@@ -323,17 +420,17 @@ class LicenseManager:
 
                 if today > expiry_date:
                     days_overdue = (today - expiry_date).days
-                    return self.show_license_error(
+                    return False, (
                         f"许可证已过期 {days_overdue} 天\n"
                         f"到期日期: {expiry_date}"
                     )
 
             # 验证成功后重新添加签名（因为之前pop了）
             self.license_data['signature'] = license_hash
-            return True  # 验证成功
+            return True, ""  # 验证成功
 
         except Exception as e:
-            return self.show_license_error(f"许可证验证失败: {str(e)}")
+            return False, f"许可证验证失败: {str(e)}"
 
     def show_license_error(self, message):
         """显示许可证错误消息"""
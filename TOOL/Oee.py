@@ -0,0 +1,389 @@
+# oee.py
+from datetime import datetime, timedelta
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QGroupBox, QTableWidget,
+    QTableWidgetItem, QHeaderView, QPushButton, QSpinBox, QDialog, QLineEdit, QDoubleSpinBox,
+    QFormLayout, QDialogButtonBox, QMessageBox
+)
+
+# 班次按开始时间定义，每个班次到下一个班次开始时结束；跨零点的班次归属开始的日期
+DEFAULT_SHIFTS = [("白班", "08:00"), ("夜班", "20:00")]
+DEFAULT_IDEAL_CYCLE = 0.0  # 理想节拍（秒），未设置时不计算性能和OEE
+MAX_FRAME_GAP = 5.0  # 两帧间隔超过该值（秒）视为未监控（断线、停止监控），不计入任何时间
+HOUR_FORMAT = "%Y-%m-%dT%H"  # 与报警统计的小时格式相同
+
+# 设备状态：机床A/B在线且没有停机类报警时为运行
+RUN_SIGNALS = ("V750.2", "V750.3")
+STOP_ALARMS = ("VB1011", "VB1019", "VB1013", "VB1023", "VB1025")  # 急停、碰撞、超软限位、安全停止SIO/SII
+
+# 桶内各字段在列表中的位置
+PARTS, REJECTS, RUN, DOWN, ALARM = range(5)
+FIELDS = ("parts", "rejects", "run_seconds", "down_seconds", "alarm_seconds")
+
+SETTINGS_SHIFTS = "production/shifts"
+SETTINGS_IDEAL_CYCLE = "production/ideal_cycle"
+
+
+def parse_shifts(text):
+    """'白班 08:00, 夜班 20:00' -> [(名称, "HH:MM")]，格式错误时抛出 ValueError"""
+    shifts = []
+    for part in text.replace("，", ",").split(","):
+        if not part.strip():
+            continue
+        name, start = part.split()
+        datetime.strptime(start, "%H:%M")
+        shifts.append((name, start))
+    if not shifts:
+        raise ValueError("至少需要一个班次")
+    if len({start for _, start in shifts}) != len(shifts):
+        raise ValueError("班次开始时间不能重复")
+    return shifts
+
+
+def format_shifts(shifts):
+    return ", ".join(f"{name} {start}" for name, start in shifts)
+
+
+def load_settings(settings):
+    """从 QSettings 读取 (班次, 理想节拍)"""
+    try:
+        shifts = parse_shifts(settings.value(SETTINGS_SHIFTS, format_shifts(DEFAULT_SHIFTS)))
+    except ValueError:
+        shifts = DEFAULT_SHIFTS
+    return shifts, float(settings.value(SETTINGS_IDEAL_CYCLE, DEFAULT_IDEAL_CYCLE))
+
+
+def save_settings(settings, shifts, ideal_cycle):
+    settings.setValue(SETTINGS_SHIFTS, format_shifts(shifts))
+    settings.setValue(SETTINGS_IDEAL_CYCLE, ideal_cycle)
+
+
+def machine_state(data):
+    """从一帧PLC数据得出 (是否运行, 是否有停机报警)"""
+    alarm = any(data.get(address) for address in STOP_ALARMS)
+    running = not alarm and all(data.get(address) for address in RUN_SIGNALS)
+    return running, alarm
+
+
+def metrics(values, ideal_cycle):
+    """
+    由桶的累计值计算OEE指标，不可计算的项为 None
+      可用率 = 运行时间 / (运行 + 停机 + 报警停机)
+      性能   = 理想节拍 × 产量 / 运行时间（上限100%）
+      质量   = (产量 - 不良) / 产量
+    """
+    parts, rejects, run, down, alarm = values
+    monitored = run + down + alarm
+    availability = run / monitored if monitored else None
+    performance = min(1.0, ideal_cycle * parts / run) if ideal_cycle and run else None
+    quality = max(0, parts - rejects) / parts if parts else None
+    oee = None
+    if availability is not None and performance is not None and quality is not None:
+        oee = availability * performance * quality
+    return {"availability": availability, "performance": performance, "quality": quality, "oee": oee}
+
+
+class ShiftCalendar:
+    """班次日历：定位某个时刻所在的班次"""
+
+    def __init__(self, shifts=DEFAULT_SHIFTS):
+        self.shifts = sorted(shifts, key=lambda shift: shift[1])
+        self.starts = [datetime.strptime(start, "%H:%M").time() for _, start in self.shifts]
+
+    def locate(self, moment):
+        """
+        :return: (班次日期, 班次名称, 开始时间, 结束时间)，班次日期为班次开始的日期
+        """
+        day = moment.date()
+        index = None
+        for i, start in enumerate(self.starts):
+            if moment.time() >= start:
+                index = i
+        if index is None:
+            # 早于当天第一个班次：属于前一天的最后一个班次
+            day -= timedelta(days=1)
+            index = len(self.shifts) - 1
+        start = datetime.combine(day, self.starts[index])
+        if index + 1 < len(self.shifts):
+            end = datetime.combine(day, self.starts[index + 1])
+        else:
+            end = datetime.combine(day + timedelta(days=1), self.starts[0])
+        return day.isoformat(), self.shifts[index][0], start, end
+
+
+class OeeEngine:
+    """
+    按小时和班次累计产量、不良和运行/停机/报警停机时间。
+
+    每个零件、每帧状态都只累加到当前小时桶和当前班次桶（O(1)）；
+    当前桶的结束时间戳缓存为浮点数，只有跨过小时或班次边界时才重新定位并读取已有的累计值。
+    修改过的桶记录在 dirty 中，由 ProductCounter 定期写入数据库。调用方负责加锁。
+
+    :param loader: loader(kind, key) -> 已保存的累计值列表或 None，kind 为 "hour" / "shift"
+    """
+
+    def __init__(self, shifts=DEFAULT_SHIFTS, ideal_cycle=DEFAULT_IDEAL_CYCLE, loader=None):
+        self.calendar = ShiftCalendar(shifts)
+        self.ideal_cycle = ideal_cycle
+        self.loader = loader
+        self.buckets = {}  # (kind, key) -> [parts, rejects, run, down, alarm]
+        self.shift_info = {}  # 班次key -> (开始时间, 结束时间)
+        self.dirty = set()
+        self.hour = self.shift = None  # 当前桶 (kind, key)
+        self.hour_start = self.hour_end = 0.0
+        self.shift_start = self.shift_end = 0.0
+        self.last_ts = None
+        self.running = False
+        self.alarm = False
+
+    def configure(self, shifts, ideal_cycle):
+        """修改班次或理想节拍，下一次累加时按新班次定位"""
+        self.calendar = ShiftCalendar(shifts)
+        self.ideal_cycle = ideal_cycle
+        self.shift = None
+
+    def _load(self, bucket):
+        if bucket not in self.buckets:
+            saved = self.loader(*bucket) if self.loader else None
+            self.buckets[bucket] = list(saved) if saved else [0, 0, 0.0, 0.0, 0.0]
+
+    def _locate(self, ts):
+        """确保当前小时桶和班次桶包含时间戳 ts"""
+        if self.hour is None or not self.hour_start <= ts < self.hour_end:
+            moment = datetime.fromtimestamp(ts).replace(minute=0, second=0, microsecond=0)
+            self.hour = ("hour", moment.strftime(HOUR_FORMAT))
+            self.hour_start, self.hour_end = moment.timestamp(), (moment + timedelta(hours=1)).timestamp()
+            self._load(self.hour)
+        if self.shift is None or not self.shift_start <= ts < self.shift_end:
+            day, name, start, end = self.calendar.locate(datetime.fromtimestamp(ts))
+            self.shift = ("shift", (day, name))
+            self.shift_info[(day, name)] = (start, end)
+            self.shift_start, self.shift_end = start.timestamp(), end.timestamp()
+            self._load(self.shift)
+
+    def _add(self, ts, field, value):
+        self._locate(ts)
+        self.buckets[self.hour][field] += value
+        self.buckets[self.shift][field] += value
+        self.dirty.add(self.hour)
+        self.dirty.add(self.shift)
+
+    def part(self, ts):
+        """零件完成（产量上升沿）"""
+        self._add(ts, PARTS, 1)
+
+    def reject(self, count, ts):
+        """登记不良品，计入当前小时和班次"""
+        self._add(ts, REJECTS, count)
+
+    def update_state(self, ts, running, alarm):
+        """
+        每帧调用：把距上一帧的时间按上一帧的状态计入运行/停机/报警停机
+        """
+        if self.last_ts is not None:
+            elapsed = ts - self.last_ts
+            if 0 < elapsed <= MAX_FRAME_GAP:
+                field = RUN if self.running else (ALARM if self.alarm else DOWN)
+                self._add(self.last_ts, field, elapsed)
+        self.last_ts, self.running, self.alarm = ts, running, alarm
+
+    def take_dirty(self):
+        """
+        取出需要写入的桶（复制值），并丢弃已不是当前桶的缓存
+        :return: (小时行列表, 班次行列表)
+        """
+        hours, shifts = [], []
+        for bucket in self.dirty:
+            kind, key = bucket
+            values = list(self.buckets[bucket])
+            if kind == "hour":
+                hours.append((key, *values))
+            else:
+                start, end = self.shift_info[key]
+                shifts.append((key[0], key[1], start.isoformat(timespec="seconds"),
+                               end.isoformat(timespec="seconds"), *values))
+        self.dirty = set()
+        for bucket in list(self.buckets):
+            if bucket not in (self.hour, self.shift):
+                del self.buckets[bucket]
+        self.shift_info = {key: info for key, info in self.shift_info.items()
+                           if ("shift", key) in self.buckets}
+        return hours, shifts
+
+    def restore_dirty(self, hours, shifts):
+        """写入失败时放回（期间更新过的桶以内存中的值为准）"""
+        for key, *values in hours:
+            self.buckets.setdefault(("hour", key), values)
+            self.dirty.add(("hour", key))
+        for day, name, start, end, *values in shifts:
+            bucket = ("shift", (day, name))
+            self.buckets.setdefault(bucket, values)
+            self.shift_info.setdefault((day, name), (datetime.fromisoformat(start),
+                                                     datetime.fromisoformat(end)))
+            self.dirty.add(bucket)
+
+    def overlay(self, kind):
+        """尚未写入数据库的桶 {key: 值}，查询时覆盖数据库中的旧值"""
+        return {key: list(self.buckets[(k, key)]) for k, key in self.dirty if k == kind}
+
+    def reset(self):
+        """清空历史后丢弃内存中的累计值"""
+        self.buckets = {}
+        self.dirty = set()
+        self.hour = self.shift = None
+
+
+def _percent(value):
+    return "-" if value is None else f"{value * 100:.1f}%"
+
+
+def _hours(seconds):
+    return f"{seconds / 3600:.2f}"
+
+
+class ShiftSettingsDialog(QDialog):
+    def __init__(self, shifts, ideal_cycle, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("班次设置")
+        layout = QFormLayout(self)
+        self.shifts_edit = QLineEdit(format_shifts(shifts))
+        self.shifts_edit.setPlaceholderText("白班 08:00, 夜班 20:00")
+        layout.addRow("班次（名称 开始时间）:", self.shifts_edit)
+        self.cycle_spin = QDoubleSpinBox()
+        self.cycle_spin.setRange(0, 3600)
+        self.cycle_spin.setDecimals(1)
+        self.cycle_spin.setSuffix(" 秒")
+        self.cycle_spin.setSpecialValueText("未设置")
+        self.cycle_spin.setValue(ideal_cycle)
+        layout.addRow("理想节拍:", self.cycle_spin)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.check)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        self.shifts = shifts
+
+    def check(self):
+        try:
+            self.shifts = parse_shifts(self.shifts_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "错误", f"班次格式错误: {e}")
+            return
+        self.accept()
+
+    @property
+    def ideal_cycle(self):
+        return self.cycle_spin.value()
+
+
+class OeeDashboard(QWidget):
+    """
+    班次/小时看板：只读取预先累计的小时桶和班次桶（数据库中的行 + 尚未写入的当前桶），
+    不扫描零件事件
+    """
+
+    SHIFT_ROWS = 14  # 显示最近的班次数
+
+    def __init__(self, counter, settings=None, parent=None):
+        super().__init__(parent)
+        self.counter = counter
+        self.settings = settings
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        # 当前班次
+        current_group = QGroupBox("当前班次")
+        grid = QGridLayout(current_group)
+        self.current_labels = {}
+        for column, (key, title) in enumerate([
+            ("shift", "班次"), ("parts", "产量"), ("rejects", "不良"), ("availability", "可用率"),
+            ("performance", "性能"), ("quality", "质量"), ("oee", "OEE")
+        ]):
+            grid.addWidget(QLabel(title), 0, column, alignment=Qt.AlignCenter)
+            label = QLabel("-")
+            label.setStyleSheet("font-size: 18px; font-weight: bold; color: #2c3e50;")
+            grid.addWidget(label, 1, column, alignment=Qt.AlignCenter)
+            self.current_labels[key] = label
+        controls = QHBoxLayout()
+        self.reject_spin = QSpinBox()
+        self.reject_spin.setRange(1, 9999)
+        reject_button = QPushButton("登记不良品")
+        reject_button.clicked.connect(self.record_rejects)
+        settings_button = QPushButton("班次设置")
+        settings_button.clicked.connect(self.edit_settings)
+        controls.addStretch()
+        controls.addWidget(self.reject_spin)
+        controls.addWidget(reject_button)
+        controls.addWidget(settings_button)
+        grid.addLayout(controls, 2, 0, 1, 7)
+        layout.addWidget(current_group)
+
+        tables = QHBoxLayout()
+        headers = ["产量", "不良", "运行(h)", "停机(h)", "报警(h)", "可用率", "性能", "质量", "OEE"]
+        self.shift_table = self._make_table(["班次"] + headers)
+        self.hour_table = self._make_table(["小时"] + headers)
+        shift_group = QGroupBox("最近班次")
+        QVBoxLayout(shift_group).addWidget(self.shift_table)
+        hour_group = QGroupBox("今日各小时")
+        QVBoxLayout(hour_group).addWidget(self.hour_table)
+        tables.addWidget(shift_group)
+        tables.addWidget(hour_group)
+        layout.addLayout(tables)
+
+    @staticmethod
+    def _make_table(headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        return table
+
+    def _fill(self, table, rows):
+        ideal = self.counter.ideal_cycle
+        table.setRowCount(len(rows))
+        for row, (title, values) in enumerate(rows):
+            result = metrics(values, ideal)
+            cells = [title, str(values[PARTS]), str(values[REJECTS]), _hours(values[RUN]),
+                     _hours(values[DOWN]), _hours(values[ALARM]), _percent(result["availability"]),
+                     _percent(result["performance"]), _percent(result["quality"]),
+                     _percent(result["oee"])]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignCenter)
+                table.setItem(row, column, item)
+
+    def refresh(self):
+        shifts = self.counter.shift_rows(self.SHIFT_ROWS)
+        self._fill(self.shift_table, [(f"{day} {name}", values) for day, name, _, _, values in shifts])
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        hours = self.counter.hourly_rows(today, today + timedelta(days=1))
+        self._fill(self.hour_table, [(f"{key[-2:]}:00", values) for key, values in hours])
+
+        current = self.counter.current_shift()
+        if current is None:
+            return
+        day, name, start, end, values = current
+        result = metrics(values, self.counter.ideal_cycle)
+        self.current_labels["shift"].setText(f"{name} {start:%H:%M}-{end:%H:%M}")
+        self.current_labels["parts"].setText(str(values[PARTS]))
+        self.current_labels["rejects"].setText(str(values[REJECTS]))
+        for key in ("availability", "performance", "quality", "oee"):
+            self.current_labels[key].setText(_percent(result[key]))
+
+    def record_rejects(self):
+        count = self.reject_spin.value()
+        if QMessageBox.question(self, "确认", f"登记 {count} 件不良品到当前班次？") != QMessageBox.Yes:
+            return
+        self.counter.record_rejects(count)
+        self.refresh()
+
+    def edit_settings(self):
+        dialog = ShiftSettingsDialog(self.counter.shifts, self.counter.ideal_cycle, self)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        self.counter.configure(dialog.shifts, dialog.ideal_cycle)
+        if self.settings is not None:
+            save_settings(self.settings, dialog.shifts, dialog.ideal_cycle)
+        self.refresh()
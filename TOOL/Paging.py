@@ -0,0 +1,212 @@
+# paging.py
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200  # 每页行数，首页只查询这么多行
+
+# 所有分页表格共用一个查询线程：每个数据库只多一个连接，查询按提交顺序执行
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="PagedQuery")
+
+
+class PagedTableModel(QAbstractTableModel):
+    """
+    分页加载的只读SQL表格模型，用于历史记录视图（QTableView）。
+
+    查询在后台线程执行，首页只取 PAGE_SIZE 行；视图滚动到底部时 Qt 调用 fetchMore() 加载下一页。
+    分页使用键集（上一页最后一行的 排序值, rowid）而不是 OFFSET，翻到多深都只扫描一页的索引。
+    点击表头排序由SQL执行（ORDER BY），修改筛选条件或排序会取消尚未完成的查询。
+
+    :param db: Storage.Database
+    :param table: 表名
+    :param columns: [(表头, 列名)]
+    :param sort_column: 默认排序列（columns 中的序号），应当有索引
+    :param nullable: 可能为NULL的列名，排序时按空字符串处理
+    """
+
+    loaded = Signal(int, float)  # 已加载行数, 本页查询耗时（毫秒）
+    failed = Signal(str)
+    _page_ready = Signal(int, object, float)  # 查询代数, 行, 耗时（后台线程发出，排队到界面线程）
+
+    def __init__(self, db, table, columns, sort_column=0, descending=True, nullable=(),
+                 page_size=PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.table = table
+        self.headers = [header for header, _ in columns]
+        self.columns = [column for _, column in columns]
+        self.nullable = set(nullable)
+        self.page_size = page_size
+        self.sort_column = sort_column
+        self.descending = descending
+        self.where = ""
+        self.params = ()
+
+        self.rows = []
+        self.active = False  # 是否已经设置过查询
+        self.exhausted = True  # 没有更多数据
+        self.loading = False
+        self.generation = 0  # 每次重置查询加一，旧查询的结果直接丢弃
+        self.running = None  # 正在执行本模型查询的连接，用于取消
+        self.running_lock = threading.Lock()
+        self._page_ready.connect(self._on_page_ready)
+
+    # ---- 查询 ----
+
+    def set_filter(self, where="", params=()):
+        """设置筛选条件（SQL片段和参数）并重新加载首页"""
+        self.where = where
+        self.params = tuple(params)
+        self.active = True
+        self.reload()
+
+    def reload(self):
+        self.cancel()
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+        self._request_page()
+
+    def cancel(self):
+        """丢弃排队中的查询，中断正在执行的查询"""
+        self.generation += 1
+        self.loading = False
+        with self.running_lock:
+            if self.running is not None:
+                self.running.interrupt()
+
+    def sort_key(self):
+        column = self.columns[self.sort_column]
+        return f"IFNULL({column}, '')" if column in self.nullable else column
+
+    def select_sql(self):
+        """当前筛选和排序的完整查询（不分页），导出等需要全部数据时使用"""
+        direction = "DESC" if self.descending else "ASC"
+        where = f"WHERE {self.where}" if self.where else ""
+        return (f"SELECT {', '.join(self.columns)} FROM {self.table} {where} "
+                f"ORDER BY {self.sort_key()} {direction}, rowid {direction}"), self.params
+
+    def count_sql(self):
+        """当前筛选条件下的总行数查询"""
+        where = f"WHERE {self.where}" if self.where else ""
+        return f"SELECT COUNT(*) FROM {self.table} {where}", self.params
+
+    def _page_sql(self):
+        key = self.sort_key()
+        direction = "DESC" if self.descending else "ASC"
+        conditions = [f"({self.where})"] if self.where else []
+        params = list(self.params)
+        if self.rows:
+            # 键集分页：从上一页最后一行之后继续
+            last = self.rows[-1]
+            conditions.append(f"({key}, rowid) {'<' if self.descending else '>'} (?, ?)")
+            params.extend((last[-2], last[-1]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (f"SELECT {', '.join(self.columns)}, {key}, rowid FROM {self.table} {where} "
+               f"ORDER BY {key} {direction}, rowid {direction} LIMIT ?")
+        params.append(self.page_size)
+        return sql, params
+
+    def _request_page(self):
+        if self.loading or self.exhausted:
+            return
+        self.loading = True
+        sql, params = self._page_sql()
+        _executor.submit(self._run_query, self.generation, sql, params)
+
+    def _run_query(self, generation, sql, params):
+        """查询线程执行"""
+        if generation != self.generation:
+            return  # 排队期间已被取消
+        connection = self.db.connection()
+        start = time.perf_counter()
+        with self.running_lock:
+            self.running = connection
+        try:
+            rows = connection.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if generation == self.generation:
+                logger.error("历史记录查询失败: %s", e)
+                self._emit_failed(str(e))
+            return
+        finally:
+            with self.running_lock:
+                self.running = None
+        try:
+            self._page_ready.emit(generation, rows, (time.perf_counter() - start) * 1000)
+        except RuntimeError:
+            pass  # 对话框已关闭，模型已销毁
+
+    def _emit_failed(self, message):
+        try:
+            self.failed.emit(message)
+        except RuntimeError:
+            pass
+
+    def _on_page_ready(self, generation, rows, elapsed):
+        if generation != self.generation:
+            return
+        self.loading = False
+        self.exhausted = len(rows) < self.page_size
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+        self.loaded.emit(len(self.rows), elapsed)
+
+    # ---- QAbstractTableModel ----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        self._request_page()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self.display(row, index.column())
+        if role == Qt.BackgroundRole:
+            return self.background(row, index.column())
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def display(self, row, column):
+        """单元格文字，子类可重写"""
+        value = row[column]
+        return "" if value is None else str(value)
+
+    def background(self, row, column):
+        """单元格背景色，子类可重写"""
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """表头点击排序：由数据库排序后重新加载"""
+        descending = order == Qt.DescendingOrder
+        if column == self.sort_column and descending == self.descending:
+            return
+        self.sort_column = column
+        self.descending = descending
+        if self.active:
+            self.reload()
@@ -1,39 +1,441 @@
 # product_statistics.py
+import logging
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime, timedelta
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem,
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QTableView, QAbstractItemView,
                                QHeaderView, QHBoxLayout, QPushButton, QComboBox, QMessageBox,
                                QLineEdit, QGroupBox, QDialog)
 from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QFont
 
-
-class ProductStatisticsTab(QWidget):
-    def __init__(self, db_path='production_statistics.db'):
-        super().__init__()
+from TOOL.Export import export_model
+from TOOL.Oee import OeeEngine, OeeDashboard, DEFAULT_SHIFTS, DEFAULT_IDEAL_CYCLE, FIELDS, machine_state
+from TOOL.Paging import PagedTableModel
+from TOOL.Storage import open_database
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5  # 计数写入数据库的间隔（秒），异常退出时最多丢失这段时间内的计数
+
+
+def _migrate_v1(connection):
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS production_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            count INTEGER NOT NULL
+        )
+    ''')
+    # 合并同一天的重复记录后再建唯一索引
+    connection.execute('''
+        UPDATE production_history
+        SET count = (SELECT SUM(p.count) FROM production_history p
+                     WHERE p.date = production_history.date)
+        WHERE id IN (SELECT MIN(id) FROM production_history GROUP BY date HAVING COUNT(*) > 1)
+    ''')
+    connection.execute('''
+        DELETE FROM production_history
+        WHERE id NOT IN (SELECT MIN(id) FROM production_history GROUP BY date)
+    ''')
+    connection.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_production_history_date
+        ON production_history (date)
+    ''')
+
+
+def _migrate_v2(connection):
+    # 每个零件一条事件，只追加；按墙上时间建索引，用于按时间范围统计
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS production_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mono_ts REAL NOT NULL,
+            wall_ts REAL NOT NULL,
+            interval REAL
+        )
+    ''')
+    connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_production_events_wall_ts
+        ON production_events (wall_ts)
+    ''')
+
+
+def _migrate_v3(connection):
+    # 按小时和按班次累计的产量、不良和运行/停机/报警停机时间（秒），由 OeeEngine 增量维护
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS production_hourly (
+            hour TEXT PRIMARY KEY,
+            parts INTEGER NOT NULL DEFAULT 0,
+            rejects INTEGER NOT NULL DEFAULT 0,
+            run_seconds REAL NOT NULL DEFAULT 0,
+            down_seconds REAL NOT NULL DEFAULT 0,
+            alarm_seconds REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS production_shifts (
+            shift_date TEXT NOT NULL,
+            shift TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            parts INTEGER NOT NULL DEFAULT 0,
+            rejects INTEGER NOT NULL DEFAULT 0,
+            run_seconds REAL NOT NULL DEFAULT 0,
+            down_seconds REAL NOT NULL DEFAULT 0,
+            alarm_seconds REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (shift_date, shift)
+        )
+    ''')
+    connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_production_shifts_start
+        ON production_shifts (start_time)
+    ''')
+
+
+# 按版本顺序排列的表结构迁移（PRAGMA user_version）
+PRODUCTION_MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3]
+
+_BUCKET_COLUMNS = ", ".join(FIELDS)
+
+
+class ProductCounter:
+    """
+    产品计数逻辑和数据库访问，独立于界面，标签页未创建时也能计数。
+    当日计数保存在内存中，每个零件O(1)累加；后台线程每 flush_interval 秒
+    用 UPSERT 写入数据库，退出时再写一次，异常退出最多丢失 flush_interval 秒的计数。
+    每个零件同时记录一条事件（单调时间、墙上时间、与上一件的间隔），随计数一起批量写入。
+    小时桶和班次桶（OeeEngine）在每个零件和每帧设备状态时增量累加，同样随计数一起写入。
+    """
+
+    def __init__(self, db_path='production_statistics.db', flush_interval=FLUSH_INTERVAL, journal=None,
+                 shifts=DEFAULT_SHIFTS, ideal_cycle=DEFAULT_IDEAL_CYCLE):
         self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.journal = journal  # 状态日志，重启后恢复信号状态，避免重复计数
+        self.last_signal = journal.get("product.last_signal", False) if journal else False  # 添加信号状态跟踪
         self.init_db()
-        self.init_ui()
-        self.update_daily_count()
-        self.last_signal = False  # 添加信号状态跟踪
 
-        # 设置定时器检查日期变更
-        self.date_check_timer = QTimer(self)
-        self.date_check_timer.timeout.connect(self.check_date_change)
-        self.date_check_timer.start(60000)  # 每分钟检查一次
+        # 内存中的当日计数和尚未写入数据库的日期
+        self.lock = threading.Lock()
+        self.today = datetime.now().strftime("%Y-%m-%d")
+        self.daily_count = self._load_count(self.today)
+        self.dirty = {}  # 日期 -> 计数
+        self.pending_events = []  # (单调时间, 墙上时间, 间隔)
+        self.last_part_time = None  # 上一件的单调时间，本次运行的第一件间隔未知
+        self.oee = OeeEngine(shifts, ideal_cycle, loader=self._load_bucket)
+
+        # 后台写入线程通过存储层使用自己的连接
+        self.flush_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, name="ProductFlusher", daemon=True)
+        self.flusher.start()
 
     def init_db(self):
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS production_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                count INTEGER NOT NULL
-            )
-        ''')
-        self.conn.commit()
+        self.db = open_database(self.db_path, "history", PRODUCTION_MIGRATIONS)
+
+    def _load_count(self, date):
+        result = self.db.query_one("SELECT count FROM production_history WHERE date = ?", (date,))
+        return result[0] if result else 0
+
+    def _load_bucket(self, kind, key):
+        """重启或跨过小时/班次边界时读取已保存的累计值（调用方持有self.lock）"""
+        if kind == "hour":
+            return self.db.query_one(
+                f"SELECT {_BUCKET_COLUMNS} FROM production_hourly WHERE hour = ?", (key,))
+        return self.db.query_one(
+            f"SELECT {_BUCKET_COLUMNS} FROM production_shifts WHERE shift_date = ? AND shift = ?", key)
+
+    @property
+    def shifts(self):
+        return self.oee.calendar.shifts
+
+    @property
+    def ideal_cycle(self):
+        return self.oee.ideal_cycle
+
+    def configure(self, shifts, ideal_cycle):
+        with self.lock:
+            self.oee.configure(shifts, ideal_cycle)
+
+    def _roll_date(self):
+        """跨天时切换到新的一天（调用方需持有self.lock）"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today != self.today:
+            self.today = today
+            self.daily_count = 0
+
+    def increment_count(self):
+        mono_ts = time.monotonic()
+        wall_ts = time.time()
+        with self.lock:
+            self._roll_date()
+            self.daily_count += 1
+            self.dirty[self.today] = self.daily_count
+            # 记录零件事件，间隔用单调时间计算，不受系统时间调整影响
+            interval = mono_ts - self.last_part_time if self.last_part_time is not None else None
+            self.last_part_time = mono_ts
+            self.pending_events.append((mono_ts, wall_ts, interval))
+            self.oee.part(wall_ts)
+            return self.daily_count
+
+    def update_machine_state(self, data):
+        """每帧调用，按设备运行/停机/报警状态累计时间（O(1)）"""
+        running, alarm = machine_state(data)
+        with self.lock:
+            self.oee.update_state(time.time(), running, alarm)
+
+    def record_rejects(self, count):
+        """登记不良品，计入当前小时和班次"""
+        with self.lock:
+            self.oee.reject(count, time.time())
+
+    def get_daily_count(self):
+        with self.lock:
+            self._roll_date()
+            return self.daily_count
+
+    def flush(self):
+        """把内存中的计数写入数据库"""
+        with self.flush_lock:
+            with self.lock:
+                pending = self.dirty
+                events = self.pending_events
+                self.dirty = {}
+                self.pending_events = []
+                hours, shifts = self.oee.take_dirty()
+            if not pending and not events and not hours and not shifts:
+                return
+            try:
+                # 计数和零件事件在同一个事务中写入
+                with self.db.transaction() as connection:
+                    connection.executemany('''
+                        INSERT INTO production_history (date, count) VALUES (?, ?)
+                        ON CONFLICT(date) DO UPDATE SET count = excluded.count
+                    ''', list(pending.items()))
+                    connection.executemany('''
+                        INSERT INTO production_events (mono_ts, wall_ts, interval) VALUES (?, ?, ?)
+                    ''', events)
+                    # 桶中保存的是累计值，直接覆盖
+                    connection.executemany(f'''
+                        INSERT INTO production_hourly (hour, {_BUCKET_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(hour) DO UPDATE SET
+                        {", ".join(f"{field} = excluded.{field}" for field in FIELDS)}
+                    ''', hours)
+                    connection.executemany(f'''
+                        INSERT INTO production_shifts (shift_date, shift, start_time, end_time, {_BUCKET_COLUMNS})
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(shift_date, shift) DO UPDATE SET
+                        {", ".join(f"{field} = excluded.{field}" for field in FIELDS)}
+                    ''', shifts)
+            except sqlite3.Error as e:
+                logger.error("产品计数写入错误（下次重试）: %s", e)
+                # 写入失败则放回，下次重试（期间新的计数优先）
+                with self.lock:
+                    for date, count in pending.items():
+                        self.dirty.setdefault(date, count)
+                    self.pending_events[:0] = events
+                    self.oee.restore_dirty(hours, shifts)
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """停止后台线程并写入剩余计数"""
+        self.stop_event.set()
+        self.flusher.join()
+        self.flush()
+        self.db.close()
+
+    def date_ranges(self, year=None, month=None, day=None):
+        """
+        把年/月/日筛选转换为 [起始日期, 结束日期) 区间列表，使查询可以使用 date 索引。
+        未指定年份时按表中已有的年份展开。
+        """
+        if year:
+            years = [year]
+        else:
+            first, last = self.db.query_one("SELECT MIN(date), MAX(date) FROM production_history")
+            if not first:
+                return []
+            years = range(int(first[:4]), int(last[:4]) + 1)
+
+        ranges = []
+        for y in years:
+            if day and month:
+                try:
+                    start = datetime(y, month, day)
+                except ValueError:
+                    continue  # 该年不存在这一天（如2月30日）
+                ranges.append((start, start + timedelta(days=1)))
+            elif day:
+                for m in range(1, 13):
+                    try:
+                        start = datetime(y, m, day)
+                    except ValueError:
+                        continue
+                    ranges.append((start, start + timedelta(days=1)))
+            elif month:
+                start = datetime(y, month, 1)
+                end = datetime(y + 1, 1, 1) if month == 12 else datetime(y, month + 1, 1)
+                ranges.append((start, end))
+            else:
+                ranges.append((datetime(y, 1, 1), datetime(y + 1, 1, 1)))
+        return [(start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")) for start, end in ranges]
+
+    def history_filter(self, year=None, month=None, day=None):
+        """把年/月/日筛选转换为 (WHERE条件, 参数)，不筛选时条件为空字符串"""
+        if not (year or month or day):
+            return "", []
+        ranges = self.date_ranges(year, month, day)
+        if not ranges:
+            return "0", []
+        params = []
+        for start, end in ranges:
+            params.extend((start, end))
+        return " OR ".join("(date >= ? AND date < ?)" for _ in ranges), params
+
+    def query_history(self, year=None, month=None, day=None):
+        # 先写入内存中的计数，保证查询结果包含今日数据
+        self.flush()
+        where, params = self.history_filter(year, month, day)
+        query = "SELECT date, count, id FROM production_history"
+        if where:
+            query += f" WHERE {where}"
+        query += " ORDER BY date DESC"
+
+        return self.db.query(query, params)
+
+    def hourly_throughput(self, start, end):
+        """
+        统计 [start, end) 内每小时的产量，在SQL中按 wall_ts 索引范围分组计数，只返回每小时一行
+        :param start: 开始时间 (datetime)
+        :param end: 结束时间 (datetime)
+        :return: [(小时起始时间, 数量)]，没有产量的小时不返回
+        """
+        self.flush()
+        rows = self.db.query('''
+            SELECT strftime('%Y-%m-%d %H:00:00', wall_ts, 'unixepoch', 'localtime') AS hour, COUNT(*)
+            FROM production_events
+            WHERE wall_ts >= ? AND wall_ts < ?
+            GROUP BY hour
+            ORDER BY hour
+        ''', (start.timestamp(), end.timestamp()))
+        return [(datetime.strptime(hour, "%Y-%m-%d %H:%M:%S"), count) for hour, count in rows]
+
+    def current_shift(self):
+        """当前班次 (班次日期, 名称, 开始时间, 结束时间, 累计值)，尚未开始累计时为 None"""
+        with self.lock:
+            if self.oee.shift is None:
+                return None
+            key = self.oee.shift[1]
+            start, end = self.oee.shift_info[key]
+            return key[0], key[1], start, end, list(self.oee.buckets[self.oee.shift])
+
+    def shift_rows(self, limit):
+        """最近 limit 个班次 [(班次日期, 名称, 开始时间, 结束时间, 累计值)]，按开始时间倒序"""
+        rows = self.db.query(f'''
+            SELECT shift_date, shift, start_time, end_time, {_BUCKET_COLUMNS}
+            FROM production_shifts ORDER BY start_time DESC LIMIT ?
+        ''', (limit,))
+        with self.lock:
+            overlay = self.oee.overlay("shift")
+            info = {key: self.oee.shift_info[key] for key in overlay}
+        result = {(day, name): (start, end, list(values)) for day, name, start, end, *values in rows}
+        for key, values in overlay.items():
+            start, end = info[key]
+            result[key] = (start.isoformat(timespec="seconds"), end.isoformat(timespec="seconds"), values)
+        ordered = sorted(result.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [(day, name, datetime.fromisoformat(start), datetime.fromisoformat(end), values)
+                for (day, name), (start, end, values) in ordered]
+
+    def hourly_rows(self, start, end):
+        """[start, end) 内的小时桶 [(小时, 累计值)]，按时间顺序"""
+        first, last = start.strftime("%Y-%m-%dT%H"), end.strftime("%Y-%m-%dT%H")
+        rows = self.db.query(f'''
+            SELECT hour, {_BUCKET_COLUMNS} FROM production_hourly WHERE hour >= ? AND hour < ?
+        ''', (first, last))
+        result = {hour: list(values) for hour, *values in rows}
+        with self.lock:
+            overlay = self.oee.overlay("hour")
+        result.update((hour, values) for hour, values in overlay.items() if first <= hour < last)
+        return sorted(result.items())
+
+    def cycle_time_percentiles(self, start, end, percentiles=(50, 90, 99)):
+        """
+        统计 [start, end) 内零件节拍（与上一件的间隔，秒）的分位数
+        :return: {"count": 件数, "mean": 平均值, 分位数: 值}，没有数据时只有 count
+        """
+        self.flush()
+        rows = self.db.query('''
+            SELECT interval FROM production_events
+            WHERE wall_ts >= ? AND wall_ts < ? AND interval IS NOT NULL
+            ORDER BY interval
+        ''', (start.timestamp(), end.timestamp()))
+        intervals = [row[0] for row in rows]
+        result = {"count": len(intervals)}
+        if not intervals:
+            return result
+        result["mean"] = sum(intervals) / len(intervals)
+        for p in percentiles:
+            # 最近秩法，结果总是实际出现过的节拍
+            rank = max(1, -(-p * len(intervals) // 100))
+            result[p] = intervals[rank - 1]
+        return result
+
+    def record_count(self):
+        self.flush()
+        return self.db.query_one("SELECT COUNT(*) FROM production_history")[0]
+
+    def clear_history(self):
+        with self.flush_lock:
+            with self.lock:
+                self.dirty = {}
+                self.daily_count = 0
+                self.pending_events = []
+                self.last_part_time = None  # 上一件已被删除，清空后第一件的间隔未知
+                self.oee.reset()
+            with self.db.transaction() as connection:
+                connection.execute("DELETE FROM production_history")
+                connection.execute("DELETE FROM production_events")
+                connection.execute("DELETE FROM production_hourly")
+                connection.execute("DELETE FROM production_shifts")
+
+    def process_signal(self, signal_value):
+        """
+        处理PLC信号，检测V750.0的上升沿进行计数
+        :param signal_value: 当前信号值 (True/False)
+        :return: 本次是否计数
+        """
+        counted = False
+        # 检测上升沿（从False变为True）
+        if not self.last_signal and signal_value:
+            self.increment_count()  # 信号触发时增加计数
+            counted = True
+
+        # 更新最后信号状态
+        if self.journal and signal_value != self.last_signal:
+            self.journal.update({"product.last_signal": signal_value})
+        self.last_signal = signal_value
+        return counted
+
+
+class ProductStatisticsTab(QWidget):
+    REFRESH_INTERVAL = 5000  # 看板刷新间隔（毫秒），同时处理跨天
+
+    def __init__(self, counter=None, settings=None):
+        super().__init__()
+        self.counter = counter or ProductCounter()
+        self.settings = settings
+        self.init_ui()
+        self.refresh_dashboard()
+
+        # 看板只读取预先累计的桶，定时刷新
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_dashboard)
+        self.refresh_timer.start(self.REFRESH_INTERVAL)
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -45,6 +447,10 @@ class ProductStatisticsTab(QWidget):
         self.daily_count_label.setStyleSheet("color: #2c3e50; padding: 15px;")
         layout.addWidget(self.daily_count_label)
 
+        # 班次/小时看板
+        self.dashboard = OeeDashboard(self.counter, self.settings)
+        layout.addWidget(self.dashboard)
+
         # 历史记录查询区域
         history_group = QGroupBox("历史记录查询")
         history_layout = QVBoxLayout()
@@ -86,17 +492,25 @@ class ProductStatisticsTab(QWidget):
         query_btn.clicked.connect(self.query_history)
         filter_layout.addWidget(query_btn)
 
+        export_btn = QPushButton("导出")
+        export_btn.setFixedWidth(100)
+        export_btn.clicked.connect(self.export_history)
+        filter_layout.addWidget(export_btn)
+
         history_layout.addLayout(filter_layout)
 
-        # 历史记录表格
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(3)
-        self.history_table.setHorizontalHeaderLabels(["日期", "加工数量", "记录ID"])
+        # 历史记录表格（分页加载，点击表头由数据库排序）
+        self.history_model = PagedTableModel(self.counter.db, "production_history", [
+            ("日期", "date"),
+            ("加工数量", "count"),
+            ("记录ID", "id"),
+        ], sort_column=0, parent=self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)  # 平分列宽
-        # self.history_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
-        # self.history_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        # self.history_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        self.history_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.history_table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
+        self.history_table.setSortingEnabled(True)
+        self.history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         history_layout.addWidget(self.history_table)
 
         # 清空记录按钮
@@ -123,33 +537,12 @@ class ProductStatisticsTab(QWidget):
         self.query_history()  # 初始查询所有历史记录
 
     def increment_count(self):
-        today = datetime.now().strftime("%Y-%m-%d")
-
-        # 检查是否已有今日记录
-        self.cursor.execute("SELECT id, count FROM production_history WHERE date = ?", (today,))
-        result = self.cursor.fetchone()
-
-        if result:
-            # 更新记录
-            record_id, current_count = result
-            new_count = current_count + 1
-            self.cursor.execute("UPDATE production_history SET count = ? WHERE id = ?",
-                                (new_count, record_id))
-        else:
-            # 创建新记录
-            self.cursor.execute("INSERT INTO production_history (date, count) VALUES (?, 1)",
-                                (today,))
-            new_count = 1
-
-        self.conn.commit()
+        new_count = self.counter.increment_count()
         self.update_daily_count()
         return new_count
 
     def update_daily_count(self):
-        today = datetime.now().strftime("%Y-%m-%d")
-        self.cursor.execute("SELECT count FROM production_history WHERE date = ?", (today,))
-        result = self.cursor.fetchone()
-        count = result[0] if result else 0
+        count = self.counter.get_daily_count()
         self.daily_count_label.setText(f"今日加工数量: {count}")
 
     def query_history(self):
@@ -157,45 +550,18 @@ class ProductStatisticsTab(QWidget):
         month = self.month_combo.currentData()
         day = self.day_combo.currentData()
 
-        query = "SELECT date, count, id FROM production_history"
-        conditions = []
-        params = []
-
-        if year:
-            conditions.append("strftime('%Y', date) = ?")
-            params.append(str(year))
-        if month:
-            conditions.append("strftime('%m', date) = ?")
-            params.append(f"{month:02d}")
-        if day:
-            conditions.append("strftime('%d', date) = ?")
-            params.append(f"{day:02d}")
-
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-
-        query += " ORDER BY date DESC"
+        # 先写入内存中的计数，保证查询结果包含今日数据，再在后台线程查询首页
+        self.counter.flush()
+        self.history_model.set_filter(*self.counter.history_filter(year, month, day))
 
-        self.cursor.execute(query, params)
-        results = self.cursor.fetchall()
-
-        self.history_table.setRowCount(len(results))
-        for row_idx, (date_str, count, record_id) in enumerate(results):
-            self.history_table.setItem(row_idx, 0, QTableWidgetItem(date_str))
-            self.history_table.setItem(row_idx, 1, QTableWidgetItem(str(count)))
-            self.history_table.setItem(row_idx, 2, QTableWidgetItem(str(record_id)))
-
-        # 添加以下代码以居中显示表格数据
-        for row in range(self.history_table.rowCount()):
-            for col in range(self.history_table.columnCount()):
-                item = self.history_table.item(row, col)
-                if item:
-                    item.setTextAlignment(Qt.AlignCenter | Qt.AlignVCenter)
+    def export_history(self):
+        """导出当前查询条件下的全部记录"""
+        self.counter.flush()
+        export_model(self, self.history_model, "生产记录")
 
     def show_clear_dialog(self):
         # 先检查是否有数据可清空
-        self.cursor.execute("SELECT COUNT(*) FROM production_history")
-        count = self.cursor.fetchone()[0]
+        count = self.counter.record_count()
 
         if count == 0:
             QMessageBox.information(self, "提示", "没有可清空的历史记录！")
@@ -206,33 +572,24 @@ class ProductStatisticsTab(QWidget):
             self.clear_history()
 
     def clear_history(self):
-        self.cursor.execute("DELETE FROM production_history")
-        self.conn.commit()
+        self.counter.clear_history()
         self.query_history()
         self.update_daily_count()
         QMessageBox.information(self, "成功", "历史记录已清空！")
 
-    def check_date_change(self):
-        # 检查日期是否变更（跨天）
-        now = datetime.now()
-        if not hasattr(self, 'last_check_date'):
-            self.last_check_date = now.date()
-
-        if now.date() != self.last_check_date:
-            self.last_check_date = now.date()
-            self.update_daily_count()
+    def refresh_dashboard(self):
+        # 当日计数在跨天时由计数器自动切换
+        self.update_daily_count()
+        if self.isVisible():
+            self.dashboard.refresh()
 
     def process_signal(self, signal_value):
         """
         处理PLC信号，检测V750.0的上升沿进行计数
         :param signal_value: 当前信号值 (True/False)
         """
-        # 检测上升沿（从False变为True）
-        if not self.last_signal and signal_value:
-            self.increment_count()  # 信号触发时增加计数
-
-        # 更新最后信号状态
-        self.last_signal = signal_value
+        if self.counter.process_signal(signal_value):
+            self.update_daily_count()
 
 
 class ClearHistoryDialog(QDialog):
@@ -0,0 +1,384 @@
+# replay.py
+import gzip
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from PySide6.QtCore import Qt, QThread, Signal, QProcess
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton, QComboBox, QSlider, QLabel
+
+logger = logging.getLogger(__name__)
+
+RECORDING_DIR = "recordings"
+MAGIC = b"PLCREC1\n"
+FLUSH_INTERVAL = 1.0  # 录制写线程把内存中的帧写入文件的间隔（秒）
+SPEEDS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50)  # 回放倍速
+MAX_PENDING_FRAMES = 4  # 回放时已发出但界面尚未处理完的最大帧数
+
+
+class FrameLayout:
+    """
+    一帧原始数据的布局：按 PLCWorker 的读取顺序拼接
+      all_addresses 每个地址1字节（V位寄存器），vd_addresses 每个地址4字节（PLC原始字节序），
+      vb_addresses 每个地址1字节。
+    decode() 得到与 PLCWorker 发出的相同的数据字典。
+    """
+
+    def __init__(self, all_addresses, vd_addresses, vb_addresses):
+        self.all_addresses = list(all_addresses)
+        self.vd_addresses = list(vd_addresses)
+        self.vb_addresses = list(vb_addresses)
+        self.vd_offset = len(self.all_addresses)
+        self.vb_offset = self.vd_offset + 4 * len(self.vd_addresses)
+        self.frame_size = self.vb_offset + len(self.vb_addresses)
+        # 预先生成键名，解码时不再格式化字符串
+        self.bit_keys = [[f"V{addr}.{bit}" for bit in range(8)] for addr in self.all_addresses]
+        self.byte_keys = [f"VB{addr}" for addr in self.all_addresses]
+        self.vd_keys = [f"VD{addr}" for addr in self.vd_addresses]
+        self.vb_keys = [f"VB{addr}" for addr in self.vb_addresses]
+
+    def to_dict(self):
+        return {"all_addresses": self.all_addresses, "vd_addresses": self.vd_addresses,
+                "vb_addresses": self.vb_addresses}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["all_addresses"], data["vd_addresses"], data["vb_addresses"])
+
+    def decode(self, raw):
+        results = {}
+        # 布尔量寄存器：每个字节拆成8位，同时保留字节值
+        for index, byte_value in enumerate(raw[:self.vd_offset]):
+            keys = self.bit_keys[index]
+            for bit_position in range(8):
+                results[keys[bit_position]] = bool((byte_value >> bit_position) & 1)
+            results[self.byte_keys[index]] = byte_value
+
+        # VD寄存器（浮点数）：S7-200 SMART 的字节顺序为 CDAB，
+        # 每4个字节按 [2, 3, 0, 1] 重排后按大端序解析
+        if self.vd_keys:
+            vd_bytes = np.frombuffer(bytes(raw[self.vd_offset:self.vb_offset]), dtype=np.uint8)
+            values = vd_bytes.reshape(-1, 4)[:, [2, 3, 0, 1]].copy().view(">f4").ravel().tolist()
+            results.update(zip(self.vd_keys, values))
+
+        # VB寄存器（字节值）
+        results.update(zip(self.vb_keys, raw[self.vb_offset:self.frame_size]))
+        return results
+
+
+def _header(layout):
+    meta = json.dumps(layout.to_dict()).encode("utf-8")
+    return MAGIC + struct.pack("<I", len(meta)) + meta
+
+
+def _frame_dtype(layout):
+    return np.dtype([("t", "<f8"), ("raw", "u1", (layout.frame_size,))])
+
+
+class FrameRecorder:
+    """
+    把 PLCWorker 每个周期读到的原始字节录制到文件 recordings/<开始时间>.plcrec。
+    文件 = 头（标识 + 帧布局JSON）+ 定长记录（时间戳8字节 + 原始帧），按时间戳二分查找即可定位。
+    record() 在工作线程中只把帧放入内存列表，写线程每 FLUSH_INTERVAL 秒写入文件。
+    """
+
+    def __init__(self, layout, directory=RECORDING_DIR):
+        self.layout = layout
+        self.directory = directory
+        self.dtype = _frame_dtype(layout)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.file = None
+        self.path = None
+        self.frames = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def recording(self):
+        return self.file is not None
+
+    def start(self):
+        if self.recording:
+            return self.path
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{datetime.now():%Y%m%d_%H%M%S}.plcrec")
+        self.file = open(self.path, "wb")
+        self.file.write(_header(self.layout))
+        self.frames = 0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._flush_loop, name="FrameRecorder", daemon=True)
+        self.thread.start()
+        logger.info("开始录制原始帧: %s", self.path)
+        return self.path
+
+    def record(self, timestamp, raw):
+        """记录一帧（PLCWorker线程调用），未在录制时直接返回"""
+        if self.file is None:
+            return
+        with self.lock:
+            self.pending.append((timestamp, raw))
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error("录制写入错误: %s", e)
+
+    def flush(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+            file = self.file
+        if not pending or file is None:
+            return
+        frames = np.empty(len(pending), dtype=self.dtype)
+        frames["t"] = [t for t, _ in pending]
+        frames["raw"] = np.frombuffer(b"".join(bytes(raw) for _, raw in pending),
+                                      dtype=np.uint8).reshape(len(pending), -1)
+        file.write(frames.tobytes())
+        file.flush()
+        self.frames += len(pending)
+
+    def stop(self):
+        """停止录制，返回录制文件路径"""
+        if not self.recording:
+            return None
+        self.stop_event.set()
+        self.thread.join()
+        self.flush()
+        with self.lock:
+            file, self.file = self.file, None
+        file.close()
+        logger.info("停止录制: %s（%d 帧）", self.path, self.frames)
+        return self.path
+
+
+def write_recording(path, layout, times, raws):
+    """把内存中的帧一次写成 gzip 压缩的录制文件（黑匣子等使用）"""
+    frames = np.empty(len(times), dtype=_frame_dtype(layout))
+    frames["t"] = times
+    frames["raw"] = raws
+    temp_path = path + ".tmp"
+    with gzip.open(temp_path, "wb", compresslevel=6) as file:
+        file.write(_header(layout))
+        file.write(frames.tobytes())
+    os.replace(temp_path, path)
+
+
+def launch_replay(path):
+    """在新进程中以回放模式启动主程序（打包后的exe或 main.py）"""
+    path = os.path.abspath(path)
+    if getattr(sys, "frozen", False):
+        program, arguments = sys.executable, ["--replay", path]
+    else:
+        program, arguments = sys.executable, [os.path.abspath(sys.argv[0]), "--replay", path]
+    return QProcess.startDetached(program, arguments)[0]
+
+
+class Recording:
+    """
+    读取录制文件（.plcrec，或 gzip 压缩的 .plcrec.gz）。
+    未压缩文件用 np.memmap 映射，只读取回放到的帧；压缩文件整体解压到内存。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        compressed = path.endswith(".gz")
+        with (gzip.open if compressed else open)(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是录制文件: {path}")
+            meta_length = struct.unpack("<I", file.read(4))[0]
+            self.layout = FrameLayout.from_dict(json.loads(file.read(meta_length).decode("utf-8")))
+            dtype = _frame_dtype(self.layout)
+            if compressed:
+                data = file.read()
+                self.frames = np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+        if not compressed:
+            offset = len(MAGIC) + 4 + meta_length
+            # 录制中的文件最后一帧可能只写了一半
+            count = (os.path.getsize(path) - offset) // dtype.itemsize
+            self.frames = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)) \
+                if count else np.empty(0, dtype=dtype)
+        self.times = self.frames["t"]
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def start_time(self):
+        return float(self.times[0]) if len(self) else 0.0
+
+    @property
+    def end_time(self):
+        return float(self.times[-1]) if len(self) else 0.0
+
+    def index_at(self, timestamp):
+        """时间戳对应的帧序号（该时刻及之后的第一帧）"""
+        return int(np.searchsorted(self.times, timestamp, side="left"))
+
+    def frame(self, index):
+        """(时间戳, 解码后的数据字典)"""
+        record = self.frames[index]
+        return float(record["t"]), self.layout.decode(record["raw"].tobytes())
+
+
+class ReplayWorker(QThread):
+    """
+    回放录制文件，代替 PLCWorker 向界面发出相同的 data_updated 信号，
+    界面显示、刀具/料盘/产量计数和报警逻辑与实际运行时一致。
+
+    按录制时的时间间隔和倍速（0.1×~50×）发帧；每一帧都会发出（计数依赖每个边沿），
+    界面处理不过来时通过 frame_consumed() 反压，实际速度受界面处理速度限制。
+    """
+
+    data_updated = Signal(dict)
+    status_message = Signal(str)
+    error_occurred = Signal(str)
+    position_changed = Signal(float)  # 当前回放到的录制时间戳
+
+    def __init__(self, recording, speed=1.0, parent=None):
+        super().__init__(parent)
+        self.recording = recording
+        self.speed = speed
+        self.running = False
+        self.paused = False
+        self.seek_index = None
+        self.resync = False  # 倍速、暂停或跳转后重新对齐回放时钟
+        self.lock = threading.Lock()
+        self.pending = threading.Semaphore(MAX_PENDING_FRAMES)
+        self.last_position_emit = 0.0
+
+    def set_speed(self, speed):
+        with self.lock:
+            self.speed = min(max(float(speed), SPEEDS[0]), SPEEDS[-1])
+            self.resync = True
+
+    def set_paused(self, paused):
+        with self.lock:
+            self.paused = paused
+            self.resync = True
+
+    def seek(self, timestamp):
+        """跳转到录制中的某个时刻"""
+        with self.lock:
+            self.seek_index = self.recording.index_at(timestamp)
+            self.resync = True
+
+    def frame_consumed(self):
+        """界面处理完一帧（连接在 data_updated 的界面槽函数之后）"""
+        self.pending.release()
+
+    def stop(self):
+        self.running = False
+        self.status_message.emit("正在停止回放...")
+
+    def run(self):
+        self.running = True
+        recording = self.recording
+        total = len(recording)
+        if not total:
+            self.error_occurred.emit("录制文件中没有数据")
+            return
+        self.status_message.emit(f"开始回放 {os.path.basename(recording.path)}（{total} 帧）")
+        index = 0
+        # 回放时钟：录制时间 base_time 对应 wall_start
+        wall_start, base_time = time.perf_counter(), recording.start_time
+        while self.running and index < total:
+            with self.lock:
+                speed, paused = self.speed, self.paused
+                if self.seek_index is not None:
+                    index = min(self.seek_index, total - 1)
+                    self.seek_index = None
+                resync, self.resync = self.resync, False
+            if resync:
+                wall_start, base_time = time.perf_counter(), float(recording.times[index])
+            if paused:
+                time.sleep(0.05)
+                continue
+
+            frame_time = float(recording.times[index])
+            delay = (frame_time - base_time) / speed - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(min(delay, 0.05))
+                continue
+            if not self.pending.acquire(timeout=0.1):
+                continue
+            _, data = recording.frame(index)
+            self.data_updated.emit(data)
+            index += 1
+            now = time.perf_counter()
+            if now - self.last_position_emit > 0.2:
+                self.last_position_emit = now
+                self.position_changed.emit(frame_time)
+        self.status_message.emit("回放结束")
+
+
+class ReplayControlBar(QWidget):
+    """回放控制：暂停、倍速、进度拖动。每次开始监控会新建回放线程，用 attach() 重新绑定"""
+
+    def __init__(self, recording, speed=1.0, parent=None):
+        super().__init__(parent)
+        self.recording = recording
+        self.worker = None
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.pause_button = QPushButton("暂停")
+        self.pause_button.setCheckable(True)
+        self.pause_button.toggled.connect(self.toggle_pause)
+        layout.addWidget(self.pause_button)
+
+        self.speed_combo = QComboBox()
+        for value in SPEEDS:
+            self.speed_combo.addItem(f"{value:g}×", value)
+        nearest = min(SPEEDS, key=lambda value: abs(value - speed))
+        self.speed_combo.setCurrentIndex(self.speed_combo.findData(nearest))
+        self.speed_combo.currentIndexChanged.connect(self.change_speed)
+        layout.addWidget(self.speed_combo)
+
+        # 进度条以0.1秒为单位
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, max(1, int((recording.end_time - recording.start_time) * 10)))
+        self.slider.setMinimumWidth(300)
+        self.slider.sliderReleased.connect(self.seek)
+        layout.addWidget(self.slider)
+
+        self.time_label = QLabel()
+        layout.addWidget(self.time_label)
+
+    @property
+    def speed(self):
+        return self.speed_combo.currentData()
+
+    def attach(self, worker):
+        """绑定新的回放线程，沿用当前的倍速和暂停状态"""
+        self.worker = worker
+        worker.set_speed(self.speed)
+        worker.set_paused(self.pause_button.isChecked())
+        worker.position_changed.connect(self.update_position)
+
+    def change_speed(self):
+        if self.worker is not None:
+            self.worker.set_speed(self.speed)
+
+    def toggle_pause(self, paused):
+        self.pause_button.setText("继续" if paused else "暂停")
+        if self.worker is not None:
+            self.worker.set_paused(paused)
+
+    def seek(self):
+        if self.worker is not None:
+            self.worker.seek(self.recording.start_time + self.slider.value() / 10)
+
+    def update_position(self, timestamp):
+        if not self.slider.isSliderDown():
+            self.slider.setValue(int((timestamp - self.recording.start_time) * 10))
+        self.time_label.setText(datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3])
@@ -0,0 +1,38 @@
+# resource.py
+import os
+import sys
+
+from PySide6.QtCore import QResource
+
+RCC_FILE = "icon.rcc"
+
+_registered = False
+
+
+def _rcc_path():
+    """二进制资源文件路径，兼容PyInstaller打包后的临时目录"""
+    base_dir = getattr(sys, "_MEIPASS", None)
+    if base_dir:
+        path = os.path.join(base_dir, "TOOL", RCC_FILE)
+        if os.path.exists(path):
+            return path
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), RCC_FILE)
+
+
+def load_resources():
+    """
+    注册图标资源（:/logo.ico），只在第一次调用时执行。
+    优先使用内存映射的二进制icon.rcc，找不到时回退到导入TOOL.icon
+    :return: 使用的方式 "rcc" 或 "py"
+    """
+    global _registered
+    if _registered:
+        return _registered
+
+    if QResource.registerResource(_rcc_path()):
+        _registered = "rcc"
+    else:
+        # 回退：icon.py是pyside6-rcc生成的Python模块，导入时自动注册
+        import TOOL.icon  # noqa: F401
+        _registered = "py"
+    return _registered
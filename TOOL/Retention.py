@@ -0,0 +1,165 @@
+# retention.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from TOOL.Storage import open_database
+
+logger = logging.getLogger(__name__)
+
+RETENTION_INTERVAL = 60  # 两轮清理之间的间隔（秒）
+FIRST_RUN_DELAY = 30  # 启动后延迟多久开始第一轮，避开启动阶段（秒）
+CHUNK_ROWS = 500  # 每个事务最多删除的行数
+CHUNK_PAUSE = 0.05  # 两个删除事务之间的停顿，让报警/产量写线程插入（秒）
+MAX_CHUNKS = 20  # 每张表每轮最多删除的批数，积压的旧数据分多轮删完
+VACUUM_PAGES = 1024  # 每个数据库每轮最多归还的空闲页数（incremental_vacuum）
+
+
+class RetentionPolicy:
+    """
+    一张历史表的保留策略
+    :param db_path: 数据库文件
+    :param table: 表名
+    :param column: 时间列（需要有索引）
+    :param days: 保留天数
+    :param time_format: 时间列的存储格式，"epoch" 表示Unix时间戳，其余为strftime格式
+    :param profile: 数据库的PRAGMA配置，必须与拥有该数据库的模块一致
+    """
+
+    def __init__(self, db_path, table, column, days, time_format, profile="history"):
+        self.db_path = db_path
+        self.table = table
+        self.column = column
+        self.days = days
+        self.time_format = time_format
+        self.profile = profile
+
+    def cutoff(self, now=None):
+        """早于该值的记录过期"""
+        now = now or datetime.now()
+        threshold = now - timedelta(days=self.days)
+        if self.time_format == "epoch":
+            return threshold.timestamp()
+        return threshold.strftime(self.time_format)
+
+
+DEFAULT_POLICIES = [
+    RetentionPolicy("robot_alarms.db", "alarm_history", "start_time", 180, "%Y-%m-%dT%H:%M:%S"),
+    RetentionPolicy("production_statistics.db", "production_events", "wall_ts", 90, "epoch"),
+    RetentionPolicy("production_statistics.db", "production_history", "date", 3650, "%Y-%m-%d"),
+    RetentionPolicy("production_statistics.db", "production_hourly", "hour", 730, "%Y-%m-%dT%H"),
+    RetentionPolicy("production_statistics.db", "production_shifts", "shift_date", 3650, "%Y-%m-%d"),
+    RetentionPolicy("cycle_features.db", "cycle_features", "start_time", 730, "epoch"),
+    RetentionPolicy("tool_history.db", "tool_history", "end_time", 1825, "%Y-%m-%d %H:%M:%S", "record"),
+    RetentionPolicy("tool_history2.db", "tool_history", "end_time", 1825, "%Y-%m-%d %H:%M:%S", "record"),
+]
+
+
+class RetentionJob:
+    """
+    历史数据保留任务。后台线程每 interval 秒执行一轮：
+    按时间列索引每次删除最多 CHUNK_ROWS 行（短事务，不长时间阻塞写线程），
+    然后用 incremental_vacuum 逐步把空闲页归还给文件系统。
+    """
+
+    def __init__(self, policies=None, interval=RETENTION_INTERVAL, first_delay=FIRST_RUN_DELAY):
+        self.policies = list(DEFAULT_POLICIES if policies is None else policies)
+        self.interval = interval
+        self.first_delay = first_delay
+        self.rows_deleted = {}  # (数据库, 表) -> 累计删除行数
+        self.last_run = None
+        self.warned = set()  # 已提示需要手动VACUUM的数据库
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run_loop, name="RetentionJob", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run_loop(self):
+        delay = self.first_delay
+        while not self.stop_event.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("历史数据清理错误: %s", e)
+            delay = self.interval
+
+    def run_once(self):
+        """执行一轮清理，返回本轮删除的总行数"""
+        start = time.perf_counter()
+        total = 0
+        databases = []
+        for policy in self.policies:
+            if self.stop_event.is_set():
+                break
+            db = self._open(policy)
+            if db is None:
+                continue
+            if db not in databases:
+                databases.append(db)
+            deleted = self._delete_expired(db, policy)
+            key = (policy.db_path, policy.table)
+            self.rows_deleted[key] = self.rows_deleted.get(key, 0) + deleted
+            total += deleted
+        for db in databases:
+            if self.stop_event.is_set():
+                break
+            self._vacuum(db)
+        self.last_run = datetime.now()
+        if total:
+            logger.info("历史数据清理删除 %d 行，用时 %.0f ms", total, (time.perf_counter() - start) * 1000)
+        return total
+
+    @staticmethod
+    def _open(policy):
+        """只处理已存在且包含该表的数据库，不创建新文件"""
+        if not os.path.exists(policy.db_path):
+            return None
+        db = open_database(policy.db_path, policy.profile)
+        exists = db.query_one("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (policy.table,))
+        return db if exists else None
+
+    def _delete_expired(self, db, policy):
+        cutoff = policy.cutoff()
+        # 子查询按时间列索引取出最旧的一批rowid，每批一个短事务
+        sql = f"""
+            DELETE FROM {policy.table} WHERE rowid IN (
+                SELECT rowid FROM {policy.table}
+                WHERE {policy.column} < ?
+                ORDER BY {policy.column}
+                LIMIT ?
+            )
+        """
+        deleted = 0
+        for _ in range(MAX_CHUNKS):
+            with db.transaction() as connection:
+                count = connection.execute(sql, (cutoff, CHUNK_ROWS)).rowcount
+            deleted += count
+            if count < CHUNK_ROWS or self.stop_event.wait(CHUNK_PAUSE):
+                break
+        return deleted
+
+    def _vacuum(self, db):
+        mode = db.query_one("PRAGMA auto_vacuum")[0]
+        if mode != 2:
+            # 旧数据库没有开启增量回收，需要一次完整VACUUM才能切换；
+            # VACUUM 重建期间一直持有写锁，会让报警/产量写线程超时，所以运行中不做，只提示一次
+            if db.path not in self.warned:
+                self.warned.add(db.path)
+                logger.warning("%s 未开启增量回收(%d MB)，删除的空间不会归还，请在停机时执行 "
+                               "PRAGMA auto_vacuum = INCREMENTAL; VACUUM;",
+                               os.path.basename(db.path), os.path.getsize(db.path) // (1024 * 1024))
+            return
+        free_pages = db.query_one("PRAGMA freelist_count")[0]
+        if free_pages:
+            # incremental_vacuum 每执行一步只释放一页，executescript 会一直执行到结束
+            db.connection().executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
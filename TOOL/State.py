@@ -0,0 +1,179 @@
+# state.py
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "machine_state"  # 实际文件为 machine_state.snap 和 machine_state.journal
+FLUSH_INTERVAL = 0.1  # 日志批量写入间隔（秒），也是异常退出时最多丢失的时间
+SNAPSHOT_RECORDS = 5000  # 日志累计多少条记录后写快照并截断日志
+
+_MISSING = object()
+
+
+class StateJournal:
+    """
+    机器状态（刀具寿命/计数、料盘计数、计数信号的边沿状态）的崩溃安全持久化。
+
+    状态是扁平的 键->值 字典。界面线程调用 update() 时只比较内存中的值，
+    变化的记录放入队列；后台线程每 flush_interval 秒把一批记录追加到日志文件并 fsync，
+    同一批次中同一个键只写最后的值。日志累计 snapshot_records 条后写一次完整快照
+    （先写临时文件再原子替换），然后截断日志，日志和快照的大小都有上限。
+    启动时读取快照再重放日志，崩溃时写了一半的最后一条记录被丢弃。
+    """
+
+    def __init__(self, path=STATE_FILE, flush_interval=FLUSH_INTERVAL, snapshot_records=SNAPSHOT_RECORDS):
+        self.snapshot_path = path + ".snap"
+        self.journal_path = path + ".journal"
+        self.flush_interval = flush_interval
+        self.snapshot_records = snapshot_records
+        self.lock = threading.Lock()
+
+        start = time.perf_counter()
+        self.state, self.seq, self.journal_records = self._load()
+        self.restore_time = time.perf_counter() - start
+        logger.info("状态恢复 %.1f ms，%d 个键，重放日志 %d 条",
+                    self.restore_time * 1000, len(self.state), self.journal_records)
+
+        # 以下只由写入线程使用：已写入磁盘的状态，用于生成快照
+        self.persisted = dict(self.state)
+        self.persisted_seq = self.seq
+        self.journal_file = open(self.journal_path, "ab")
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._writer_loop, name="StateJournal", daemon=True)
+        self.thread.start()
+
+    def _load(self):
+        """读取快照并重放日志，返回 (状态, 最新序号, 日志记录数)"""
+        state, seq = {}, 0
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            state, seq = snapshot["state"], snapshot["seq"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            logger.error("状态快照损坏，已忽略: %s", e)
+
+        snapshot_seq = seq
+        records = 0
+        valid_size = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record_seq, key, value = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_size += len(line)
+                    records += 1
+                    # 快照已包含的记录（写快照后、截断日志前崩溃）跳过；
+                    # 同一批次内每个键只出现一次，批次按序号递增，因此按文件顺序应用即可
+                    if record_seq > snapshot_seq:
+                        state[key] = value
+                        seq = max(seq, record_seq)
+                torn = f.tell() != valid_size
+            if torn:
+                # 丢弃写了一半的记录，否则新记录会接在它后面
+                logger.warning("状态日志末尾有不完整的记录，已截断")
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(valid_size)
+        except FileNotFoundError:
+            pass
+        return state, seq, records
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.state.get(key, default)
+
+    def update(self, items):
+        """
+        记录一组 键->值，只有值变化的键才写入日志。
+        只做内存比较和入队，不做磁盘IO，可以在界面线程中调用。
+        """
+        changed = []
+        with self.lock:
+            for key, value in items.items():
+                if self.state.get(key, _MISSING) != value:
+                    self.state[key] = value
+                    self.seq += 1
+                    changed.append((self.seq, key, value))
+        if changed:
+            self.queue.put(changed)
+
+    def _writer_loop(self):
+        while True:
+            batch = self.queue.get()
+            stop = batch is None
+            records = [] if stop else list(batch)
+            # 收集 flush_interval 内到达的记录，一次写入一次fsync
+            deadline = time.monotonic() + self.flush_interval
+            while not stop:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if batch is None:
+                    stop = True
+                else:
+                    records.extend(batch)
+            if records:
+                self._append(records)
+            if stop:
+                break
+
+    def _append(self, records):
+        latest = {}
+        for seq, key, value in records:
+            latest[key] = (seq, value)
+        data = b"".join(
+            json.dumps([seq, key, value], ensure_ascii=False).encode("utf-8") + b"\n"
+            for key, (seq, value) in latest.items())
+        try:
+            self.journal_file.write(data)
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+        except OSError as e:
+            logger.error("状态日志写入错误: %s", e)
+            return
+
+        for key, (seq, value) in latest.items():
+            self.persisted[key] = value
+        self.persisted_seq = records[-1][0]
+        self.journal_records += len(latest)
+        if self.journal_records >= self.snapshot_records:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        temp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"seq": self.persisted_seq, "state": self.persisted}, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            # 快照已包含日志中的全部记录
+            self.journal_file.truncate(0)
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+            self.journal_records = 0
+        except OSError as e:
+            logger.error("状态快照写入错误: %s", e)
+
+    def close(self):
+        """写完队列中剩余的记录，生成快照，使下次启动无需重放日志"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.journal_records:
+            self._write_snapshot()
+        self.journal_file.close()
@@ -0,0 +1,152 @@
+# storage.py
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA 配置，按数据库用途选择
+PRAGMA_PROFILES = {
+    # 报警、产量等持续追加的历史数据：WAL + NORMAL，断电最多丢失最近的事务，不会损坏
+    "history": {
+        "auto_vacuum": "INCREMENTAL",  # 只对新建的数据库生效，旧文件需要停机时VACUUM转换
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -8000,  # 8MB
+        "busy_timeout": 5000,
+    },
+    # 刀具更换记录等低频但不能丢失的数据：每次提交都落盘
+    "record": {
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+
+_databases = {}
+_registry_lock = threading.Lock()
+
+
+class Database:
+    """
+    一个SQLite数据库文件的访问入口。
+    每个线程使用自己的长连接（首次使用时创建并按 profile 设置PRAGMA），
+    长连接复用 sqlite3 默认的预编译语句缓存（每个连接128条），不再每次调用都打开/关闭连接。
+    migrations 是按版本顺序排列的迁移函数，第 n 个函数把 user_version 从 n-1 升级到 n。
+    """
+
+    def __init__(self, path, profile="history", migrations=()):
+        self.path = path
+        self.profile = profile
+        self.pragmas = PRAGMA_PROFILES[profile]
+        self.migrations = list(migrations)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []  # 所有线程的连接，close() 时统一关闭
+        self.migrate()
+
+    @property
+    def schema_version(self):
+        return len(self.migrations)
+
+    def connection(self):
+        """当前线程的连接"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # 连接只在创建它的线程中使用；允许跨线程只是为了 close() 能统一关闭
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            for name, value in self.pragmas.items():
+                connection.execute(f"PRAGMA {name}={value}")
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.connection().executemany(sql, seq_of_params)
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def transaction(self):
+        """
+        事务上下文：with db.transaction() as connection: ...
+        正常结束提交，异常时回滚
+        """
+        return self.connection()
+
+    def migrate(self):
+        """按 user_version 依次执行尚未执行的迁移，每个版本一个事务"""
+        connection = self.connection()
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(self.migrations, 1):
+            if version >= target:
+                continue
+            # 显式开始事务，使建表等DDL语句和版本号一起提交或回滚
+            connection.execute("BEGIN")
+            try:
+                migration(connection)
+                connection.execute(f"PRAGMA user_version = {target}")
+                connection.commit()
+            except sqlite3.Error:
+                connection.rollback()
+                raise
+            logger.info("%s 表结构升级到版本 %d", os.path.basename(self.path), target)
+
+    def close(self):
+        with self.lock:
+            connections = self.connections
+            self.connections = []
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.Error as e:
+                logger.error("关闭数据库连接错误 %s: %s", os.path.basename(self.path), e)
+        self.local = threading.local()
+        with _registry_lock:
+            if _databases.get(os.path.abspath(self.path)) is self:
+                del _databases[os.path.abspath(self.path)]
+
+
+def open_database(path, profile="history", migrations=()):
+    """
+    打开（或返回已打开的）数据库，同一个文件在进程内只有一个 Database 对象
+    已打开时：profile 必须一致，否则抛出 ValueError；
+    migrations 比已登记的更多（已登记的是它的前缀）时登记并执行尚未执行的迁移，
+    与已登记的迁移冲突时抛出 ValueError
+    """
+    key = os.path.abspath(path)
+    migrations = list(migrations)
+    with _registry_lock:
+        database = _databases.get(key)
+        if database is None:
+            database = Database(path, profile, migrations)
+            _databases[key] = database
+            return database
+        if database.profile != profile:
+            raise ValueError(f"{path} 已按 {database.profile} 配置打开，不能再按 {profile} 打开")
+        known = database.migrations
+        if migrations[:len(known)] == known:
+            if len(migrations) > len(known):
+                database.migrations = migrations
+                database.migrate()
+        elif known[:len(migrations)] != migrations:
+            raise ValueError(f"{path} 的表结构迁移与已打开的不一致")
+        return database
+
+
+def close_all():
+    """关闭所有已打开的数据库，程序退出时调用"""
+    with _registry_lock:
+        databases = list(_databases.values())
+    for database in databases:
+        database.close()
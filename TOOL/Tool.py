@@ -1,21 +1,62 @@
-import sqlite3
 from datetime import datetime
 
 from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView,
     QPushButton, QDialog, QFormLayout, QLineEdit, QDialogButtonBox,
-    QMessageBox, QLabel, QInputDialog, QComboBox
+    QMessageBox, QLabel, QInputDialog, QComboBox, QTableView, QAbstractItemView
 )
 from PySide6.QtCore import Qt
 
+from TOOL.Export import export_model
+from TOOL.Paging import PagedTableModel
+from TOOL.Storage import open_database
+from TOOL.ToolLife import ToolLifeForecast, format_duration
+
+
+def _migrate_v1(connection):
+    """刀具更换记录、更换原因和操作员历史"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS tool_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tool_id TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            change_reason TEXT,
+            new_life_setting INTEGER NOT NULL,
+            operator TEXT
+        )
+    """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS change_reason_history (
+            reason TEXT PRIMARY KEY
+        )
+    """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS operator_history (
+            operator TEXT PRIMARY KEY
+        )
+    """)
+
+
+def _migrate_v2(connection):
+    # 历史按 end_time 排序显示，过期记录也按 end_time 分批删除
+    connection.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tool_history_end
+        ON tool_history (end_time)
+    """)
+
+
+# 按版本顺序排列的表结构迁移（PRAGMA user_version），tool_history.db 和 tool_history2.db 共用
+TOOL_MIGRATIONS = [_migrate_v1, _migrate_v2]
+
 
 class ToolChangeDialog(QDialog):
-    def __init__(self, tool_id, parent=None, db_path=None):
+    def __init__(self, tool_id, parent=None, db=None):
         super().__init__(parent)
         self.setWindowTitle(f"刀具 {tool_id} 寿命到期")
         self.setFixedSize(400, 300)
-        self.db_path = db_path
+        self.db = db
 
         layout = QVBoxLayout()
 
@@ -49,23 +90,15 @@ class ToolChangeDialog(QDialog):
         self.setLayout(layout)
 
     def load_change_reason_history(self):
-        if not self.db_path:
+        if not self.db:
             return
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT reason FROM change_reason_history ORDER BY reason")
-        reasons = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        reasons = [row[0] for row in self.db.query("SELECT reason FROM change_reason_history ORDER BY reason")]
         self.change_reason_combo.addItems(reasons)
 
     def load_operator_history(self):
-        if not self.db_path:
+        if not self.db:
             return
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT operator FROM operator_history ORDER BY operator")
-        operators = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        operators = [row[0] for row in self.db.query("SELECT operator FROM operator_history ORDER BY operator")]
         self.operator_combo.addItems(operators)
 
     def get_values(self):
@@ -77,20 +110,40 @@ class ToolChangeDialog(QDialog):
 
 
 class ToolHistoryDialog(QDialog):
-    def __init__(self, tool_id, db_path, parent=None):
+    def __init__(self, tool_id, db, parent=None):
         super().__init__(parent)
         self.setWindowTitle(f"刀具 {tool_id} 更换历史")
         self.setFixedSize(800, 600)
-        self.db_path = db_path
+        self.db = db
         self.tool_id = tool_id
 
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
 
-        # 创建表格
-        self.table = QTableWidget()
+        # 创建表格（分页加载，点击表头由数据库排序）
+        if tool_id == "*":
+            columns = [("刀具ID", "tool_id")]
+        else:
+            columns = []
+        columns += [("开始时间", "start_time"), ("结束时间", "end_time"), ("更换原因", "change_reason"),
+                    ("新设定寿命", "new_life_setting"), ("操作员", "operator")]
+        sort_column = len(columns) - 4  # 结束时间（有索引）
+        self.model = PagedTableModel(db, "tool_history", columns, sort_column=sort_column, parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setAlternatingRowColors(True)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.horizontalHeader().setSortIndicator(sort_column, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
         self.layout.addWidget(self.table)
 
+        export_btn = QPushButton("导出")
+        export_btn.setFixedHeight(30)
+        export_btn.clicked.connect(lambda: export_model(self, self.model, "刀具更换记录"))
+        self.layout.addWidget(export_btn)
+
         # 清除历史按钮（只在查看所有历史时显示）
         if tool_id == "*":
             clear_btn = QPushButton("清除所有历史记录")
@@ -101,49 +154,13 @@ class ToolHistoryDialog(QDialog):
         self.load_data()
 
     def load_data(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
         if self.tool_id == "*":
-            cursor.execute("""
-                SELECT tool_id, start_time, end_time, change_reason, new_life_setting, operator 
-                FROM tool_history 
-                ORDER BY end_time DESC
-            """)
-            records = cursor.fetchall()
-            column_labels = ["刀具ID", "开始时间", "结束时间", "更换原因", "新设定寿命", "操作员"]
+            self.model.set_filter()
         else:
-            cursor.execute("""
-                SELECT start_time, end_time, change_reason, new_life_setting, operator 
-                FROM tool_history 
-                WHERE tool_id = ?
-                ORDER BY end_time DESC
-            """, (self.tool_id,))
-            records = cursor.fetchall()
-            column_labels = ["开始时间", "结束时间", "更换原因", "新设定寿命", "操作员"]
-
-        conn.close()
-
-        self.table.clear()
-        self.table.setRowCount(len(records))
-        self.table.setColumnCount(len(column_labels))
-        self.table.setHorizontalHeaderLabels(column_labels)
-        self.table.verticalHeader().setVisible(False)
-        self.table.setAlternatingRowColors(True)
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-
-        for row_idx, row_data in enumerate(records):
-            for col_idx, col_data in enumerate(row_data):
-                item = QTableWidgetItem(str(col_data))
-                item.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(row_idx, col_idx, item)
+            self.model.set_filter("tool_id = ?", (self.tool_id,))
 
     def clear_history(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM tool_history")
-        count = cursor.fetchone()[0]
-        conn.close()
+        count = self.db.query_one("SELECT COUNT(*) FROM tool_history")[0]
 
         if count == 0:
             QMessageBox.information(self, "提示", "没有历史记录可以清除。")
@@ -159,11 +176,8 @@ class ToolHistoryDialog(QDialog):
                     QMessageBox.Yes | QMessageBox.No
                 )
                 if reply == QMessageBox.Yes:
-                    conn = sqlite3.connect(self.db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM tool_history")
-                    conn.commit()
-                    conn.close()
+                    with self.db.transaction() as connection:
+                        connection.execute("DELETE FROM tool_history")
 
                     QMessageBox.information(self, "成功", "历史记录已清除。")
                     self.load_data()
@@ -172,41 +186,24 @@ class ToolHistoryDialog(QDialog):
 
 
 class ToolManager:
-    def __init__(self,plc_callback=None, db_path="tool_history.db"):
+    def __init__(self, plc_callback=None, db_path="tool_history.db", journal=None, state_key="tool1", name="刀具管理1"):
         self.db_path = db_path
         self.tools = []
         self.current_counts = {}
         self.life_settings = {}
+        self.last_signal_state = False
+        self.shown_dialogs = set()
+        self.journal = journal  # 状态日志，刀具寿命/计数和信号状态重启后恢复
+        self.state_key = state_key
         self.db_setup()
         self.init_tools()
+        self.restore_state()
+        self.forecast = ToolLifeForecast(self, name)  # 按生产速率预测到期时间
         self.plc_callback = plc_callback  # 保存回调函数
 
     def db_setup(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tool_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tool_id TEXT NOT NULL,
-                start_time TEXT NOT NULL,
-                end_time TEXT NOT NULL,
-                change_reason TEXT,
-                new_life_setting INTEGER NOT NULL,
-                operator TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS change_reason_history (
-                reason TEXT PRIMARY KEY
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS operator_history (
-                operator TEXT PRIMARY KEY
-            )
-        """)
-        conn.commit()
-        conn.close()
+        # 长连接和表结构迁移由存储层管理，同一文件的对话框共用这个数据库对象
+        self.db = open_database(self.db_path, "record", TOOL_MIGRATIONS)
 
     def init_tools(self):
         # 初始化24把刀具
@@ -217,23 +214,43 @@ class ToolManager:
             self.life_settings[tool_id] = 0
             self.current_counts[tool_id] = 0
 
+    def restore_state(self):
+        """从状态日志恢复寿命设定、当前计数和计数信号状态"""
+        if not self.journal:
+            return
+        for tool_id in self.tools:
+            self.life_settings[tool_id] = self.journal.get(f"{self.state_key}.life.{tool_id}", 0)
+            self.current_counts[tool_id] = self.journal.get(f"{self.state_key}.count.{tool_id}", 0)
+        self.last_signal_state = self.journal.get(f"{self.state_key}.last_signal", False)
+
+    def persist(self):
+        """把当前状态交给状态日志，只有变化的值会写入，不阻塞界面线程"""
+        if not self.journal:
+            return
+        items = {f"{self.state_key}.last_signal": self.last_signal_state}
+        for tool_id in self.tools:
+            items[f"{self.state_key}.life.{tool_id}"] = self.life_settings[tool_id]
+            items[f"{self.state_key}.count.{tool_id}"] = self.current_counts[tool_id]
+        self.journal.update(items)
+
+    def reset_all_counts(self):
+        """清零所有刀具的当前计数（修改寿命设定后），重新计算到期顺序并保存"""
+        for tool_id in self.tools:
+            self.current_counts[tool_id] = 0
+        self.forecast.resync()
+        self.persist()
+
     def record_tool_change(self, tool_id, start_time, end_time, change_reason, new_life_setting, operator):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO tool_history (tool_id, start_time, end_time, change_reason, new_life_setting, operator)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (tool_id, start_time, end_time, change_reason, new_life_setting, operator))
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as connection:
+            connection.execute("""
+                INSERT INTO tool_history (tool_id, start_time, end_time, change_reason, new_life_setting, operator)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (tool_id, start_time, end_time, change_reason, new_life_setting, operator))
 
     def save_history_record(self, reason, operator):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO change_reason_history(reason) VALUES(?)", (reason,))
-        cursor.execute("INSERT OR IGNORE INTO operator_history(operator) VALUES(?)", (operator,))
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as connection:
+            connection.execute("INSERT OR IGNORE INTO change_reason_history(reason) VALUES(?)", (reason,))
+            connection.execute("INSERT OR IGNORE INTO operator_history(operator) VALUES(?)", (operator,))
 
     def check_tool_life(self, tool_id, parent_widget=None):
         if self.life_settings.get(tool_id, 0) <= 0:
@@ -242,11 +259,14 @@ class ToolManager:
         if self.current_counts[tool_id] >= self.life_settings[tool_id]:
             start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            # 发送 PLC 信号 - V750.7 = True
+            # 弹窗等待期间程序可能被关闭，先保存已累加的计数
+            self.persist()
+
+            # 发送 PLC 换刀信号（刀具管理1为V750.7，刀具管理2为V800.7）= True
             if self.plc_callback:
                 self.plc_callback(True)
 
-            dialog = ToolChangeDialog(tool_id, parent_widget, self.db_path)
+            dialog = ToolChangeDialog(tool_id, parent_widget, self.db)
             if dialog.exec() == QDialog.Accepted:
                 values = dialog.get_values()
                 try:
@@ -263,8 +283,9 @@ class ToolManager:
 
                     self.current_counts[tool_id] = 0
                     self.life_settings[tool_id] = new_life
+                    self.persist()
 
-                    # 复位 PLC 信号 - V750.7 = False
+                    # 复位 PLC 换刀信号 = False
                     if self.plc_callback:
                         self.plc_callback(False)
                     return True
@@ -281,28 +302,62 @@ class ToolManager:
                 return False
         return True
 
+    def process_signal(self, signal_state, parent_widget=None):
+        """处理计数信号的上升沿，与界面无关，标签页未创建时也能计数"""
+        previous = self.last_signal_state
+        # 先更新信号状态：弹窗的嵌套事件循环中再次调用不会重复计数，弹窗前保存的状态也已包含本次边沿
+        self.last_signal_state = signal_state
+        if signal_state and not previous:
+            self.forecast.edge()
+            for tool_id in self.tools:
+                if self.life_settings[tool_id] <= 0:
+                    continue
+
+                # 如果刀具寿命已达到上限且未处理，则跳过计数
+                if (tool_id in self.shown_dialogs and
+                    self.current_counts[tool_id] >= self.life_settings[tool_id]):
+                    continue
+
+                self.current_counts[tool_id] += 1
+
+                if self.current_counts[tool_id] >= self.life_settings[tool_id]:
+                    self.shown_dialogs.add(tool_id)
+
+                    if self.check_tool_life(tool_id, parent_widget):
+                        self.current_counts[tool_id] = 0
+                        self.shown_dialogs.discard(tool_id)
+                        self.forecast.resync(tool_id)
+                    else:
+                        # 用户取消则冻结计数不变
+                        pass
+
+        if signal_state != previous:
+            self.persist()
+
 
 class ToolManagementTab(QWidget):
+    TITLE = "刀具管理系统"
+
     def __init__(self, tool_manager, parent=None):
         super().__init__(parent)
         self.tool_manager = tool_manager
-        self.last_signal_state = False
-        self.shown_dialogs = set()
         self.open_dialogs = []
+        self.eta_version = None  # 预计剩余时间列对应的预测版本，预测未变化时不刷新该列
         self.init_ui()
+        self.update_table()
 
     def init_ui(self):
         layout = QVBoxLayout()
 
-        title = QLabel("刀具管理系统")
+        title = QLabel(self.TITLE)
         title.setStyleSheet("font-size: 20px; font-weight: bold; color: #2c3e50;")
         title.setAlignment(Qt.AlignCenter)
         layout.addWidget(title)
 
         self.table = QTableWidget()
         self.table.setRowCount(len(self.tool_manager.tools))
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["刀具型号", "设定寿命", "当前计数", "操作"])
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["刀具型号", "设定寿命", "当前计数", "预计剩余时间", "操作"])
 
         for row, tool_id in enumerate(self.tool_manager.tools):
             tool_item = QTableWidgetItem(tool_id)
@@ -318,10 +373,15 @@ class ToolManagementTab(QWidget):
             count_item.setFlags(count_item.flags() & ~Qt.ItemIsEditable)
             self.table.setItem(row, 2, count_item)
 
+            eta_item = QTableWidgetItem()
+            eta_item.setTextAlignment(Qt.AlignCenter)
+            eta_item.setFlags(eta_item.flags() & ~Qt.ItemIsEditable)
+            self.table.setItem(row, 3, eta_item)
+
             edit_btn = QPushButton("修改设定")
             edit_btn.setFixedSize(80, 25)
             edit_btn.clicked.connect(lambda _, t=tool_id: self.edit_tool_setting(t))
-            self.table.setCellWidget(row, 3, edit_btn)
+            self.table.setCellWidget(row, 4, edit_btn)
             edit_btn.setStyleSheet("""
                 QPushButton {
                     background-color: #4CAF50;
@@ -352,7 +412,7 @@ class ToolManagementTab(QWidget):
         self.setLayout(layout)
 
     def show_all_tool_history(self):
-        dialog = ToolHistoryDialog("*", self.tool_manager.db_path, self)
+        dialog = ToolHistoryDialog("*", self.tool_manager.db, self)
         dialog.exec()
 
     def edit_tool_setting(self, tool_id):
@@ -367,21 +427,23 @@ class ToolManagementTab(QWidget):
         )
         if ok:
             self.tool_manager.life_settings[tool_id] = new_setting
+            self.tool_manager.persist()
             self.update_table()
             # 清零所有刀具的当前计数
             self.reset_all_current_counts()
 
-    def reset_all_current_counts(self):
-        """重置所有刀具的当前计数为0"""
-        for tool in self.tool_manager.tools:
-            self.tool_manager.current_counts[tool] = 0
-        self.update_table()  # 更新表格显示
-
     def update_table(self):
+        forecast = self.tool_manager.forecast
+        refresh_eta = forecast.version != self.eta_version
+        self.eta_version = forecast.version
         for row in range(self.table.rowCount()):
             tool_id = self.table.item(row, 0).text()
             self.table.item(row, 1).setText(str(self.tool_manager.life_settings[tool_id]))
             self.table.item(row, 2).setText(str(self.tool_manager.current_counts[tool_id]))
+            if refresh_eta:
+                remaining = forecast.remaining(tool_id)
+                self.table.item(row, 3).setText(
+                    "已到期" if remaining == 0 else format_duration(forecast.hours_left(tool_id)))
 
             if self.tool_manager.life_settings[tool_id] <= 0:
                 self.table.item(row, 2).setBackground(QColor(220, 220, 220))  # 灰色，表示不计数
@@ -397,32 +459,9 @@ class ToolManagementTab(QWidget):
 
     def reset_all_current_counts(self):
         """重置所有刀具的当前计数为0"""
-        for tool in self.tool_manager.tools:
-            self.tool_manager.current_counts[tool] = 0
+        self.tool_manager.reset_all_counts()
         self.update_table()  # 更新表格显示
 
     def process_signal(self, signal_state):
-        if signal_state and not self.last_signal_state:
-            for tool_id in self.tool_manager.tools:
-                if self.tool_manager.life_settings[tool_id] <= 0:
-                    continue
-
-                # 如果刀具寿命已达到上限且未处理，则跳过计数
-                if (tool_id in self.shown_dialogs and
-                    self.tool_manager.current_counts[tool_id] >= self.tool_manager.life_settings[tool_id]):
-                    continue
-
-                self.tool_manager.current_counts[tool_id] += 1
-
-                if self.tool_manager.current_counts[tool_id] >= self.tool_manager.life_settings[tool_id]:
-                    self.shown_dialogs.add(tool_id)
-
-                    if self.tool_manager.check_tool_life(tool_id, self):
-                        self.tool_manager.current_counts[tool_id] = 0
-                        self.shown_dialogs.discard(tool_id)
-                    else:
-                        # 用户取消则冻结计数不变
-                        pass
-
-        self.last_signal_state = signal_state
-        self.update_table()
\ No newline at end of file
+        self.tool_manager.process_signal(signal_state, self)
+        self.update_table()
@@ -0,0 +1,224 @@
+# toollife.py
+import heapq
+import math
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QBrush, QColor
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QTableWidget, QTableWidgetItem,
+    QHeaderView, QAbstractItemView
+)
+
+RATE_EDGES = 30  # 生产速率按最近这么多个计数间隔滚动计算
+IDLE_GAP = 600.0  # 两个上升沿间隔超过该值（秒）视为停机，不计入速率
+PLAN_ROWS = 12  # 换刀计划默认显示的刀具数量
+BATCH_MINUTES = 30  # 与最早到期刀具相差不超过该时间（分钟）的刀具建议一起更换
+REFRESH_INTERVAL = 1000  # 换刀计划刷新间隔（毫秒），只在可见时刷新
+
+
+def format_duration(hours):
+    """剩余生产时间显示为 x小时y分"""
+    if hours is None or math.isinf(hours):
+        return "—"
+    minutes = int(round(hours * 60))
+    if minutes < 60:
+        return f"{minutes}分"
+    return f"{minutes // 60}小时{minutes % 60:02d}分"
+
+
+class ToolLifeForecast:
+    """
+    一个刀具管理器的寿命预测：按计数信号上升沿滚动计算生产速率（件/小时），
+    剩余时间 = 剩余件数 / 生产速率。
+
+    同一管理器的刀具在同一个上升沿一起计数，剩余件数同时减1，
+    所以记录每把刀具到期时的边沿序号 expire_at = 当前边沿数 + 剩余件数，它在计数过程中不变，
+    按 expire_at 排好的顺序也不变。每个上升沿只更新边沿数和速率（O(1)），
+    只有换刀、修改寿命或清零计数时才调用 resync() 重新放入排序列表。
+    被取消换刀而冻结计数的刀具 expire_at 不再前进，剩余件数按0显示。
+
+    :param manager: ToolManager 或其子类 ToolManager2（tools、life_settings、current_counts）
+    :param name: 显示在换刀计划中的名称
+    """
+
+    def __init__(self, manager, name, window=RATE_EDGES, idle_gap=IDLE_GAP):
+        self.manager = manager
+        self.name = name
+        self.idle_gap = idle_gap
+        self.edges = 0
+        self.last_edge = None
+        self.intervals = deque(maxlen=window)
+        self.interval_sum = 0.0
+        self.expiry = {}  # tool_id -> expire_at
+        self.order = []  # [(expire_at, tool_id)]，按到期先后排序
+        self.version = 0  # 每个上升沿和 resync() 加1，界面据此判断预测是否变化
+        self.resync()
+
+    def edge(self, timestamp=None):
+        """计数信号上升沿，在刀具计数加1之前调用"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self.edges += 1
+        self.version += 1
+        if self.last_edge is not None:
+            interval = timestamp - self.last_edge
+            if 0 < interval <= self.idle_gap:
+                if len(self.intervals) == self.intervals.maxlen:
+                    self.interval_sum -= self.intervals[0]
+                self.intervals.append(interval)
+                self.interval_sum += interval
+        self.last_edge = timestamp
+
+    @property
+    def rate(self):
+        """生产速率（件/小时），计数间隔不足时为None"""
+        if not self.intervals or self.interval_sum <= 0:
+            return None
+        return len(self.intervals) * 3600.0 / self.interval_sum
+
+    def resync(self, tool_id=None):
+        """寿命设定或当前计数被修改后重新计算到期序号，不指定刀具时全部重算"""
+        manager = self.manager
+        self.version += 1
+        for tool in ([tool_id] if tool_id is not None else manager.tools):
+            old = self.expiry.pop(tool, None)
+            if old is not None:
+                del self.order[bisect_left(self.order, (old, tool))]
+            life = manager.life_settings[tool]
+            if life > 0:
+                expire_at = self.edges + max(0, life - manager.current_counts[tool])
+                self.expiry[tool] = expire_at
+                insort(self.order, (expire_at, tool))
+
+    def remaining(self, tool_id):
+        """剩余件数，不计数的刀具为None"""
+        expire_at = self.expiry.get(tool_id)
+        return None if expire_at is None else max(0, expire_at - self.edges)
+
+    def hours_left(self, tool_id):
+        """预计剩余生产时间（小时），不计数或速率未知时为None"""
+        remaining = self.remaining(tool_id)
+        rate = self.rate
+        if remaining is None or rate is None:
+            return None
+        return remaining / rate
+
+    def upcoming(self):
+        """
+        按到期先后依次产生 (剩余小时, 剩余件数, 名称, 刀具)，惰性计算，只处理实际读取的行
+        速率未知时剩余小时为 inf，排在其他管理器的刀具之后
+        """
+        rate = self.rate
+        for expire_at, tool_id in self.order:
+            remaining = max(0, expire_at - self.edges)
+            hours = remaining / rate if rate else (0.0 if remaining == 0 else math.inf)
+            yield hours, remaining, self.name, tool_id
+
+
+def next_changes(forecasts, limit):
+    """
+    合并多个管理器的到期顺序，返回最早到期的 limit 把刀具
+    每个管理器内部已经有序，合并只需读取前 limit 项
+    """
+    return list(islice(heapq.merge(*(forecast.upcoming() for forecast in forecasts)), limit))
+
+
+class ToolChangePlanTab(QWidget):
+    """换刀计划：所有刀具管理器中最早到期的刀具，提示可以一起更换的刀具"""
+
+    COLUMNS = ["刀具管理", "刀具", "剩余件数", "生产速率(件/时)", "预计剩余时间", "预计换刀时刻"]
+
+    def __init__(self, forecasts, parent=None):
+        super().__init__(parent)
+        self.forecasts = forecasts
+        self.init_ui()
+        self.refresh()
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(REFRESH_INTERVAL)
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        title = QLabel("换刀计划")
+        title.setStyleSheet("font-size: 20px; font-weight: bold; color: #2c3e50;")
+        title.setAlignment(Qt.AlignCenter)
+        layout.addWidget(title)
+
+        options = QHBoxLayout()
+        options.addWidget(QLabel("显示数量:"))
+        self.rows_spin = QSpinBox()
+        self.rows_spin.setRange(1, sum(len(forecast.manager.tools) for forecast in self.forecasts))
+        self.rows_spin.setValue(PLAN_ROWS)
+        self.rows_spin.valueChanged.connect(self.refresh)
+        options.addWidget(self.rows_spin)
+        options.addSpacing(20)
+        options.addWidget(QLabel("合并换刀窗口:"))
+        self.batch_spin = QSpinBox()
+        self.batch_spin.setRange(0, 24 * 60)
+        self.batch_spin.setSuffix(" 分钟")
+        self.batch_spin.setValue(BATCH_MINUTES)
+        self.batch_spin.valueChanged.connect(self.refresh)
+        options.addWidget(self.batch_spin)
+        options.addStretch()
+        self.batch_label = QLabel()
+        self.batch_label.setStyleSheet("font-weight: bold; color: #c0392b;")
+        options.addWidget(self.batch_label)
+        layout.addLayout(options)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionMode(QAbstractItemView.NoSelection)
+        self.table.setAlternatingRowColors(True)
+        layout.addWidget(self.table)
+
+        hint = QLabel("剩余时间按最近的生产速率估算，不含停机时间；速率未知（开机后不足两个计数）的刀具按剩余件数排在最后。")
+        hint.setWordWrap(True)
+        hint.setStyleSheet("color: #7f8c8d;")
+        layout.addWidget(hint)
+
+        self.setLayout(layout)
+
+    def refresh(self):
+        if not self.isVisible() and self.table.rowCount():
+            return
+        rows = next_changes(self.forecasts, self.rows_spin.value())
+        self.table.setRowCount(len(rows))
+        rates = {forecast.name: forecast.rate for forecast in self.forecasts}
+        now = datetime.now()
+        # 与最早到期的刀具相差不超过合并窗口的刀具建议一起更换
+        batch_limit = rows[0][0] + self.batch_spin.value() / 60.0 if rows else 0.0
+        batch = 0
+        for row, (hours, remaining, name, tool_id) in enumerate(rows):
+            rate = rates[name]
+            known = not math.isinf(hours)
+            in_batch = known and hours <= batch_limit
+            batch += in_batch
+            values = [
+                name, tool_id, str(remaining),
+                f"{rate:.1f}" if rate else "—",
+                "已到期" if remaining == 0 else format_duration(hours),
+                (now + timedelta(hours=hours)).strftime("%m-%d %H:%M") if known and remaining else "—",
+            ]
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    item.setTextAlignment(Qt.AlignCenter)
+                    self.table.setItem(row, column, item)
+                item.setText(value)
+                item.setBackground(QColor(255, 200, 200) if remaining == 0
+                                   else QColor(255, 255, 200) if in_batch else QBrush())
+        self.batch_label.setText(f"建议一起更换: {batch} 把" if batch else "")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
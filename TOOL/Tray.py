@@ -3,7 +3,7 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QGroupBox, QGridLayout, QLabel,
     QLineEdit, QPushButton, QMessageBox, QPlainTextEdit
 )
-from PySide6.QtCore import Signal, Slot, QDateTime
+from PySide6.QtCore import QObject, Signal, Slot, QDateTime
 from PySide6.QtGui import QTextCursor
 
 
@@ -57,23 +57,65 @@ class Tray:
         return False
 
 
+class TrayManager(QObject):
+    """料盘计数逻辑，独立于界面，标签页未创建时也能计数"""
+    tray_full = Signal(str)  # 信号用于通知哪个料盘已满
+
+    STATE_FIELDS = ("current_count", "max_count", "active", "last_signal", "full")
+
+    def __init__(self, parent=None, journal=None):
+        super().__init__(parent)
+        # 创建两个料盘（默认禁用）
+        self.tray1 = Tray("料盘1", "V750.0")
+        self.tray2 = Tray("料盘2", "V750.0")
+        self.journal = journal  # 状态日志，料盘计数和设定重启后恢复
+        self.restore_state()
+
+    def restore_state(self):
+        """从状态日志恢复两个料盘的计数、设定和信号状态"""
+        if not self.journal:
+            return
+        for tray in (self.tray1, self.tray2):
+            for field in self.STATE_FIELDS:
+                setattr(tray, field, self.journal.get(f"{tray.name}.{field}", getattr(tray, field)))
+
+    def persist(self):
+        """把料盘状态交给状态日志，只有变化的值会写入；料盘设置或重置后也要调用"""
+        if not self.journal:
+            return
+        self.journal.update({f"{tray.name}.{field}": getattr(tray, field)
+                             for tray in (self.tray1, self.tray2) for field in self.STATE_FIELDS})
+
+    def process_signal(self, signal_value):
+        # 只有active的料盘才会处理信号
+        full = []
+        for tray in (self.tray1, self.tray2):
+            if tray.active:
+                if tray.process_signal(signal_value):
+                    full.append(tray.name)
+        # 先保存状态再通知，料盘已满的弹窗期间退出也不会丢失
+        self.persist()
+        for name in full:
+            self.tray_full.emit(name)
+
+
 class TrayManagementTab(QWidget):
-    tray_full_signal = Signal(str)  # 信号用于通知哪个料盘已满
     plc_signal_request = Signal(bool)  # 新增：PLC信号请求信号
     reset_signal_request = Signal()  # 新增：复位信号请求信号
 
-    def __init__(self, main_window=None, parent=None):
+    def __init__(self, tray_manager, main_window=None, parent=None):
         super().__init__(parent)
         self.main_window = main_window  # 保存主窗口引用
-        # 创建两个料盘（默认禁用）
-        self.tray1 = Tray("料盘1", "V750.0")
-        self.tray2 = Tray("料盘2", "V750.0")
+        self.tray_manager = tray_manager
+        self.tray1 = tray_manager.tray1
+        self.tray2 = tray_manager.tray2
         # 连接PLC信号请求
 
         self.plc_signal_request.connect(self.send_plc_signal)
         self.reset_signal_request.connect(self.reset_plc_signal)
 
         self.init_ui()
+        self.init_tray_labels()
 
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -149,8 +191,17 @@ class TrayManagementTab(QWidget):
 
         layout.addStretch()
 
-        # 连接料盘满信号
-        self.tray_full_signal.connect(self.handle_tray_full)
+    def init_tray_labels(self):
+        """根据料盘当前状态初始化显示（标签页可能在计数开始后才创建）"""
+        for tray, max_input, status_label, count_label in (
+                (self.tray1, self.tray1_max_input, self.tray1_status_label, self.tray1_count_label),
+                (self.tray2, self.tray2_max_input, self.tray2_status_label, self.tray2_count_label)):
+            max_input.setText(str(tray.max_count))
+            count_label.setText(f"当前计数: {tray.current_count}")
+            if tray.active:
+                status_label.setText(f"状态: 计数中 ({tray.current_count}/{tray.max_count})")
+            elif tray.max_count > 0 and tray.current_count >= tray.max_count:
+                status_label.setText("状态: 已满")
 
     def append_status_message(self, message):
         """添加新的状态消息（不覆盖原有内容）"""
@@ -169,6 +220,7 @@ class TrayManagementTab(QWidget):
 
     def set_tray1_max(self):
         if self.tray1.set_max_count(self.tray1_max_input.text()):
+            self.tray_manager.persist()
             # 发送PLC复位信号
             self.plc_signal_request.emit(False)
             # 更新状态显示
@@ -186,6 +238,7 @@ class TrayManagementTab(QWidget):
 
     def set_tray2_max(self):
         if self.tray2.set_max_count(self.tray2_max_input.text()):
+            self.tray_manager.persist()
             # 发送PLC复位信号
             self.plc_signal_request.emit(False)
             # 更新状态显示
@@ -203,6 +256,7 @@ class TrayManagementTab(QWidget):
 
     def reset_tray1(self):
         self.tray1.reset()
+        self.tray_manager.persist()
         self.tray1_count_label.setText(f"当前计数: {self.tray1.current_count}")
 
         # 重置后更新状态
@@ -213,6 +267,7 @@ class TrayManagementTab(QWidget):
 
     def reset_tray2(self):
         self.tray2.reset()
+        self.tray_manager.persist()
         self.tray2_count_label.setText(f"当前计数: {self.tray2.current_count}")
 
         # 重置后更新状态
@@ -242,21 +297,20 @@ class TrayManagementTab(QWidget):
         else:
             self.tray2_status_label.setText("状态: 已满")
 
-    def process_signal(self, signal_value):
-        # 处理料盘1信号 - 只有active的料盘才会处理信号
+    def update_counts(self):
+        """刷新计数显示，由主窗口在料盘管理器处理信号后调用"""
+        self.tray1_count_label.setText(f"当前计数: {self.tray1.current_count}")
         if self.tray1.active:
-            if self.tray1.process_signal(signal_value):
-                self.tray_full_signal.emit(self.tray1.name)
-            self.tray1_count_label.setText(f"当前计数: {self.tray1.current_count}")
             self.tray1_status_label.setText(f"状态: 计数中 ({self.tray1.current_count}/{self.tray1.max_count})")
 
-        # 处理料盘2信号 - 只有active的料盘才会处理信号
+        self.tray2_count_label.setText(f"当前计数: {self.tray2.current_count}")
         if self.tray2.active:
-            if self.tray2.process_signal(signal_value):
-                self.tray_full_signal.emit(self.tray2.name)
-            self.tray2_count_label.setText(f"当前计数: {self.tray2.current_count}")
             self.tray2_status_label.setText(f"状态: 计数中 ({self.tray2.current_count}/{self.tray2.max_count})")
 
+    def process_signal(self, signal_value):
+        self.tray_manager.process_signal(signal_value)
+        self.update_counts()
+
     @Slot()
     def on_msg_box_clicked(self, button):
         """当用户点击消息框按钮时调用"""
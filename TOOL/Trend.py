@@ -0,0 +1,301 @@
+# trend.py
+import threading
+import time
+
+import numpy as np
+from PySide6.QtWidgets import (QWidget, QHBoxLayout, QVBoxLayout, QListWidget, QListWidgetItem,
+                               QPushButton, QLabel)
+from PySide6.QtCore import Qt, QTimer, QPointF, QRectF
+from PySide6.QtGui import QPainter, QColor, QPen, QPolygonF, QFont
+
+# 环形缓冲区容量：100Hz轮询时约10.9分钟
+TREND_CAPACITY = 65536
+# 默认显示最近60秒
+DEFAULT_SPAN = 60.0
+# 刷新间隔（毫秒），只在趋势页可见时刷新
+REPAINT_INTERVAL = 50
+
+TREND_COLORS = ["#e74c3c", "#3498db", "#27ae60", "#f39c12", "#8e44ad", "#16a085",
+                "#d35400", "#2c3e50", "#c0392b", "#2980b9"]
+
+
+class TrendBuffer:
+    """
+    固定大小的环形缓冲区，每个标签一列，所有标签共用时间轴。
+    由PLCWorker线程写入，界面线程只读取可见时间范围内的数据。
+    """
+
+    def __init__(self, tags, capacity=TREND_CAPACITY):
+        self.tags = list(tags)
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.tags)), dtype=np.float32)
+        self.write_index = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, row):
+        """写入一帧数据，O(标签数)，不移动历史数据"""
+        with self.lock:
+            index = self.write_index
+            self.times[index] = timestamp
+            self.values[index] = row
+            self.write_index = (index + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def time_range(self):
+        """返回缓冲区中最早和最新的时间戳"""
+        with self.lock:
+            if self.count == 0:
+                return None
+            oldest = (self.write_index - self.count) % self.capacity
+            return self.times[oldest], self.times[self.write_index - 1]
+
+    def window(self, column, t0, t1):
+        """
+        取出时间在[t0, t1]内的一列数据（按时间顺序）。
+        环形缓冲区在物理上是两段有序数组，分别二分查找，只复制需要的部分。
+        """
+        with self.lock:
+            if self.count == 0:
+                return np.empty(0), np.empty(0, dtype=np.float32)
+            end = self.write_index
+            if self.count < self.capacity:
+                segments = [(0, end)]
+            else:
+                segments = [(end, self.capacity), (0, end)]
+
+            times, values = [], []
+            for start, stop in segments:
+                seg_times = self.times[start:stop]
+                lo = start + np.searchsorted(seg_times, t0, side="left")
+                hi = start + np.searchsorted(seg_times, t1, side="right")
+                if hi > lo:
+                    times.append(self.times[lo:hi].copy())
+                    values.append(self.values[lo:hi, column].copy())
+
+        if not times:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        if len(times) == 1:
+            return times[0], values[0]
+        return np.concatenate(times), np.concatenate(values)
+
+
+def minmax_decimate(times, values, t0, t1, width):
+    """
+    按像素列做最小/最大值抽取，绘制开销只与屏幕宽度有关。
+    :return: (像素x, 每列最小值, 每列最大值)
+    """
+    if len(times) == 0 or width <= 0 or t1 <= t0:
+        empty = np.empty(0)
+        return empty, empty, empty
+
+    columns = ((times - t0) * (width / (t1 - t0))).astype(np.int64)
+    np.clip(columns, 0, width - 1, out=columns)
+
+    # 时间有序，所以列号单调不减，取每列的起始位置做reduceat
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ymin = np.minimum.reduceat(values, starts)
+    ymax = np.maximum.reduceat(values, starts)
+    return columns[starts], ymin, ymax
+
+
+class TrendChart(QWidget):
+    """趋势图：多个标签叠加显示，滚轮缩放、拖动平移，双击恢复实时跟随"""
+
+    MARGIN_LEFT = 70
+    MARGIN_RIGHT = 40
+    MARGIN_TOP = 10
+    MARGIN_BOTTOM = 30
+
+    def __init__(self, trend_buffer, parent=None):
+        super().__init__(parent)
+        self.buffer = trend_buffer
+        self.columns = []  # 叠加显示的标签列号
+        self.span = DEFAULT_SPAN
+        self.end_time = None  # None表示跟随最新数据
+        self.drag_x = None
+        self.setMinimumHeight(300)
+
+        self.axis_pen = QPen(QColor("#7f8c8d"))
+        self.grid_pen = QPen(QColor("#ecf0f1"))
+        self.pens = [QPen(QColor(color), 1) for color in TREND_COLORS]
+        self.small_font = QFont("Arial", 9)
+
+        self.repaint_timer = QTimer(self)
+        self.repaint_timer.timeout.connect(self.update)
+
+    def set_columns(self, columns):
+        self.columns = list(columns)
+        self.update()
+
+    def follow_live(self):
+        self.end_time = None
+        self.span = DEFAULT_SPAN
+        self.update()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.repaint_timer.start(REPAINT_INTERVAL)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.repaint_timer.stop()
+
+    def plot_rect(self):
+        return QRectF(self.MARGIN_LEFT, self.MARGIN_TOP,
+                      max(1, self.width() - self.MARGIN_LEFT - self.MARGIN_RIGHT),
+                      max(1, self.height() - self.MARGIN_TOP - self.MARGIN_BOTTOM))
+
+    def visible_range(self):
+        """当前显示的时间范围"""
+        latest = self.buffer.time_range()
+        end = self.end_time
+        if end is None:
+            end = latest[1] if latest else time.time()
+        return end - self.span, end
+
+    def wheelEvent(self, event):
+        # 以鼠标位置为中心缩放时间轴
+        t0, t1 = self.visible_range()
+        rect = self.plot_rect()
+        ratio = min(max((event.position().x() - rect.left()) / rect.width(), 0.0), 1.0)
+        anchor = t0 + ratio * (t1 - t0)
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        latest = self.buffer.time_range()
+        max_span = max(latest[1] - latest[0], DEFAULT_SPAN) if latest else DEFAULT_SPAN
+        self.span = min(max(self.span * factor, 0.5), max_span)
+        new_end = anchor + (1 - ratio) * self.span
+        if self.end_time is None and latest and new_end >= latest[1]:
+            self.end_time = None
+        else:
+            self.end_time = new_end
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_x = event.position().x()
+
+    def mouseMoveEvent(self, event):
+        if self.drag_x is None:
+            return
+        t0, t1 = self.visible_range()
+        dx = event.position().x() - self.drag_x
+        self.drag_x = event.position().x()
+        self.end_time = t1 - dx * self.span / self.plot_rect().width()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_x = None
+        # 拖到最新数据之后则恢复实时跟随
+        latest = self.buffer.time_range()
+        if self.end_time is not None and latest and self.end_time >= latest[1]:
+            self.end_time = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.follow_live()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("white"))
+        rect = self.plot_rect()
+        width = int(rect.width())
+        t0, t1 = self.visible_range()
+
+        # 先抽取每个标签的数据，确定纵轴范围
+        series = []
+        for column in self.columns:
+            times, values = self.buffer.window(column, t0, t1)
+            series.append((column, minmax_decimate(times, values, t0, t1, width)))
+        lows = [ymin.min() for _, (_, ymin, _) in series if len(ymin)]
+        highs = [ymax.max() for _, (_, _, ymax) in series if len(ymax)]
+        y_low = float(min(lows)) if lows else 0.0
+        y_high = float(max(highs)) if highs else 1.0
+        if y_high - y_low < 1e-6:
+            y_low, y_high = y_low - 0.5, y_high + 0.5
+        pad = (y_high - y_low) * 0.05
+        y_low, y_high = y_low - pad, y_high + pad
+        y_scale = rect.height() / (y_high - y_low)
+
+        # 网格和刻度
+        painter.setFont(self.small_font)
+        for i in range(6):
+            y = rect.top() + rect.height() * i / 5
+            painter.setPen(self.grid_pen)
+            painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+            painter.setPen(self.axis_pen)
+            value = y_high - (y_high - y_low) * i / 5
+            painter.drawText(QRectF(0, y - 8, self.MARGIN_LEFT - 5, 16),
+                             Qt.AlignRight | Qt.AlignVCenter, f"{value:.3g}")
+        for i in range(5):
+            x = rect.left() + rect.width() * i / 4
+            painter.setPen(self.grid_pen)
+            painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
+            painter.setPen(self.axis_pen)
+            label = time.strftime("%H:%M:%S", time.localtime(t0 + (t1 - t0) * i / 4))
+            painter.drawText(QRectF(x - 40, rect.bottom() + 5, 80, 16), Qt.AlignCenter, label)
+        painter.drawRect(rect)
+
+        # 曲线：每个像素列画一条最小值到最大值的竖线并首尾相连
+        # 折线点很密，使用非抗锯齿的1像素画笔，绘制开销与宽度成正比
+        painter.setClipRect(rect)
+        for index, (column, (px, ymin, ymax)) in enumerate(series):
+            if len(px) == 0:
+                continue
+            xs = rect.left() + px
+            top = rect.bottom() - (ymax - y_low) * y_scale
+            bottom = rect.bottom() - (ymin - y_low) * y_scale
+            points = np.empty((len(px) * 2, 2))
+            points[0::2, 0] = xs
+            points[1::2, 0] = xs
+            points[0::2, 1] = bottom
+            points[1::2, 1] = top
+            painter.setPen(self.pens[index % len(self.pens)])
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in points.tolist()]))
+        painter.setClipping(False)
+
+        # 图例
+        for index, column in enumerate(self.columns):
+            painter.setPen(self.pens[index % len(self.pens)])
+            painter.drawText(QPointF(rect.left() + 8, rect.top() + 16 + index * 14),
+                             self.buffer.tags[column])
+
+
+class TrendView(QWidget):
+    """机器人数据趋势页：左侧勾选标签，右侧叠加显示"""
+
+    def __init__(self, trend_buffer, parent=None):
+        super().__init__(parent)
+        self.buffer = trend_buffer
+
+        layout = QHBoxLayout(self)
+
+        left_layout = QVBoxLayout()
+        left_layout.addWidget(QLabel("选择数据（可多选叠加）:"))
+        self.tag_list = QListWidget()
+        self.tag_list.setFixedWidth(200)
+        for tag in trend_buffer.tags:
+            item = QListWidgetItem(tag)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            self.tag_list.addItem(item)
+        self.tag_list.item(0).setCheckState(Qt.Checked)
+        self.tag_list.itemChanged.connect(self.update_selection)
+        left_layout.addWidget(self.tag_list)
+
+        live_btn = QPushButton("实时跟随")
+        left_layout.addWidget(live_btn)
+        left_layout.addWidget(QLabel("滚轮缩放，拖动平移\n双击恢复实时"))
+        layout.addLayout(left_layout)
+
+        self.chart = TrendChart(trend_buffer)
+        live_btn.clicked.connect(self.chart.follow_live)
+        layout.addWidget(self.chart, 1)
+
+        self.update_selection()
+
+    def update_selection(self, *args):
+        columns = [row for row in range(self.tag_list.count())
+                   if self.tag_list.item(row).checkState() == Qt.Checked]
+        self.chart.set_columns(columns)
@@ -0,0 +1,171 @@
+# watchdog.py
+import logging
+import os
+import sys
+import threading
+import time
+
+from PySide6.QtCore import QObject, QTimer, Qt
+from PySide6.QtWidgets import QDialog, QVBoxLayout, QPlainTextEdit, QPushButton, QHBoxLayout, QLabel
+from PySide6.QtGui import QFont
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 10  # 界面线程心跳定时器间隔（毫秒）
+STALL_THRESHOLD = 0.1  # 超过该时长未响应记为一次卡顿（秒）
+SAMPLE_INTERVAL = 0.02  # 辅助线程检查/采样间隔（秒）
+STACK_DEPTH = 8  # 每个调用栈保留的最内层帧数
+
+
+class LagWatchdog(QObject):
+    """
+    界面事件循环卡顿监测。
+    界面线程用高频定时器更新心跳并统计事件循环延迟；
+    辅助线程发现心跳超时后，通过 sys._current_frames() 采样界面线程的Python调用栈，
+    按调用路径累计卡顿时间，生成排行报告。
+    """
+
+    def __init__(self, threshold=STALL_THRESHOLD, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.gui_thread_id = threading.get_ident()
+        self.lock = threading.Lock()
+
+        self.last_beat = time.perf_counter()
+        self.max_latency = 0.0  # 定时器实际触发与预期之间的最大延迟（秒）
+        self.latency_total = 0.0
+        self.beat_count = 0
+
+        self.stall_count = 0
+        self.stall_time = 0.0
+        self.longest_stall = 0.0
+        self.path_stats = {}  # 调用路径 -> [累计采样时间, 卡顿次数, 最长卡顿]
+        self._stall_samples = []  # 当前卡顿期间采样到的调用路径
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.heartbeat)
+
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self.last_beat = time.perf_counter()
+        self.timer.start(HEARTBEAT_INTERVAL)
+        self._running = True
+        self._thread = threading.Thread(target=self._monitor, name="LagWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self.timer.stop()
+        if self._thread:
+            self._thread.join(1)
+
+    def heartbeat(self):
+        now = time.perf_counter()
+        with self.lock:
+            latency = max(0.0, now - self.last_beat - HEARTBEAT_INTERVAL / 1000)
+            self.latency_total += latency
+            self.beat_count += 1
+            if latency > self.max_latency:
+                self.max_latency = latency
+            self.last_beat = now
+            samples = self._stall_samples
+            self._stall_samples = []
+
+        if latency >= self.threshold:
+            self._record_stall(latency, samples)
+
+    def _monitor(self):
+        """辅助线程：心跳超时期间采样界面线程调用栈"""
+        while self._running:
+            time.sleep(SAMPLE_INTERVAL)
+            with self.lock:
+                stalled = time.perf_counter() - self.last_beat > self.threshold
+            if not stalled:
+                continue
+            frame = sys._current_frames().get(self.gui_thread_id)
+            if frame is None:
+                continue
+            path = self._stack_key(frame)
+            del frame
+            with self.lock:
+                self._stall_samples.append(path)
+
+    @staticmethod
+    def _stack_key(frame):
+        """取最内层若干帧作为调用路径"""
+        entries = []
+        while frame is not None and len(entries) < STACK_DEPTH:
+            code = frame.f_code
+            entries.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+            frame = frame.f_back
+        return tuple(entries)
+
+    def _record_stall(self, duration, samples):
+        with self.lock:
+            self.stall_count += 1
+            self.stall_time += duration
+            self.longest_stall = max(self.longest_stall, duration)
+            if not samples:
+                # 卡顿短于采样间隔或卡在C++代码中，没有采到Python调用栈
+                samples = [("<未采样到Python调用栈>",)]
+            weight = duration / len(samples)
+            for path in set(samples):
+                stats = self.path_stats.setdefault(path, [0.0, 0, 0.0])
+                stats[1] += 1
+                stats[2] = max(stats[2], duration)
+            for path in samples:
+                self.path_stats[path][0] += weight
+            top = max(set(samples), key=samples.count)
+        logger.warning("界面卡顿 %.0f ms，位置: %s", duration * 1000, top[0])
+
+    def report(self, top=10):
+        """按累计卡顿时间排序的调用路径报告"""
+        with self.lock:
+            ranked = sorted(self.path_stats.items(), key=lambda item: item[1][0], reverse=True)[:top]
+            average = self.latency_total / self.beat_count if self.beat_count else 0.0
+            lines = [
+                f"事件循环平均延迟: {average * 1000:.1f} ms，最大延迟: {self.max_latency * 1000:.0f} ms",
+                f"卡顿次数(>{self.threshold * 1000:.0f} ms): {self.stall_count}，"
+                f"累计: {self.stall_time:.2f} 秒，最长: {self.longest_stall * 1000:.0f} ms",
+                "",
+            ]
+            for rank, (path, (total, count, longest)) in enumerate(ranked, 1):
+                lines.append(f"#{rank} 累计 {total * 1000:.0f} ms，{count} 次，最长 {longest * 1000:.0f} ms")
+                lines.extend(f"    {entry}" for entry in path)
+                lines.append("")
+        return "\n".join(lines)
+
+
+class LagReportDialog(QDialog):
+    """显示界面卡顿排行报告"""
+
+    def __init__(self, watchdog, parent=None, sections=()):
+        super().__init__(parent)
+        self.watchdog = watchdog
+        self.sections = list(sections)  # 附加在报告前面的其他耗时统计（返回文本的函数）
+        self.setWindowTitle("界面卡顿报告")
+        self.setMinimumSize(700, 500)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("按累计卡顿时间排序的界面线程调用路径（最内层在上）:"))
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("Courier New", 10))
+        layout.addWidget(self.text)
+
+        btn_layout = QHBoxLayout()
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.refresh)
+        btn_layout.addStretch()
+        btn_layout.addWidget(refresh_btn)
+        layout.addLayout(btn_layout)
+
+        self.refresh()
+
+    def refresh(self):
+        extra = "".join(f"{section()}\n\n" for section in self.sections)
+        self.text.setPlainText(extra + self.watchdog.report())
@@ -1,18 +1,35 @@
+import logging
+import os
 import sqlite3
 import threading
+import queue
+import time
 from datetime import datetime, timedelta
 
 from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
     QPushButton, QLineEdit, QLabel, QDateEdit,
-    QTableWidget, QTableWidgetItem, QMessageBox, QHeaderView, QComboBox, QGroupBox
+    QTableView, QMessageBox, QHeaderView, QComboBox, QGroupBox, QAbstractItemView
 )
 from PySide6.QtCore import Qt, QDate
 
+from TOOL.Analytics import AlarmAnalytics, AlarmAnalyticsDialog
+from TOOL.Export import export_model
+from TOOL.Paging import PagedTableModel
+from TOOL.Replay import launch_replay
+from TOOL.Storage import open_database
+
+logger = logging.getLogger(__name__)
+
 DB_NAME = "robot_alarms.db"
 PASSWORD = "hljd1234"
 
+FLUSH_INTERVAL = 0.2  # 写线程最多攒批的时间（秒）
+FLUSH_BATCH = 100  # 写线程每批最多写入的事件数
+# 查询前等待写队列落盘的最长时间（秒），超时则查询可能缺少最近约一个攒批周期的事件，界面不被写线程卡住
+FLUSH_WAIT = 0.3
+
 ALARM_FIELDS = [
     "急停状态",
     "碰撞检测",
@@ -20,100 +37,330 @@ ALARM_FIELDS = [
     "安全停止信号SIO",
     "安全停止信号SII",
     "主故障码",
-    "子故障码"
+    "子故障码",
+    "关节信号异常",  # 由 Anomaly.AnomalyDetector 检测，不是PLC信号
 ]
 
+# 上升沿触发黑匣子捕获的报警，转储文件路径记录在报警记录的 blackbox 列
+BLACKBOX_ALARMS = ("碰撞检测", "急停状态")
+
+
+def _migrate_v1(connection):
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS alarm_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alarm_name TEXT NOT NULL,
+            alarm_value INTEGER,
+            start_time TEXT,
+            end_time TEXT
+        )
+    """)
+    # 报警恢复时按 alarm_name + end_time IS NULL 查找，历史查询按 start_time 范围过滤
+    connection.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alarm_history_name_end
+        ON alarm_history (alarm_name, end_time)
+    """)
+    connection.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alarm_history_start
+        ON alarm_history (start_time)
+    """)
+
+
+def _migrate_v2(connection):
+    # 按报警类型筛选并按出现时间排序/分页的历史查询
+    connection.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alarm_history_name_start
+        ON alarm_history (alarm_name, start_time)
+    """)
+
+
+# 报警持续时间（秒），未恢复时为NULL
+_DURATION = "MAX(0, (julianday({row}.end_time) - julianday({row}.start_time)) * 86400)"
+
+
+def _migrate_v3(connection):
+    # 报警统计汇总：每个报警类型每小时（按出现时间的小时 YYYY-MM-DDTHH）一行，
+    # 由触发器在报警发生/恢复时增量维护，统计查询不需要扫描 alarm_history。
+    # 保留任务删除过期的报警明细时不修改汇总，汇总可以保存更长时间。
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS alarm_summary (
+            hour TEXT NOT NULL,
+            alarm_name TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            closed INTEGER NOT NULL DEFAULT 0,
+            total_duration REAL NOT NULL DEFAULT 0,
+            max_duration REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, alarm_name)
+        ) WITHOUT ROWID
+    """)
+    duration = _DURATION.format(row="NEW")
+    connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_alarm_summary_insert
+        AFTER INSERT ON alarm_history
+        WHEN NEW.start_time IS NOT NULL
+        BEGIN
+            INSERT INTO alarm_summary (hour, alarm_name, count, closed, total_duration, max_duration)
+            VALUES (substr(NEW.start_time, 1, 13), NEW.alarm_name, 1, NEW.end_time IS NOT NULL,
+                    IFNULL({duration}, 0), IFNULL({duration}, 0))
+            ON CONFLICT (hour, alarm_name) DO UPDATE SET
+                count = count + 1,
+                closed = closed + excluded.closed,
+                total_duration = total_duration + excluded.total_duration,
+                max_duration = MAX(max_duration, excluded.max_duration);
+        END
+    """)
+    connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_alarm_summary_close
+        AFTER UPDATE OF end_time ON alarm_history
+        WHEN OLD.end_time IS NULL AND NEW.end_time IS NOT NULL AND NEW.start_time IS NOT NULL
+        BEGIN
+            INSERT INTO alarm_summary (hour, alarm_name, count, closed, total_duration, max_duration)
+            VALUES (substr(NEW.start_time, 1, 13), NEW.alarm_name, 0, 1, {duration}, {duration})
+            ON CONFLICT (hour, alarm_name) DO UPDATE SET
+                closed = closed + 1,
+                total_duration = total_duration + excluded.total_duration,
+                max_duration = MAX(max_duration, excluded.max_duration);
+        END
+    """)
+    # 已有的报警记录一次性汇总
+    connection.execute(f"""
+        INSERT OR REPLACE INTO alarm_summary (hour, alarm_name, count, closed, total_duration, max_duration)
+        SELECT substr(start_time, 1, 13), alarm_name, COUNT(*), COUNT(end_time),
+               IFNULL(SUM({_DURATION.format(row="alarm_history")}), 0),
+               IFNULL(MAX({_DURATION.format(row="alarm_history")}), 0)
+        FROM alarm_history
+        WHERE start_time IS NOT NULL
+        GROUP BY 1, 2
+    """)
+
+
+def _migrate_v4(connection):
+    # 黑匣子转储文件（录制文件路径），没有捕获时为NULL
+    connection.execute("ALTER TABLE alarm_history ADD COLUMN blackbox TEXT")
+
+
+# 按版本顺序排列的表结构迁移（PRAGMA user_version）
+ALARM_MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4]
+
 
 class AlarmLogger:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.connection = sqlite3.connect(DB_NAME, check_same_thread=False)
-        self.create_table()
+    """
+    报警记录器。界面线程只把状态变化放入队列，
+    由独立的写线程按批（FLUSH_INTERVAL 或 FLUSH_BATCH）在一个事务中写入数据库。
+    传入 blackbox 时，BLACKBOX_ALARMS 的上升沿触发黑匣子捕获，转储文件路径随报警记录写入。
+    """
+
+    def __init__(self, db_name=DB_NAME, blackbox=None):
+        self.db_name = db_name
+        self.blackbox = blackbox
+        # 每个线程使用自己的长连接，写线程和界面线程的查询互不阻塞
+        self.db = open_database(db_name, "history", ALARM_MIGRATIONS)
         self.last_states = {}
-        self.cleanup_old_records()
-
-    def create_table(self):
-        with self.connection:
-            self.connection.execute("""
-                CREATE TABLE IF NOT EXISTS alarm_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    alarm_name TEXT NOT NULL,
-                    alarm_value INTEGER,
-                    start_time TEXT,
-                    end_time TEXT
-                )
-            """)
+        # 过期记录由 RetentionJob 在后台分批删除，不在启动时清理
+
+        # 写队列和统计信息
+        self.queue = queue.Queue()
+        self.last_flush_latency = 0.0  # 最近一批从入队到提交的最长等待（秒）
+        self.max_flush_latency = 0.0
+        self.batches_written = 0
+        self.events_written = 0
+        self.writer = threading.Thread(target=self._writer_loop, name="AlarmWriter", daemon=True)
+        self.writer.start()
 
     def log_state_change(self, alarm_name, current_value):
         if alarm_name not in ALARM_FIELDS:
             return
-        with self.lock:
-            prev = self.last_states.get(alarm_name, 0)
-            if current_value != prev:
-                now = datetime.now().isoformat(timespec="seconds")
-                if current_value:
-                    # 报警发生
-                    self.connection.execute("""
-                        INSERT INTO alarm_history (alarm_name, alarm_value, start_time)
-                        VALUES (?, ?, ?)
-                    """, (alarm_name, 1, now))
-                else:
-                    # 报警恢复
-                    self.connection.execute("""
-                        UPDATE alarm_history
-                        SET end_time = ?
-                        WHERE alarm_name = ? AND end_time IS NULL
-                    """, (now, alarm_name))
-                self.connection.commit()
-            self.last_states[alarm_name] = current_value
+        prev = self.last_states.get(alarm_name, 0)
+        if current_value != prev:
+            now = datetime.now().isoformat(timespec="seconds")
+            blackbox_file = None
+            if current_value and not prev and self.blackbox is not None \
+                    and alarm_name in BLACKBOX_ALARMS:
+                blackbox_file = self.blackbox.trigger(alarm_name)
+            # 只入队，不在界面线程中写数据库
+            self.queue.put((time.perf_counter(), alarm_name, bool(current_value), now, blackbox_file))
+        self.last_states[alarm_name] = current_value
+
+    def _writer_loop(self):
+        """
+        写线程：攒批后在一个事务中写入
+        写入失败（如数据库被占用超时）的批次保留下来，下一轮放在新事件前面重试，保持发生顺序；
+        事件写入后才 task_done，flush() 不会把未写入的事件当作已落盘
+        """
+        connection = self.db.connection()
+        retry = []
+        while True:
+            if retry:
+                # 等一个攒批周期后连同新事件一起重试
+                batch = retry
+            else:
+                event = self.queue.get()
+                if event is None:
+                    self.queue.task_done()
+                    break
+                batch = [event]
+            limit = len(batch) + FLUSH_BATCH - (0 if retry else 1)
+            deadline = time.perf_counter() + FLUSH_INTERVAL
+            stop = False
+            while len(batch) < limit:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+
+            if self._write_batch(connection, batch):
+                retry = []
+            elif stop:
+                logger.error("报警记录写入失败，退出时丢弃 %d 条事件", len(batch))
+                retry = []
+            else:
+                retry = batch
+                continue
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                break
+
+    def _write_batch(self, connection, batch):
+        """在一个事务中写入一批事件，返回是否成功"""
+        try:
+            with connection:
+                for _, alarm_name, active, now, blackbox_file in batch:
+                    if active:
+                        # 报警发生
+                        connection.execute("""
+                            INSERT INTO alarm_history (alarm_name, alarm_value, start_time, blackbox)
+                            VALUES (?, ?, ?, ?)
+                        """, (alarm_name, 1, now, blackbox_file))
+                    else:
+                        # 报警恢复
+                        connection.execute("""
+                            UPDATE alarm_history
+                            SET end_time = ?
+                            WHERE alarm_name = ? AND end_time IS NULL
+                        """, (now, alarm_name))
+        except sqlite3.Error as e:
+            logger.error("报警记录写入错误（%d 条事件，下一轮重试）: %s", len(batch), e)
+            return False
+
+        latency = time.perf_counter() - batch[0][0]
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.batches_written += 1
+        self.events_written += len(batch)
+        return True
+
+    def flush(self, timeout=FLUSH_WAIT):
+        """
+        等待队列中的事件写入，最多等待 timeout 秒（None 表示一直等待）
+        :return: 是否已全部写入
+        """
+        if timeout is None:
+            self.queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.info("报警写队列未在 %.1f 秒内写完（%d 条），查询结果可能不含最新事件",
+                                timeout, self.queue.unfinished_tasks)
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self):
+        """写队列深度和提交延迟"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "batches_written": self.batches_written,
+            "events_written": self.events_written,
+        }
+
+    def history_filter(self, start_date=None, end_date=None, alarm_name=None):
+        """把日期范围和报警类型转换为 (WHERE条件, 参数)，条件可以使用 start_time 索引"""
+        # 构建查询条件和参数
+        conditions = []
+        params = []
+
+        # 添加日期范围条件
+        if start_date:
+            start_datetime = datetime.combine(start_date, datetime.min.time())
+            conditions.append("start_time >= ?")
+            params.append(start_datetime.isoformat(timespec="seconds"))
+        if end_date:
+            end_datetime = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+            conditions.append("start_time < ?")
+            params.append(end_datetime.isoformat(timespec="seconds"))
+
+        # 添加报警类型条件
+        if alarm_name and alarm_name != "所有类型":
+            conditions.append("alarm_name = ?")
+            params.append(alarm_name)
+
+        return " AND ".join(conditions), params
 
     def query_history(self, start_date=None, end_date=None, alarm_name=None):
         """查询历史报警记录，支持日期范围和报警类型过滤"""
-        with self.lock:
-            # 构建查询条件和参数
-            conditions = []
-            params = []
-
-            # 添加日期范围条件
-            if start_date:
-                start_datetime = datetime.combine(start_date, datetime.min.time())
-                conditions.append("start_time >= ?")
-                params.append(start_datetime.isoformat(timespec="seconds"))
-            if end_date:
-                end_datetime = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
-                conditions.append("start_time < ?")
-                params.append(end_datetime.isoformat(timespec="seconds"))
-
-            # 添加报警类型条件
-            if alarm_name and alarm_name != "所有类型":
-                conditions.append("alarm_name = ?")
-                params.append(alarm_name)
-
-            # 构建WHERE子句
-            where_clause = " AND ".join(conditions) if conditions else "1"
-
-            # 执行查询
-            query = f"""
-                SELECT alarm_name, alarm_value, start_time, end_time
-                FROM alarm_history
-                WHERE {where_clause}
-                ORDER BY start_time DESC
-            """
-            cursor = self.connection.execute(query, tuple(params))
-            return cursor.fetchall()
-
-    def cleanup_old_records(self):
-        six_months_ago = datetime.now() - timedelta(days=180)
-        cutoff = six_months_ago.isoformat(timespec="seconds")
-        with self.lock:
-            self.connection.execute("""
-                DELETE FROM alarm_history
-                WHERE start_time < ?
-            """, (cutoff,))
-            self.connection.commit()
+        # 先等待未写入的事件落盘（最多 FLUSH_WAIT 秒）
+        self.flush()
+        where_clause, params = self.history_filter(start_date, end_date, alarm_name)
+
+        # 执行查询
+        query = f"""
+            SELECT alarm_name, alarm_value, start_time, end_time
+            FROM alarm_history
+            WHERE {where_clause or "1"}
+            ORDER BY start_time DESC
+        """
+        return self.db.query(query, tuple(params))
 
     def close(self):
-        self.connection.close()
+        # 停止写线程，写完队列中剩余的事件
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        self.db.close()
+
+
+class AlarmHistoryModel(PagedTableModel):
+    """报警历史表格，状态列由报警值和恢复时间得出"""
+
+    def __init__(self, db, parent=None):
+        super().__init__(db, "alarm_history", [
+            ("报警项目", "alarm_name"),
+            ("状态", "alarm_value"),
+            ("出现时间", "start_time"),
+            ("恢复时间", "end_time"),
+            ("黑匣子", "blackbox"),
+        ], sort_column=2, nullable=("end_time", "blackbox"), parent=parent)
+
+    def display(self, row, column):
+        if column == 1:
+            alarm_value, end_time = row[1], row[3]
+            if alarm_value:
+                return "报警中" if end_time is None else "已恢复"
+            return "正常"
+        if column == 3 and row[3] is None:
+            return "未恢复"
+        if column == 4:
+            return os.path.basename(row[4]) if row[4] else ""
+        return super().display(row, column)
+
+    def background(self, row, column):
+        if column == 1:
+            # 报警浅红色背景，正常浅绿色背景
+            return QColor(255, 200, 200) if row[1] else QColor(200, 255, 200)
+        return None
 
 
 class AlarmHistoryDialog(QDialog):
@@ -166,13 +413,19 @@ class AlarmHistoryDialog(QDialog):
         filter_group.setLayout(filter_layout)
         self.layout.addWidget(filter_group)
 
-        # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["报警项目", "状态", "出现时间", "恢复时间"])
+        # 表格（分页加载，滚动到底部时加载下一页，点击表头由数据库排序）
+        self.model = AlarmHistoryModel(alarm_logger.db, self)
+        self.model.loaded.connect(self.update_stats_label)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSortIndicator(2, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setToolTip("双击带黑匣子文件的记录可回放报警前后的数据")
+        self.table.doubleClicked.connect(self.open_blackbox)
         self.layout.addWidget(self.table)
 
         # 按钮区
@@ -189,33 +442,83 @@ class AlarmHistoryDialog(QDialog):
         self.clear_button.clicked.connect(self.clear_filters)
         btn_layout.addWidget(self.clear_button)
 
+        self.analytics_button = QPushButton("统计分析")
+        self.analytics_button.clicked.connect(self.show_analytics)
+        btn_layout.addWidget(self.analytics_button)
+
+        self.export_button = QPushButton("导出")
+        self.export_button.clicked.connect(self.export_records)
+        btn_layout.addWidget(self.export_button)
+
         btn_layout.addStretch()
+
+        # 写队列状态
+        self.stats_label = QLabel()
+        btn_layout.addWidget(self.stats_label)
         self.layout.addLayout(btn_layout)
+        self.update_stats_label()
 
-    def load_records(self):
+    def authenticate(self):
         if not self.authenticated:
             # 验证密码
             password = self.pwd_input.text().strip()
             if password != PASSWORD:
                 QMessageBox.warning(self, "错误", "密码错误")
-                return
+                return False
             self.authenticated = True
             self.pwd_input.setEnabled(False)  # 验证通过后禁用密码输入
+        return True
+
+    def load_records(self):
+        if not self.authenticate():
+            return
 
         # 获取过滤条件
         start_date = self.start_date_edit.date().toPython()
         end_date = self.end_date_edit.date().toPython()
         alarm_name = self.alarm_combo.currentText()
 
-        # 查询记录
-        records = self.alarm_logger.query_history(
+        # 先等待未写入的事件落盘（最多 FLUSH_WAIT 秒，不卡住界面），再在后台线程查询首页
+        self.alarm_logger.flush()
+        self.model.set_filter(*self.alarm_logger.history_filter(
             start_date=start_date,
             end_date=end_date,
             alarm_name=alarm_name
-        )
+        ))
+        self.update_stats_label()
+
+    def update_stats_label(self, rows=None, elapsed=None):
+        stats = self.alarm_logger.stats()
+        text = (f"写入队列: {stats['queue_depth']} 条  "
+                f"最近提交延迟: {stats['last_flush_latency'] * 1000:.0f} ms")
+        if rows is not None:
+            text += f"  已加载: {rows} 条（本页 {elapsed:.0f} ms）"
+        self.stats_label.setText(text)
+
+    def show_analytics(self):
+        if not self.authenticate():
+            return
+        dialog = AlarmAnalyticsDialog(AlarmAnalytics(self.alarm_logger), ALARM_FIELDS, self)
+        dialog.exec()
 
-        # 显示记录
-        self.show_records(records)
+    def export_records(self):
+        """导出当前查询条件下的全部记录"""
+        if not self.authenticated:
+            QMessageBox.information(self, "提示", "请先输入密码并查询")
+            return
+        self.alarm_logger.flush()
+        export_model(self, self.model, "报警记录")
+
+    def open_blackbox(self, index):
+        """在新进程中回放报警记录关联的黑匣子文件"""
+        path = self.model.rows[index.row()][4]
+        if not path:
+            return
+        if not os.path.exists(path):
+            QMessageBox.information(self, "提示", f"黑匣子文件尚未保存或已被删除:\n{path}")
+            return
+        if not launch_replay(path):
+            QMessageBox.warning(self, "错误", f"无法启动回放:\n{path}")
 
     def refresh(self):
         if self.authenticated:
@@ -228,28 +531,3 @@ class AlarmHistoryDialog(QDialog):
         self.alarm_combo.setCurrentIndex(0)
         if self.authenticated:
             self.load_records()
-
-    def show_records(self, records):
-        self.table.setRowCount(0)
-        for row_data in records:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-
-            alarm_name, alarm_value, start_time, end_time = row_data
-
-            # 报警项目
-            self.table.setItem(row, 0, QTableWidgetItem(alarm_name))
-
-            # 状态 (根据报警值显示)
-            status_item = QTableWidgetItem()
-            if alarm_value:
-                status_item.setText("报警中" if end_time is None else "已恢复")
-                status_item.setBackground(QColor(255, 200, 200))  # 浅红色背景
-            else:
-                status_item.setText("正常")
-                status_item.setBackground(QColor(200, 255, 200))  # 浅绿色背景
-            self.table.setItem(row, 1, status_item)
-
-            # 时间
-            self.table.setItem(row, 2, QTableWidgetItem(start_time or ""))
-            self.table.setItem(row, 3, QTableWidgetItem(end_time or "未恢复"))
\ No newline at end of file
@@ -1,38 +1,65 @@
 import os
 import sys
+import argparse
 import snap7
 import time
-import struct
+import logging
 from PySide6.QtWidgets import (QApplication, QMainWindow, QTableWidget, QTableWidgetItem,
                                QPushButton, QStatusBar, QVBoxLayout, QWidget, QHeaderView,
                                QTabWidget, QLabel, QGridLayout, QGroupBox, QHBoxLayout, QLineEdit, QInputDialog,
                                QMessageBox, QMenu)
-from PySide6.QtCore import QThread, Signal, Qt
+from PySide6.QtCore import QThread, Signal, Qt, QTimer
 from PySide6.QtGui import QColor, QBrush, QFont, QIcon, QAction
 from PySide6.QtWidgets import QComboBox
 from PySide6.QtCore import QSettings
 from TOOL.Tool import ToolManager, ToolManagementTab
-from TOOL.Tray import TrayManagementTab  # 添加这行
-from TOOL.Product import ProductStatisticsTab
+from TOOL.Tray import TrayManager, TrayManagementTab  # 添加这行
+from TOOL.Product import ProductCounter, ProductStatisticsTab
+from TOOL.Oee import load_settings as load_production_settings
 from TOOL.Contorl import  ControlPanelTab
 from TOOL.Tool2 import ToolManager2, ToolManagementTab2
+from TOOL.ToolLife import ToolChangePlanTab
 from TOOL.Woring import AlarmLogger, AlarmHistoryDialog
-import TOOL.icon
-from TOOL.License import LicenseManager
+from TOOL.Lamp import StatusLamp, BitStrip, LAMP_OFF, LAMP_ON, LAMP_PENDING
+from TOOL.Resource import load_resources
+from TOOL.Trend import TrendBuffer, TrendView
+from TOOL.Watchdog import LagWatchdog, LagReportDialog
+from TOOL.State import StateJournal
+from TOOL.Storage import close_all as close_databases
+from TOOL.Retention import RetentionJob
+from TOOL.Historian import Historian, UNIT_DEADBANDS
+from TOOL.Replay import FrameLayout, FrameRecorder, Recording, ReplayWorker, ReplayControlBar
+from TOOL.BlackBox import BlackBox
+from TOOL.Features import CycleFeatureExtractor, CYCLE_SIGNAL
+from TOOL.Anomaly import AnomalyDetector, ANOMALY_ALARM
+from TOOL.License import LicenseManager, LicenseCheckThread
 import datetime
 
+logger = logging.getLogger(__name__)
+
+# 进程启动时间，用于统计启动到首次绘制的耗时
+STARTUP_TIME = time.perf_counter()
+
 class PLCWorker(QThread):
     data_updated = Signal(dict)
     status_message = Signal(str)
     error_occurred = Signal(str)
 
-    def __init__(self, plc_ip, all_addresses, vd_addresses, vb_addresses, refresh_interval=0.5, parent=None):
+    def __init__(self, plc_ip, all_addresses, vd_addresses, vb_addresses, refresh_interval=0.5,
+                 trend_buffer=None, historian=None, recorder=None, blackbox=None, features=None,
+                 parent=None):
         super().__init__(parent)
         self.plc_ip = plc_ip
         self.all_addresses = all_addresses
         self.vd_addresses = vd_addresses
         self.vb_addresses = vb_addresses
         self.refresh_interval = refresh_interval
+        self.trend_buffer = trend_buffer  # 趋势图环形缓冲区，在工作线程中直接写入
+        self.historian = historian  # 变化记录历史库，在工作线程中直接写入
+        self.recorder = recorder  # 原始帧录制（回放用），在工作线程中直接写入
+        self.blackbox = blackbox  # 黑匣子环形缓冲区，在工作线程中直接写入
+        self.features = features  # 周期特征提取，在工作线程中直接写入
+        self.layout = FrameLayout(all_addresses, vd_addresses, vb_addresses)
         self.running = False
         self.plc = snap7.client.Client()
 
@@ -49,13 +76,24 @@ class PLCWorker(QThread):
 
                 while self.running:
                     try:
-                        # 读取所有类型的数据
-                        v_data = self.read_v_bool_registers(self.all_addresses)
-                        vd_data = self.read_vd_registers(self.vd_addresses)
-                        vb_data = self.read_vb_registers(self.vb_addresses)
-
-                        # 合并所有数据
-                        all_data = {**v_data, **vd_data, **vb_data}
+                        # 读取所有类型的数据，同一轮询周期使用同一个时间戳
+                        timestamp = time.time()
+                        raw = self.read_frame()
+                        if self.recorder is not None:
+                            self.recorder.record(timestamp, raw)
+                        if self.blackbox is not None:
+                            self.blackbox.record(timestamp, raw)
+                        all_data = self.layout.decode(raw)
+
+                        # 写入趋势缓冲区（按vd_addresses顺序，每帧只写一行）
+                        vd_row = [all_data[f"VD{addr}"] for addr in self.vd_addresses]
+                        if self.trend_buffer is not None:
+                            self.trend_buffer.append(timestamp, vd_row)
+                        if self.features is not None:
+                            self.features.append(timestamp, vd_row, all_data[CYCLE_SIGNAL])
+
+                        if self.historian is not None:
+                            self.historian.record(timestamp, [all_data[tag] for tag in self.historian.tags])
                         self.data_updated.emit(all_data)
 
 
@@ -78,57 +116,28 @@ class PLCWorker(QThread):
         self.running = False
         self.status_message.emit("正在停止监控...")
 
-    def read_v_bool_registers(self, addresses):
-        """读取布尔量寄存器"""
-        results = {}
+    def read_frame(self):
+        """
+        读取一个周期的原始字节，布局见 FrameLayout：
+        V位寄存器每个地址1字节，VD寄存器每个地址4字节（PLC原始字节序），VB寄存器每个地址1字节
+        """
+        raw = bytearray()
         try:
-            for addr in addresses:
-                byte_addr = addr
-                data = self.plc.db_read(1, byte_addr, 1)
-                byte_value = data[0]
-
-                for bit_position in range(8):
-                    bit_value = (byte_value >> bit_position) & 1
-                    results[f"V{addr}.{bit_position}"] = bool(bit_value)
-
-                results[f"VB{addr}"] = byte_value
-            return results
+            for addr in self.all_addresses:
+                raw += self.plc.db_read(1, addr, 1)
         except Exception as e:
             raise Exception(f"读取V寄存器时出错: {e}")
-
-    def read_vd_registers(self, addresses):
-        """读取VD寄存器（浮点数）"""
-        results = {}
         try:
-            for addr in addresses:
-                # 读取4个字节（浮点数）
-                data = self.plc.db_read(1, addr, 4)
-
-                # S7-200 SMART使用大端字节序(CDAB格式)，转换为小端序(ABCD)
-                # 原始字节顺序: [C, D, A, B] -> 转换为 [A, B, C, D]
-                # 实际上S7-200 SMART存储格式是: [B3, B2, B1, B0] 其中B3是最高字节
-                # 我们需要转换为大端序: [B2, B3, B0, B1]
-                converted_bytes = bytes([data[2], data[3], data[0], data[1]])
-
-                # 将字节转换为浮点数（小端序）
-                float_value = struct.unpack('>f', converted_bytes)[0]
-                results[f"VD{addr}"] = float_value
-            return results
+            for addr in self.vd_addresses:
+                raw += self.plc.db_read(1, addr, 4)
         except Exception as e:
             raise Exception(f"读取VD寄存器时出错: {e}")
-
-    def read_vb_registers(self, addresses):
-        """读取VB寄存器（字节值）"""
-        results = {}
         try:
-            for addr in addresses:
-                # 读取1个字节
-                data = self.plc.db_read(1, addr, 1)
-                byte_value = data[0]
-                results[f"VB{addr}"] = byte_value
-            return results
+            for addr in self.vb_addresses:
+                raw += self.plc.db_read(1, addr, 1)
         except Exception as e:
             raise Exception(f"读取VB寄存器时出错: {e}")
+        return bytes(raw)
 
 
 class PLCStatusTable(QTableWidget):
@@ -362,23 +371,74 @@ class RobotDataTable(QTableWidget):
                 value_item.setBackground(QBrush(QColor(230, 230, 230)))  # 灰色
 
 
+class LazyTabWidget(QTabWidget):
+    """标签页在第一次被激活时才创建，之前只放一个轻量的占位控件"""
+    tab_built = Signal(int, QWidget)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.factories = {}
+        self.built_tabs = {}
+        self.currentChanged.connect(self.ensure_tab)
+
+    def add_lazy_tab(self, factory, title):
+        placeholder = QWidget()
+        layout = QVBoxLayout(placeholder)
+        layout.setContentsMargins(0, 0, 0, 0)
+        index = self.addTab(placeholder, title)
+        self.factories[index] = factory
+        # 第一个标签页会在addTab时成为当前页，需要立即创建
+        if index == self.currentIndex():
+            self.ensure_tab(index)
+        return index
+
+    def built_tab(self, index):
+        """返回已创建的标签页内容，未创建则返回None"""
+        return self.built_tabs.get(index)
+
+    def ensure_tab(self, index):
+        """确保指定标签页已创建并返回其内容"""
+        if index in self.built_tabs:
+            return self.built_tabs[index]
+        factory = self.factories.get(index)
+        if factory is None:
+            return None
+        content = factory()
+        self.built_tabs[index] = content
+        self.widget(index).layout().addWidget(content)
+        self.tab_built.emit(index, content)
+        return content
+
+
 class PLCStatusWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, replay=None, replay_speed=1.0):
         super().__init__()
         self.license_manager = license_manager
         self.settings = QSettings("MyCompany", "PLCMonitorApp")
         self.setWindowTitle("智控小匠只能交互管控系统")
         self.setGeometry(100, 100, 1200, 800)
+        load_resources()
         self.setWindowIcon(QIcon(":/logo.ico"))
-        # 初始化刀具管理器
-        self.tool_manager = ToolManager()
+        # 刀具、料盘计数和信号边沿状态的持久化，构造管理器前先恢复
+        self.state_journal = StateJournal()
         self.group_summary_labels = {}  # 存储每个组的摘要标签
         self.status_indicators = {}  # 存储状态指示灯
-        self.alarm_logger = AlarmLogger()
         # 创建第二个刀具管理器（使用 V800.0 信号）
-        self.tool_manager2 = ToolManager2(plc_callback=self.set_800_7_signal)
+        self.tool_manager2 = ToolManager2(plc_callback=self.set_800_7_signal, journal=self.state_journal)
         # 初始化刀具管理器时传递回调函数
-        self.tool_manager = ToolManager(plc_callback=self.set_750_7_signal)
+        self.tool_manager = ToolManager(plc_callback=self.set_750_7_signal, journal=self.state_journal)
+        # 料盘和产品计数逻辑与界面分离，标签页未创建前也能计数
+        self.tray_manager = TrayManager(self, journal=self.state_journal)
+        self.tray_manager.tray_full.connect(self.handle_tray_full)
+        shifts, ideal_cycle = load_production_settings(self.settings)
+        self.product_counter = ProductCounter(journal=self.state_journal, shifts=shifts,
+                                              ideal_cycle=ideal_cycle)
+        # 过期历史记录在后台分批删除
+        self.retention_job = RetentionJob()
+        self.retention_job.start()
+        self.manual_mode = False
+        self.last_data = None
+        self.first_paint_done = False
         # 位描述字典
         self.bit_descriptions = {
             #ROBOT-DO
@@ -496,13 +556,45 @@ class PLCStatusWindow(QMainWindow):
 
         # 提取机器人数据VD地址
         self.robot_data_vd = [data["address"] for data in self.robot_data_definitions]
+        # 机器人数据趋势缓冲区，列顺序与robot_data_vd一致
+        self.trend_buffer = TrendBuffer(
+            [f"{data['name']} ({data['unit']})" for data in self.robot_data_definitions])
+        # 历史库：开关量按字节记录（任何一位变化都记录），浮点量按单位死区记录
+        self.historian = Historian(
+            [f"VB{addr}" for addr in self.all_addresses + self.robot_status_vb]
+            + [f"VD{addr}" for addr in self.robot_data_vd],
+            deadbands={f"VD{data['address']}": UNIT_DEADBANDS.get(data["unit"], 0.0)
+                       for data in self.robot_data_definitions})
+        # 原始帧录制（帮助菜单中开始/停止），录制文件可用 --replay 离线回放
+        frame_layout = FrameLayout(self.all_addresses, self.robot_data_vd, self.robot_status_vb)
+        self.frame_recorder = FrameRecorder(frame_layout)
+        # 回放模式：用录制文件代替PLC
+        self.replay = Recording(replay) if replay else None
+        # 黑匣子：内存中保留最近的原始帧，碰撞/急停时连同报警后的数据一起保存（回放时不触发）
+        self.black_box = BlackBox(frame_layout) if self.replay is None else None
+        self.alarm_logger = AlarmLogger(blackbox=self.black_box)
+        # 按生产周期提取关节电流/扭矩特征（磨损趋势）
+        self.cycle_features = CycleFeatureExtractor(self.robot_data_vd)
+        # 关节信号异常检测（界面线程每帧一次向量化计算，回放时同样运行）
+        self.anomaly_detector = AnomalyDetector(self.robot_data_definitions)
         self.v_tables = []
+        self.robot_status_table = None
+        self.robot_data_table = None
         # 初始化UI
         self.init_ui()
 
         # 工作线程
         self.worker = None
 
+        if self.replay is not None:
+            self.replay_bar = ReplayControlBar(self.replay, replay_speed)
+            self.status_bar.addPermanentWidget(self.replay_bar)
+            self.status_bar.showMessage(f"回放模式 - {self.replay.path}，点击'开始监控'开始回放")
+
+        # 界面卡顿监测
+        self.lag_watchdog = LagWatchdog(parent=self)
+        self.lag_watchdog.start()
+
     def init_ui(self):
         # 创建主控件和布局
         central_widget = QWidget()
@@ -590,42 +682,27 @@ class PLCStatusWindow(QMainWindow):
         button_layout.addStretch()
         main_layout.addLayout(button_layout)
 
-        # 创建标签页控件
-        self.tab_widget = QTabWidget()
+        # 创建标签页控件（标签页在第一次激活时才创建）
+        self.tab_widget = LazyTabWidget()
         self.tab_widget.setTabPosition(QTabWidget.North)
         self.tab_widget.setMovable(False)
+        self.tab_widget.tab_built.connect(self.on_tab_built)
         # 添加刀具管理标签页
-        tool_tab = ToolManagementTab(self.tool_manager)
-        self.tab_widget.addTab(tool_tab, "刀具管理1")
+        self.tab_widget.add_lazy_tab(lambda: ToolManagementTab(self.tool_manager), "刀具管理1")
         # 添加第二个刀具管理标签页
-        tool_tab2 = ToolManagementTab2(self.tool_manager2)
-        self.tab_widget.addTab(tool_tab2, "刀具管理2")
+        self.tab_widget.add_lazy_tab(lambda: ToolManagementTab2(self.tool_manager2), "刀具管理2")
         # 添加料盘管理标签页
-        tray_tab = TrayManagementTab(main_window=self)  # 传递主窗口引用
-        self.tab_widget.addTab(tray_tab, "料盘管理")
+        self.tray_tab_index = self.tab_widget.add_lazy_tab(
+            lambda: TrayManagementTab(self.tray_manager, main_window=self), "料盘管理")  # 传递主窗口引用
         # 添加产品统计标签页
-        self.product_stats_tab = ProductStatisticsTab()
-        self.tab_widget.addTab(self.product_stats_tab, "产品统计")
+        self.tab_widget.add_lazy_tab(lambda: ProductStatisticsTab(self.product_counter, self.settings), "产品统计")
         # 添加控制面板标签页（作为第一个标签页）
-        self.control_tab = ControlPanelTab(self.PLC_IP)
-        self.tab_widget.addTab(self.control_tab, "单机调试")
+        self.tab_widget.add_lazy_tab(self.create_control_tab, "单机调试")
         # 1. 机器人状态标签页
-        robot_status_tab = QWidget()
-        status_layout = QVBoxLayout(robot_status_tab)
-
-        # 添加标题
-        status_title = QLabel("机器人状态监控")
-        status_title.setFont(QFont("Arial", 14, QFont.Bold))
-        status_title.setStyleSheet("color: #34495e; padding: 10px;")
-        status_title.setAlignment(Qt.AlignCenter)
-        status_layout.addWidget(status_title)
-
-        # 创建机器人状态表格
-        self.robot_status_table = RobotStatusTable(self.robot_status_definitions)
-        status_layout.addWidget(self.robot_status_table)
-
-        # 添加标签页
-        self.tab_widget.addTab(robot_status_tab, "机器人状态")
+        self.tab_widget.add_lazy_tab(self.create_robot_status_tab, "机器人状态")
+        # 换刀计划：两个刀具管理器中最早到期的刀具
+        self.tab_widget.add_lazy_tab(
+            lambda: ToolChangePlanTab([self.tool_manager.forecast, self.tool_manager2.forecast]), "换刀计划")
 
         # 创建右上角的翻页按钮布局
         top_right_layout = QHBoxLayout()
@@ -706,6 +783,14 @@ class PLCStatusWindow(QMainWindow):
         license_action.triggered.connect(self.show_license_info)
         self.help_dropdown_menu.addAction(license_action)
 
+        lag_action = QAction("界面卡顿报告", self)
+        lag_action.triggered.connect(self.show_lag_report)
+        self.help_dropdown_menu.addAction(lag_action)
+
+        self.record_action = QAction("开始录制原始数据", self)
+        self.record_action.triggered.connect(self.toggle_recording)
+        self.help_dropdown_menu.addAction(self.record_action)
+
         self.help_button = QPushButton("帮助")
         self.help_button.setFixedHeight(35)
         self.help_button.setStyleSheet("""
@@ -733,6 +818,39 @@ class PLCStatusWindow(QMainWindow):
 
 
         # 2. 机器人数据标签页
+        self.tab_widget.add_lazy_tab(self.create_robot_data_tab, "机器人位置")
+        self.tab_widget.add_lazy_tab(lambda: TrendView(self.trend_buffer), "机器人趋势")
+
+        # 3. 添加原有的布尔量监控标签页
+        for group_name, addresses in self.register_groups.items():
+            self.tab_widget.add_lazy_tab(
+                lambda g=group_name, a=addresses: self.create_register_tab(g, a), group_name)
+
+        # 添加标签页控件到主布局
+        main_layout.addWidget(self.tab_widget)
+
+    def create_control_tab(self):
+        self.control_tab = ControlPanelTab(self.PLC_IP)
+        self.control_tab.set_manual_mode(self.manual_mode)
+        return self.control_tab
+
+    def create_robot_status_tab(self):
+        robot_status_tab = QWidget()
+        status_layout = QVBoxLayout(robot_status_tab)
+
+        # 添加标题
+        status_title = QLabel("机器人状态监控")
+        status_title.setFont(QFont("Arial", 14, QFont.Bold))
+        status_title.setStyleSheet("color: #34495e; padding: 10px;")
+        status_title.setAlignment(Qt.AlignCenter)
+        status_layout.addWidget(status_title)
+
+        # 创建机器人状态表格
+        self.robot_status_table = RobotStatusTable(self.robot_status_definitions)
+        status_layout.addWidget(self.robot_status_table)
+        return robot_status_tab
+
+    def create_robot_data_tab(self):
         robot_data_tab = QWidget()
         data_layout = QVBoxLayout(robot_data_tab)
 
@@ -746,63 +864,54 @@ class PLCStatusWindow(QMainWindow):
         # 创建机器人数据表格
         self.robot_data_table = RobotDataTable(self.robot_data_definitions)
         data_layout.addWidget(self.robot_data_table)
+        return robot_data_tab
 
-        # 添加标签页
-        self.tab_widget.addTab(robot_data_tab, "机器人位置")
+    def create_register_tab(self, group_name, addresses):
+        tab = QWidget()
+        tab_layout = QVBoxLayout(tab)
 
-        # 3. 添加原有的布尔量监控标签页
-        for group_name, addresses in self.register_groups.items():
-            tab = QWidget()
-            tab_layout = QVBoxLayout(tab)
+        # 添加组标题
+        group_label = QLabel(f"{group_name} - V寄存器状态")
+        group_label.setFont(QFont("Arial", 12, QFont.Bold))
+        group_label.setStyleSheet("color: #34495e; padding: 5px;")
+        group_label.setAlignment(Qt.AlignCenter)
+        tab_layout.addWidget(group_label)
 
-            # 添加组标题
-            group_label = QLabel(f"{group_name} - V寄存器状态")
-            group_label.setFont(QFont("Arial", 12, QFont.Bold))
-            group_label.setStyleSheet("color: #34495e; padding: 5px;")
-            group_label.setAlignment(Qt.AlignCenter)
-            tab_layout.addWidget(group_label)
+        # 创建并添加表格
+        table = PLCStatusTable(addresses, group_name, self.bit_descriptions)
 
-            # 创建并添加表格
-            table = PLCStatusTable(addresses, group_name, self.bit_descriptions)
+        tab_layout.addWidget(table)
+        self.v_tables.append(table)
 
-            tab_layout.addWidget(table)
-            self.v_tables.append(table)
+        # 在init_ui方法中，创建状态摘要的部分修改为：
+        summary_group = QGroupBox("状态摘要")
+        summary_layout = QGridLayout()
 
-            # 在init_ui方法中，创建状态摘要的部分修改为：
-            summary_group = QGroupBox("状态摘要")
-            summary_layout = QGridLayout()
+        # 存储每个组的摘要标签
+        group_labels = {}
 
-            # 存储每个组的摘要标签
-            group_labels = {}
+        # 创建摘要标签
+        for i, addr in enumerate(addresses):
+            # 字节状态摘要
+            byte_label = QLabel(f"VB{addr}: 00000000")
+            byte_label.setFont(QFont("Courier New", 13))
+            byte_label.setTextFormat(Qt.PlainText)
+            summary_layout.addWidget(QLabel(f"VB{addr}:"), i, 0)
+            summary_layout.addWidget(byte_label, i, 1)
 
-            # 创建摘要标签
-            for i, addr in enumerate(addresses):
-                # 字节状态摘要
-                byte_label = QLabel(f"VB{addr}: 00000000")
-                byte_label.setFont(QFont("Courier New", 13))
-                summary_layout.addWidget(QLabel(f"VB{addr}:"), i, 0)
-                summary_layout.addWidget(byte_label, i, 1)
+            # 位状态摘要（自绘，值不变时不重绘）
+            bits_label = BitStrip(QFont("Courier New", 13))
+            summary_layout.addWidget(bits_label, i, 2)
 
-                # 位状态摘要
-                bits_label = QLabel("OFF OFF OFF OFF OFF OFF OFF OFF")
-                bits_label.setFont(QFont("Courier New", 13))
-                bits_label.setStyleSheet("color: #7f8c8d;")
-                summary_layout.addWidget(bits_label, i, 2)
+            # 保存标签引用
+            group_labels[addr] = (byte_label, bits_label)
 
-                # 保存标签引用
-                group_labels[addr] = (byte_label, bits_label)
+        summary_group.setLayout(summary_layout)
+        tab_layout.addWidget(summary_group)
 
-            summary_group.setLayout(summary_layout)
-            tab_layout.addWidget(summary_group)
-
-            # 💥这里加上这一句，把所有标签注册到大字典里
-            self.group_summary_labels[group_name] = group_labels
-
-            # 将标签页添加到标签控件
-            self.tab_widget.addTab(tab, group_name)
-
-        # 添加标签页控件到主布局
-        main_layout.addWidget(self.tab_widget)
+        # 💥这里加上这一句，把所有标签注册到大字典里
+        self.group_summary_labels[group_name] = group_labels
+        return tab
 
     def create_indicator(self, label_text, signal_address):
         """创建一个指示灯组件"""
@@ -817,10 +926,8 @@ class PLCStatusWindow(QMainWindow):
         layout.addWidget(label)
 
         # 创建指示灯
-        indicator = QLabel()
-        indicator.setFixedSize(20, 20)
-        indicator.setStyleSheet("background-color: white; border-radius: 10px; border: 1px solid gray;")
-        layout.addWidget(indicator)
+        indicator = StatusLamp(20)
+        layout.addWidget(indicator, alignment=Qt.AlignCenter)
 
         # 存储指示灯引用
         self.status_indicators[signal_address] = indicator
@@ -847,21 +954,34 @@ class PLCStatusWindow(QMainWindow):
         else:
             # 在开始监控时，先将所有指示灯设置为黄色（连接中）
             for indicator in self.status_indicators.values():
-                indicator.setStyleSheet("background-color: yellow; border-radius: 10px; border: 1px solid gray;")
+                indicator.set_state(LAMP_PENDING)
 
             # 固定刷新率为0.1秒
             refresh_interval = 0.01
             self.refresh_label.setText(f"刷新率: {refresh_interval}秒")
 
             # 启动线程
-            self.worker = PLCWorker(
-                plc_ip=self.PLC_IP,
-                all_addresses=self.all_addresses,
-                vd_addresses=self.robot_data_vd,
-                vb_addresses=self.robot_status_vb,
-                refresh_interval=refresh_interval
-            )
-            self.worker.data_updated.connect(self.update_all_tables)
+            if self.replay is not None:
+                # 回放不写历史库、不录制，只驱动界面和计数逻辑
+                self.worker = ReplayWorker(self.replay)
+                self.replay_bar.attach(self.worker)
+                self.worker.data_updated.connect(self.update_all_tables)
+                # 界面处理完一帧再放行下一帧，须连接在 update_all_tables 之后
+                self.worker.data_updated.connect(self.worker.frame_consumed)
+            else:
+                self.worker = PLCWorker(
+                    plc_ip=self.PLC_IP,
+                    all_addresses=self.all_addresses,
+                    vd_addresses=self.robot_data_vd,
+                    vb_addresses=self.robot_status_vb,
+                    refresh_interval=refresh_interval,
+                    trend_buffer=self.trend_buffer,
+                    historian=self.historian,
+                    recorder=self.frame_recorder,
+                    blackbox=self.black_box,
+                    features=self.cycle_features
+                )
+                self.worker.data_updated.connect(self.update_all_tables)
             self.worker.status_message.connect(self.status_bar.showMessage)
             self.worker.error_occurred.connect(self.show_error)
             self.worker.finished.connect(self.worker_finished)
@@ -885,53 +1005,53 @@ class PLCStatusWindow(QMainWindow):
             self.update_nav_buttons()
 
     def update_all_tables(self, data):
-        # 更新机器人状态表
-        self.robot_status_table.update_data(data)
-
-        # 更新机器人数据表
-        self.robot_data_table.update_data(data)
-
-        # 更新所有V寄存器状态表
-        for table in self.v_tables:
-            table.update_data(data)
-        # 更新状态摘要
-        self.update_summary_labels(data)
+        self.last_data = data
+        # 只更新已创建的标签页
+        self.update_views(data)
         # 更新状态栏
         self.status_bar.showMessage(f"最后更新: {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
         for signal_address, indicator in self.status_indicators.items():
             if signal_address in data:
-                if data[signal_address]:
-                    indicator.setStyleSheet("background-color: green; border-radius: 10px; border: 1px solid gray;")
-                else:
-                    indicator.setStyleSheet("background-color: white; border-radius: 10px; border: 1px solid gray;")
+                indicator.set_state(LAMP_ON if data[signal_address] else LAMP_OFF)
             else:
                 # 尚未读取到信号时显示黄色
-                indicator.setStyleSheet("background-color: yellow; border-radius: 10px; border: 1px solid gray;")
-        # 处理刀具信号
+                indicator.set_state(LAMP_PENDING)
+        # 处理刀具信号（计数逻辑不依赖标签页是否已创建）
         if "V750.0" in data:
-            tray_tab = self.tab_widget.widget(2)
-            product_tab = self.tab_widget.widget(3)
-            if tray_tab and product_tab:
-                tray_tab.process_signal(data["V750.0"])
-                product_tab.process_signal(data["V750.0"])
+            self.tray_manager.process_signal(data["V750.0"])
+            counted = self.product_counter.process_signal(data["V750.0"])
+            tray_tab = self.tab_widget.built_tab(2)
+            product_tab = self.tab_widget.built_tab(3)
+            if tray_tab:
+                tray_tab.update_counts()
+            if product_tab and counted:
+                product_tab.update_daily_count()
+        # 按设备状态累计当前小时/班次的运行和停机时间
+        self.product_counter.update_machine_state(data)
 
         # 在 update_all_tables 方法中添加
         if "VB1003" in data:
             # VB1003 值为 1 表示手动模式
-            self.control_tab.set_manual_mode(data["VB1003"] == 1)
+            manual_mode = data["VB1003"] == 1
+            if manual_mode != self.manual_mode:
+                self.manual_mode = manual_mode
+                if self.tab_widget.built_tab(4):
+                    self.control_tab.set_manual_mode(manual_mode)
 
         # 处理第二个刀具管理信号 (V800.0)
         if "V800.0" in data:
-            tool_tab2 = self.tab_widget.widget(1)  # 根据实际索引调整
+            self.tool_manager2.process_signal(data["V800.0"], self)
+            tool_tab2 = self.tab_widget.built_tab(1)  # 根据实际索引调整
             if tool_tab2:
-                tool_tab2.process_signal(data["V800.0"])
+                tool_tab2.update_table()
 
         # 处理第二个刀具管理信号 (V600.0)
         if "V600.0" in data:
-            tool_tab = self.tab_widget.widget(0)  # 根据实际索引调整
+            self.tool_manager.process_signal(data["V600.0"], self)
+            tool_tab = self.tab_widget.built_tab(0)  # 根据实际索引调整
             if tool_tab:
-                tool_tab.process_signal(data["V600.0"])
+                tool_tab.update_table()
 
         # 机器人状态对应的字段
         status_mapping = {
@@ -948,6 +1068,65 @@ class PLCStatusWindow(QMainWindow):
             if vb_addr in data:
                 self.alarm_logger.log_state_change(alarm_name, data[vb_addr])
 
+        if "VD1200" in data:
+            self.alarm_logger.log_state_change(ANOMALY_ALARM, self.anomaly_detector.update(data))
+
+    def update_views(self, data):
+        """刷新已创建标签页中的表格和摘要"""
+        # 更新机器人状态表
+        if self.robot_status_table:
+            self.robot_status_table.update_data(data)
+
+        # 更新机器人数据表
+        if self.robot_data_table:
+            self.robot_data_table.update_data(data)
+
+        # 更新所有V寄存器状态表
+        for table in self.v_tables:
+            table.update_data(data)
+        # 更新状态摘要
+        self.update_summary_labels(data)
+
+    def on_tab_built(self, index, content):
+        """标签页创建后立即显示最近一次读取的数据"""
+        if self.last_data:
+            self.update_views(self.last_data)
+
+    def handle_tray_full(self, tray_name):
+        """料盘已满时需要料盘管理页弹窗和发送PLC信号，未创建则先创建"""
+        tray_tab = self.tab_widget.ensure_tab(self.tray_tab_index)
+        tray_tab.handle_tray_full(tray_name)
+
+    def set_locked(self, locked):
+        """许可证验证完成前锁定为只读状态：只能查看，不能连接PLC或操作"""
+        self.control_button.setDisabled(locked)
+        self.history_button.setDisabled(locked)
+        self.tab_widget.setDisabled(locked)
+        if locked:
+            self.status_bar.showMessage("正在验证许可证...")
+        else:
+            self.status_bar.showMessage("就绪 - 点击'开始监控'连接PLC")
+
+    def on_license_checked(self, valid, message):
+        """后台许可证验证完成"""
+        elapsed = (time.perf_counter() - STARTUP_TIME) * 1000
+        logger.info("启动到许可证验证完成耗时: %.1f ms（%s）", elapsed,
+                    "热启动" if self.license_manager.machine_id_cached else "冷启动")
+        # 验证失败会显示错误对话框，用户可选择获取机器码或导入许可证
+        if valid or self.license_manager.show_license_error(message):
+            self.set_locked(False)
+        else:
+            # 如果用户未选择导入有效许可证，程序会退出
+            self.close()
+            QApplication.exit(1)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            elapsed = (time.perf_counter() - STARTUP_TIME) * 1000
+            logger.info("启动到首次绘制耗时: %.1f ms", elapsed)
+
     def show_error(self, message):
         self.status_bar.showMessage(f"错误: {message}")
 
@@ -968,12 +1147,30 @@ class PLCStatusWindow(QMainWindow):
         """)
         # 更新所有指示灯为红色（未连接状态）
         for indicator in self.status_indicators.values():
-            indicator.setStyleSheet("background-color:white ; border-radius: 10px; border: 1px solid gray;")
+            indicator.set_state(LAMP_OFF)
     def closeEvent(self, event):
         # 确保在关闭窗口时停止工作线程
         if self.worker and self.worker.isRunning():
             self.worker.stop()
             self.worker.wait(2000)  # 等待2秒让线程结束
+        self.lag_watchdog.stop()
+        self.retention_job.stop()
+        # 写完录制中剩余的帧，保存进行中的黑匣子捕获
+        self.frame_recorder.stop()
+        if self.black_box is not None:
+            self.black_box.close()
+        # 写入历史库中剩余的记录
+        self.historian.close()
+        # 写完剩余的周期特征
+        self.cycle_features.close()
+        # 写完报警队列中剩余的事件
+        self.alarm_logger.close()
+        # 写入内存中的产品计数
+        self.product_counter.close()
+        # 写完状态日志并生成快照
+        self.state_journal.close()
+        # 关闭刀具等其余数据库的长连接
+        close_databases()
         event.accept()
 
     def load_ip_history(self):
@@ -1022,19 +1219,8 @@ class PLCStatusWindow(QMainWindow):
                     # 更新字节值标签
                     byte_label.setText(f"VB{addr}: {byte_value:08b}")  # 显示为8位二进制
 
-                    # 更新位状态标签
-                    bit_states = []
-                    for bit in range(8):
-                        bit_value = (byte_value >> bit) & 1
-                        state = "ON" if bit_value else "OFF"
-                        # 为ON状态添加颜色标记
-                        if bit_value:
-                            state = f'<span style="color: green; font-weight: bold;">{state}</span>'
-                        bit_states.append(state)
-
-                    # 反转列表，因为位0是最低位，但通常显示从左到右是高位到低位
-                    bit_states.reverse()
-                    bits_label.setText(" ".join(bit_states))
+                    # 更新位状态条（从左到右为高位到低位，值不变时不重绘）
+                    bits_label.set_value(byte_value)
 
     # 添加翻页方法
     def prev_tab(self):
@@ -1139,6 +1325,10 @@ class PLCStatusWindow(QMainWindow):
         dlg.exec()
 
 
+    def show_lag_report(self):
+        dlg = LagReportDialog(self.lag_watchdog, self, sections=[self.anomaly_detector.report])
+        dlg.exec()
+
     # 添加新方法
     def show_about(self):
         now_year = datetime.datetime.now().year
@@ -1151,6 +1341,16 @@ class PLCStatusWindow(QMainWindow):
         QMessageBox.about(self, "关于", about_text)
 
 
+    def toggle_recording(self):
+        if self.frame_recorder.recording:
+            path = self.frame_recorder.stop()
+            self.record_action.setText("开始录制原始数据")
+            self.status_bar.showMessage(f"录制已停止: {path}（{self.frame_recorder.frames} 帧）")
+        else:
+            path = self.frame_recorder.start()
+            self.record_action.setText("停止录制原始数据")
+            self.status_bar.showMessage(f"正在录制原始数据: {path}")
+
     def show_license_info(self):
         # 获取许可证信息
         license_info = self.license_manager.get_license_info()
@@ -1163,18 +1363,30 @@ class PLCStatusWindow(QMainWindow):
         QMessageBox.information(self, "许可证信息", info_text)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-
-    # 添加许可证验证
-    license_manager = LicenseManager("智控小匠智能交互管控系统")
-    # 验证许可证
-    if not license_manager.validate_license():
-        # 验证失败会显示错误对话框，用户可选择获取机器码或导入许可证
-        # 如果用户未选择导入有效许可证，程序会退出
-        sys.exit(1)
-
-    # 获取许可证信息（可选，用于显示在关于页面）
-    license_info = license_manager.get_license_info()
+    # 回放录制文件: python main.py --replay recordings/xxx.plcrec [--speed 10] [--workdir 回放目录]
+    # 回放时计数和数据库写入 --workdir（默认 replay_<文件名>），不影响现场数据
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", help="录制文件（.plcrec 或 .plcrec.gz）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速 0.1~50")
+    parser.add_argument("--workdir", help="回放时的工作目录")
+    args, qt_args = parser.parse_known_args()
+    replay_path = None
+    install_dir = os.getcwd()  # 许可证文件所在目录，回放切换工作目录前记录
+    if args.replay:
+        replay_path = os.path.abspath(args.replay)
+        workdir = args.workdir or f"replay_{os.path.basename(args.replay).split('.')[0]}"
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        handlers=[logging.StreamHandler(), logging.FileHandler("plc_monitor.log", encoding="utf-8")]
+    )
+    app = QApplication(sys.argv[:1] + qt_args)
+
+    # 添加许可证验证（在后台线程中进行，窗口先以只读状态显示）
+    license_manager = LicenseManager("智控小匠智能交互管控系统", base_dir=install_dir)
 
     # 设置应用样式
     app.setStyle("Fusion")
@@ -1183,7 +1395,13 @@ if __name__ == "__main__":
     font = QFont("Arial", 15)
     app.setFont(font)
 
-    window = PLCStatusWindow()
+    window = PLCStatusWindow(replay=replay_path, replay_speed=args.speed)
+    window.set_locked(True)
     window.show()
 
+    # 验证许可证
+    license_thread = LicenseCheckThread(license_manager)
+    license_thread.result_ready.connect(window.on_license_checked)
+    license_thread.start()
+
     sys.exit(app.exec())
\ No newline at end of file